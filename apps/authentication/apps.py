@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = "apps.authentication"
+
+    def ready(self):
+        from . import signals  # noqa: F401
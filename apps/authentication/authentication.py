@@ -1,10 +1,14 @@
+import time
+
 import jwt
 
 from django.conf import settings
 
 from rest_framework import authentication, exceptions
 
+from apps.core import metrics
 from .models import User
+from .revocation import revocation_list, token_jti
 
 
 class JWTAuthentication(authentication.BaseAuthentication):
@@ -22,6 +26,13 @@ class JWTAuthentication(authentication.BaseAuthentication):
         The user uses the token to access resources that need an acess token.
         JWT token has become a defacto standard for authentication
         """
+        started = time.perf_counter()
+        try:
+            return self._authenticate(request)
+        finally:
+            metrics.add_time(request, "auth_time", time.perf_counter() - started)
+
+    def _authenticate(self, request):
         request.user = None
 
         # `header` array has the prefix(Access_token) and the JWT Token
@@ -64,10 +75,15 @@ class JWTAuthentication(authentication.BaseAuthentication):
             msg = "Invalid token. Could not decode token. Possibly Damaged."
             raise exceptions.AuthenticationFailed(msg)
 
-        user = User.objects.get(pk=payload["id"])
+        # Costs no query unless the token is probably revoked.
+        if revocation_list.is_revoked(token_jti(payload, token)):
+            msg = "This token has been revoked."
+            raise exceptions.AuthenticationFailed(msg)
+
         try:
-            user = User.objects.get(pk=payload["id"])
-        except user.DoesNotExist:
+            # The role comes along for the rate limit of RoleRateThrottle.
+            user = User.objects.select_related("role").get(pk=payload["id"])
+        except User.DoesNotExist:
             msg = "Token did not match any user."
             raise exceptions.AuthenticationFailed(msg)
 
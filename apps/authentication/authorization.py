@@ -0,0 +1,46 @@
+from django.db import connection
+
+from .models import Permission, Role, User
+
+# The wanted permissions are grouped per role once, then matched to the
+# users by role id, which PostgreSQL does with a single hash join.
+CHECK_SQL = """
+WITH granted AS (
+    SELECT role.id AS role_id, array_agg(permission.name) AS names
+    FROM {role} AS role
+    JOIN {permission} AS permission ON permission.role_id = role.id
+    WHERE role.active AND permission.active AND permission.name = ANY(%s)
+    GROUP BY role.id
+)
+SELECT account.id, granted.names
+FROM {user} AS account
+JOIN granted ON granted.role_id = account.role_id
+WHERE account.id = ANY(%s) AND account.is_active
+"""
+
+
+def check_permissions(checks):
+    """
+    Answers many (user id, permission name) checks with one query. A check
+    passes when the user is active and has an active role that holds the
+    permission, and that permission is active too.
+
+    Returns one boolean per check, in order.
+    """
+    if not checks:
+        return []
+    user_ids = list({user_id for user_id, _ in checks})
+    names = list({name for _, name in checks})
+
+    quote_name = connection.ops.quote_name
+    sql = CHECK_SQL.format(
+        role=quote_name(Role._meta.db_table),
+        permission=quote_name(Permission._meta.db_table),
+        user=quote_name(User._meta.db_table),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [names, user_ids])
+        granted = {user_id: set(names) for user_id, names in cursor.fetchall()}
+    return [
+        user_id in granted and name in granted[user_id] for user_id, name in checks
+    ]
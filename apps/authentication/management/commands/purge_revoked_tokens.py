@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.authentication.models import RevokedToken
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes revoked tokens that have expired, they are rejected anyway. "
+        "Meant to run periodically, e.g. daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+        while True:
+            # Small batches keep each delete short next to live traffic.
+            ids = list(
+                RevokedToken.objects.filter(expires_at__lte=now).values_list(
+                    "id", flat=True
+                )[: options["batch_size"]]
+            )
+            if not ids:
+                break
+            deleted += RevokedToken.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired tokens."))
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.9 on 2026-10-19 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0005_revokedtoken"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PolicyChange",
+            fields=[
+                ("version", models.BigAutoField(primary_key=True, serialize=False)),
+                ("role", models.CharField(max_length=50)),
+                ("changed_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 3.2.9 on 2026-10-19 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The role names users could hold before roles were foreign keys.
+LEGACY_ROLES = ("admin", "moderator", "member", "guest")
+
+
+def link_roles(apps, schema_editor):
+    Role = apps.get_model("authentication", "Role")
+    User = apps.get_model("authentication", "User")
+
+    names = set(
+        User.objects.exclude(role_name=None)
+        .values_list("role_name", flat=True)
+        .distinct()
+    )
+    existing = set(Role.objects.filter(name__in=names).values_list("name", flat=True))
+    unknown = names - existing - set(LEGACY_ROLES)
+    if unknown:
+        raise RuntimeError(
+            f"Users hold roles with no Role: {', '.join(sorted(unknown))}. "
+            "Create those roles or move their users to another role, then "
+            "migrate again."
+        )
+
+    for name in names:
+        # Users may hold a legacy role nobody created a Role for, e.g. the
+        # default "guest". It gets a Role without permissions, which grants
+        # the same.
+        role, _ = Role.objects.get_or_create(name=name)
+        User.objects.filter(role_name=name).update(role=role)
+
+
+def unlink_roles(apps, schema_editor):
+    Role = apps.get_model("authentication", "Role")
+    User = apps.get_model("authentication", "User")
+
+    for role_id, name in Role.objects.values_list("id", "name"):
+        User.objects.filter(role_id=role_id).update(role_name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authentication", "0006_policychange"),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name="user",
+            old_name="role",
+            new_name="role_name",
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="role",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="users",
+                to="authentication.role",
+            ),
+        ),
+        migrations.RunPython(link_roles, unlink_roles),
+        migrations.RemoveField(
+            model_name="user",
+            name="role_name",
+        ),
+    ]
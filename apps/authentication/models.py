@@ -1,8 +1,8 @@
 import jwt
 from datetime import datetime, timedelta
+import uuid
 from typing import List
 from django.conf import settings
-from django.core.exceptions import ValidationError
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -11,6 +11,8 @@ from django.contrib.auth.models import (
 from django.utils.translation import gettext_lazy as _
 from django.db import models
 
+from .role_permissions import role_permissions
+
 
 class UserManager(BaseUserManager):
     """
@@ -30,7 +32,11 @@ class UserManager(BaseUserManager):
         if email is None:
             raise TypeError("Users must have an email address.")
 
-        user = self.model(username=username, email=self.normalize_email(email))
+        user = self.model(
+            username=username,
+            email=self.normalize_email(email),
+            role=Role.objects.filter(name="guest").first(),
+        )
         user.set_password(password)
         user.save()
 
@@ -44,6 +50,8 @@ class UserManager(BaseUserManager):
         if email is None:
             raise TypeError("Users must have an email address.")
 
+        if not isinstance(role, Role):
+            role = Role.objects.get(name=role)
         user = self.model(username=username, email=self.normalize_email(email), role=role)
         user.set_password(password)
         user.save()
@@ -75,15 +83,6 @@ class Role(models.Model):
     def __str__(self):
         return self.name
 
-    def save(self, *args, **kwargs):
-        """
-        Ensure that the 'ROLE' is either admin, moderator, menber or GUEST.
-        """
-        if self.name not in ["admin", "moderator", "member", "guest"]:
-            raise ValidationError(f"{self.name} is not a valid role.")
-
-        super().save(*args, **kwargs)
-
 
 class Permission(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -126,7 +125,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     # A timestamp representation when this object was last updated.
     updated_at = models.DateTimeField(auto_now=True)
 
-    role = models.CharField(max_length=50, null=True, blank=True, default="guest")
+    role = models.ForeignKey(
+        Role, on_delete=models.PROTECT, null=True, blank=True, related_name="users"
+    )
     # More fields required by Django when specifying a custom user model.
 
     # The `USERNAME_FIELD` property tells us which field we will use to log in.
@@ -180,27 +181,48 @@ class User(AbstractBaseUser, PermissionsMixin):
         date_now = datetime.now() + timedelta(days=30)
 
         token = jwt.encode(
-            {"id": self.pk, "exp": int(date_now.strftime("%s"))},
+            {
+                "id": self.pk,
+                "exp": int(date_now.strftime("%s")),
+                # Identifies the token so it can be revoked, see RevokedToken.
+                "jti": uuid.uuid4().hex,
+            },
             settings.SECRET_KEY,
             algorithm="HS256",
         )
         return token
 
     def _user_permissions(self) -> List[str]:
-        user_role = Role.objects.filter(name=self.role)
-        if user_role:
-            user_permission_list = [
-                permission_object.name
-                for permission_object in user_role[0].permissions.all()
-            ]
-            return user_permission_list
-        return []
-
-    def save(self, *args, **kwargs):
-        """
-        Ensure that the 'ROLE' is either admin, moderator, menber or GUEST.
-        """
-        if self.role not in ["admin", "moderator", "member", "guest"]:
-            raise ValidationError(f"{self.role} is not a valid role.")
+        return role_permissions.get(self.role_id)
+
 
-        super().save(*args, **kwargs)
+class RevokedToken(models.Model):
+    """
+    A token that was revoked before it expired, e.g. on logout. Rows can be
+    purged once `expires_at` has passed since the token is rejected anyway.
+    """
+
+    jti = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="revoked_tokens"
+    )
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class PolicyChange(models.Model):
+    """
+    Records that the permissions of a role changed. The version of the
+    role -> permission policy is the highest `version` recorded so far,
+    clients holding an older one ask for the roles changed since.
+    """
+
+    version = models.BigAutoField(primary_key=True)
+    role = models.CharField(max_length=50)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.version}: {self.role}"
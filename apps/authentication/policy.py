@@ -0,0 +1,63 @@
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import connection, transaction
+from django.db.models import Max, Q
+
+from .models import PolicyChange, Role
+
+
+def record_policy_change(*roles):
+    """Bumps the policy version for the roles whose permissions changed."""
+    roles = [role for role in dict.fromkeys(roles) if role]
+    if not roles:
+        return
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            # Writers wait for each other until commit, so versions become
+            # visible in order and a polling client never skips one.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "LOCK TABLE {} IN EXCLUSIVE MODE".format(
+                        connection.ops.quote_name(PolicyChange._meta.db_table)
+                    )
+                )
+        PolicyChange.objects.bulk_create(PolicyChange(role=role) for role in roles)
+
+
+def policy_version():
+    return PolicyChange.objects.aggregate(version=Max("version"))["version"] or 0
+
+
+def policy_roles(names=None):
+    """
+    Maps every active role, or those of `names`, to the sorted names of its
+    active permissions, with one query.
+    """
+    roles = Role.objects.filter(active=True)
+    if names is not None:
+        roles = roles.filter(name__in=names)
+    roles = roles.annotate(
+        granted=ArrayAgg(
+            "permissions__name",
+            filter=Q(permissions__active=True),
+            ordering="permissions__name",
+        )
+    )
+    return {
+        name: granted or [] for name, granted in roles.values_list("name", "granted")
+    }
+
+
+def policy_changes(since_version):
+    """
+    The current permissions of every role changed after `since_version`,
+    None for roles that were removed or deactivated since.
+    """
+    changed = sorted(
+        set(
+            PolicyChange.objects.filter(version__gt=since_version).values_list(
+                "role", flat=True
+            )
+        )
+    )
+    roles = policy_roles(changed) if changed else {}
+    return {name: roles.get(name) for name in changed}
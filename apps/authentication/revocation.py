@@ -0,0 +1,171 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from django.conf import settings
+from django.utils import timezone as django_timezone
+
+from .models import RevokedToken
+
+
+class BloomFilter:
+    """
+    Set membership in a fixed bit array: `key in filter` is never wrong for
+    added keys and wrong for others with about `error_rate` probability
+    while no more than `capacity` keys were added.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(
+            64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing, one digest gives every bit position.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class RevocationList:
+    """
+    Per process view of the revoked tokens. A Bloom filter answers "not
+    revoked" for almost every token without touching the database; only
+    a probable match is confirmed with a query.
+
+    Every TOKEN_REVOCATION_REFRESH_SECONDS the filter takes in the tokens
+    revoked since the previous refresh with one query, so a token revoked
+    by another process stops working within that delay. It is rebuilt from
+    scratch every TOKEN_REVOCATION_REBUILD_SECONDS, which drops expired
+    tokens, or as soon as it holds more tokens than it was sized for.
+    """
+
+    error_rate = 0.001
+    # Rows of slow transactions commit after later ones, their revoked_at
+    # lies a little in the past. Re-reading this window catches them.
+    overlap = timedelta(seconds=60)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._since = None
+        self._refreshed_at = 0.0
+        self._rebuilt_at = 0.0
+
+    def is_revoked(self, jti):
+        self.refresh()
+        if jti not in self._filter:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def add(self, jti):
+        """Makes a token revoked by this process fail here right away."""
+        if self._filter is not None and jti not in self._filter:
+            self._filter.add(jti)
+
+    def refresh(self):
+        """Brings the filter up to date unless it was refreshed recently."""
+        if not self._stale():
+            return
+        # Only one thread refreshes, the others go on with the current filter.
+        if not self._lock.acquire(blocking=self._filter is None):
+            return
+        try:
+            if self._stale():
+                if (
+                    self._filter is None
+                    or self._filter.count > self._filter.capacity
+                    or time.monotonic() - self._rebuilt_at
+                    > settings.TOKEN_REVOCATION_REBUILD_SECONDS
+                ):
+                    self.rebuild()
+                else:
+                    self._update()
+        finally:
+            self._lock.release()
+
+    def rebuild(self):
+        started = django_timezone.now()
+        jtis = list(
+            RevokedToken.objects.filter(expires_at__gt=started).values_list(
+                "jti", flat=True
+            )
+        )
+        bloom = BloomFilter(
+            max(settings.TOKEN_REVOCATION_BLOOM_CAPACITY, 2 * len(jtis)),
+            self.error_rate,
+        )
+        for jti in jtis:
+            bloom.add(jti)
+        self._filter = bloom
+        self._since = started
+        self._rebuilt_at = self._refreshed_at = time.monotonic()
+
+    def _update(self):
+        started = django_timezone.now()
+        for jti in RevokedToken.objects.filter(
+            revoked_at__gte=self._since - self.overlap
+        ).values_list("jti", flat=True):
+            # The overlap window returns tokens again, count each only once.
+            if jti not in self._filter:
+                self._filter.add(jti)
+        self._since = started
+        self._refreshed_at = time.monotonic()
+
+    def _stale(self):
+        return (
+            self._filter is None
+            or time.monotonic() - self._refreshed_at
+            >= settings.TOKEN_REVOCATION_REFRESH_SECONDS
+        )
+
+
+revocation_list = RevocationList()
+
+
+def token_jti(payload, token):
+    """
+    The `jti` claim of a token. Tokens issued before the claim existed are
+    identified by a hash of the token itself.
+    """
+    jti = payload.get("jti")
+    if jti:
+        return jti
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def revoke_token(token, user):
+    """Revokes a valid token of `user` until it expires."""
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
+    jti = token_jti(payload, token)
+    RevokedToken.objects.bulk_create(
+        [
+            RevokedToken(
+                jti=jti,
+                user=user,
+                expires_at=datetime.fromtimestamp(payload["exp"], tz=timezone.utc),
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    revocation_list.add(jti)
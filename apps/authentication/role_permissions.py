@@ -0,0 +1,67 @@
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+
+class RolePermissionMap:
+    """
+    Process wide map from a role id to the names of its active permissions,
+    so that permission checks do not query the database on every request.
+    Inactive roles grant no permissions.
+
+    The map is loaded with a single query and reloaded once it is older than
+    ROLE_PERMISSION_CACHE_TTL seconds. Role and permission writes made by
+    this process clear it right away, other processes pick them up within
+    the TTL. A TTL of 0 turns the cache off.
+    """
+
+    def __init__(self):
+        self._permissions = None
+        self._loaded_at = 0.0
+
+    def get(self, role_id):
+        if not settings.ROLE_PERMISSION_CACHE_TTL:
+            from .models import Permission
+
+            return list(
+                Permission.objects.filter(
+                    role_id=role_id, active=True, role__active=True
+                ).values_list("name", flat=True)
+            )
+
+        permissions = self._permissions
+        if permissions is None or self._stale():
+            permissions = self.load()
+        return list(permissions.get(role_id, ()))
+
+    def refresh(self):
+        """Loads the map unless a fresh one is in place."""
+        if settings.ROLE_PERMISSION_CACHE_TTL and self._stale():
+            self.load()
+
+    def load(self):
+        from .models import Permission
+
+        permissions = defaultdict(list)
+        # Only active permissions of active roles grant anything, as in the
+        # authorization check and the policy export.
+        active = Permission.objects.filter(active=True, role__active=True)
+        for role_id, name in active.values_list("role_id", "name"):
+            permissions[role_id].append(name)
+        # Swap in a complete map, readers never see a half loaded one.
+        self._permissions = dict(permissions)
+        self._loaded_at = time.monotonic()
+        return self._permissions
+
+    def clear(self):
+        self._permissions = None
+
+    def _stale(self):
+        return (
+            self._permissions is None
+            or time.monotonic() - self._loaded_at > settings.ROLE_PERMISSION_CACHE_TTL
+        )
+
+
+role_permissions = RolePermissionMap()
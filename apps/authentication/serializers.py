@@ -1,10 +1,15 @@
 import re
 
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.tokens import default_token_generator
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 from .models import User, Role, Permission
+from .policy import record_policy_change
+from .role_permissions import role_permissions
 
 
 class RegistrationSerializer(serializers.ModelSerializer):
@@ -165,9 +170,7 @@ class UserSerializer(serializers.ModelSerializer):
             )
         return data
     def validate_role(self, role):
-        if role not in ["admin", "moderator", "member", "guest"]:
-            raise serializers.ValidationError(f"{role} is not a valid role.")
-        return role
+        return _get_role(role)
     # The client should not be able to send a token along with a registration
     # request. Making `token` read-only handles that for us.
 
@@ -244,15 +247,17 @@ class UserUpdateSerializer(serializers.ModelSerializer):
     def validate_role(self, role):
         if role == "":
             return
-        if role not in ["admin", "moderator", "member", "guest"]:
-            raise serializers.ValidationError(f"{role} is not a valid role.")
-        return role
+        return _get_role(role)
 
     class Meta:
         model = User
         fields = ["id", "email", "username", "password", "role"]
 
     def update(self,instance,  validated_data):
+        validated_data = dict(validated_data)
+        if validated_data.pop("role", None):
+            # validate_role() looked the role up already.
+            instance.role = self.validated_data["role"]
         instance.__dict__.update(**validated_data)
         return UserSerializer(instance)
     
@@ -359,17 +364,25 @@ class RoleSerializer(serializers.Serializer):
         return name
 
     def validate_permissions(self, permissions):
+        taken = set(
+            Permission.objects.filter(name__in=permissions).values_list(
+                "name", flat=True
+            )
+        )
         for permission in permissions:
-            if permission in [
-                permission.name for permission in Permission.objects.all()
-            ]:
+            if permission in taken:
                 raise serializers.ValidationError(f"{permission} is not unique.")
         return permissions
 
     def create(self, validated_data):
         role = Role.objects.get(id=3)
-        for permission_name in validated_data["permissions"]:
-            Permission.objects.create(name=permission_name, role=role)
+        Permission.objects.bulk_create(
+            Permission(name=permission_name, role=role)
+            for permission_name in validated_data["permissions"]
+        )
+        # bulk_create() sends no post_save signal.
+        role_permissions.clear()
+        record_policy_change(role.name)
 
         return {
             "id": role.id,
@@ -421,11 +434,14 @@ class PermissionSerializer(serializers.ModelSerializer):
         # or response, including fields specified explicitly above.
         fields = ["id", "name", "role"]
 
-    def validate_name(self, name):
-        for name in name:
-            if name in [permission.name for permission in Permission.objects.all()]:
+    def validate_name(self, names):
+        taken = set(
+            Permission.objects.filter(name__in=names).values_list("name", flat=True)
+        )
+        for name in names:
+            if name in taken:
                 raise serializers.ValidationError(f"{name} is not unique.")
-        return name
+        return names
 
     def to_representation(self, value):
         return RoleUpdateSerializer(value).data
@@ -435,8 +451,12 @@ class PermissionSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         role = self.context["role"]
-        for permission_name in validated_data["name"]:
-            Permission.objects.create(name=permission_name, role=role)
+        Permission.objects.bulk_create(
+            Permission(name=permission_name, role=role)
+            for permission_name in validated_data["name"]
+        )
+        role_permissions.clear()
+        record_policy_change(role.name)
         return role
 
 class PermissionUpdateSerializer(serializers.ModelSerializer):
@@ -447,11 +467,96 @@ class PermissionUpdateSerializer(serializers.ModelSerializer):
         fields = ["id", "name"]
 
     def validate_name(self, name):
-        for name in name:
-            if name in [permission.name for permission in Permission.objects.all()]:
-                raise serializers.ValidationError(f"{name} is not unique.")
+        if Permission.objects.filter(name=name).exists():
+            raise serializers.ValidationError(f"{name} is not unique.")
         return name
 
     def update(self, instance, data):
         instance.__dict__.update(**data)
-        return PermissionUpdateSerializer(instance).data
\ No newline at end of file
+        return PermissionUpdateSerializer(instance).data
+
+class AuthorizationCheckSerializer(serializers.Serializer):
+    """Takes up to AUTHORIZATION_CHECK_LIMIT [user id, permission] pairs."""
+
+    checks = serializers.ListField(required=True, allow_empty=False)
+
+    def validate_checks(self, checks):
+        # Checked by hand, a child field per pair is too slow for 10k pairs.
+        limit = settings.AUTHORIZATION_CHECK_LIMIT
+        if len(checks) > limit:
+            raise serializers.ValidationError(
+                f"At most {limit} checks can be made at once."
+            )
+        pairs = []
+        for check in checks:
+            if (
+                not isinstance(check, list)
+                or len(check) != 2
+                or type(check[0]) is not int
+                or not isinstance(check[1], str)
+            ):
+                raise serializers.ValidationError(
+                    "Every check must be a [user id, permission name] pair."
+                )
+            pairs.append((check[0], check[1]))
+        return pairs
+
+
+class RoleAssignmentSerializer(serializers.Serializer):
+    role = serializers.CharField(max_length=50)
+    # The users to move, every given criterion must match.
+    user_ids = serializers.ListField(required=False, allow_empty=False)
+    from_role = serializers.CharField(max_length=50, required=False)
+    email_domain = serializers.CharField(max_length=255, required=False)
+
+    def validate_role(self, role):
+        return _get_role(role)
+
+    def validate_from_role(self, role):
+        return _get_role(role)
+
+    def validate_user_ids(self, user_ids):
+        # Checked by hand, a child field per id is too slow for 100k ids.
+        limit = settings.ROLE_ASSIGNMENT_LIMIT
+        if len(user_ids) > limit:
+            raise serializers.ValidationError(
+                f"At most {limit} users can be reassigned at once."
+            )
+        for user_id in user_ids:
+            if type(user_id) is not int:
+                raise serializers.ValidationError("Every user id must be a number.")
+        return user_ids
+
+    def validate(self, data):
+        if not {"user_ids", "from_role", "email_domain"} & set(data):
+            raise serializers.ValidationError(
+                "Name the users with user_ids, from_role or email_domain."
+            )
+        return data
+
+    def create(self, validated_data):
+        role = validated_data["role"]
+        users = User.objects.exclude(role=role)
+        if "user_ids" in validated_data:
+            users = users.filter(id__in=validated_data["user_ids"])
+        if "from_role" in validated_data:
+            users = users.filter(role=validated_data["from_role"])
+        if "email_domain" in validated_data:
+            domain = validated_data["email_domain"].lower()
+            users = users.filter(email__iendswith=f"@{domain}")
+
+        with transaction.atomic():
+            # One UPDATE whatever the number of users, update() skips save()
+            # and signals, so updated_at is set here.
+            count = users.update(role=role, updated_at=timezone.now())
+            if count:
+                record_policy_change(role.name)
+        return {"role": role.name, "count": count}
+
+
+def _get_role(name):
+    # Users point at Role rows, any role that exists can be assigned.
+    role = Role.objects.filter(name=name).first()
+    if role is None:
+        raise serializers.ValidationError(f"{name} is not a valid role.")
+    return role
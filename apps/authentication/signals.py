@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Permission, Role
+from .policy import record_policy_change
+from .role_permissions import role_permissions
+
+
+@receiver([post_save, post_delete], sender=Role)
+@receiver([post_save, post_delete], sender=Permission)
+def clear_role_permissions(sender, **kwargs):
+    """Reloads the role permission map after a role or permission changed."""
+    role_permissions.clear()
+
+
+@receiver(pre_save, sender=Role)
+@receiver(pre_save, sender=Permission)
+def remember_policy_role(sender, instance, raw=False, **kwargs):
+    # A renamed role, or a permission moved to another role, changes the
+    # role it belonged to before as well.
+    if instance.pk is None or raw:
+        return
+    field = "name" if sender is Role else "role__name"
+    instance._policy_role = (
+        sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+    )
+
+
+@receiver([post_save, post_delete], sender=Role)
+@receiver([post_save, post_delete], sender=Permission)
+def record_policy_role(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    role = instance.name if sender is Role else instance.role.name
+    record_policy_change(role, getattr(instance, "_policy_role", None))
@@ -1,3 +1,345 @@
-from django.test import TestCase
+from django.db.models import ProtectedError
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from apps.core.testing import QueryBudgetTestMixin
+from apps.core.warmup import refresh_caches
+from .authentication import JWTAuthentication
+from .models import Permission, PolicyChange, Role, User
+from .role_permissions import role_permissions
+from .urls import urlpatterns
+
+ADMIN_PERMISSIONS = [
+    "can_create_role",
+    "can_create_permission",
+    "can_assign_role",
+    "can_update_user",
+    "can_check_permissions",
+    "can_read_policy",
+]
+
+
+def bearer(user):
+    token = user.token
+    if isinstance(token, bytes):
+        token = token.decode("utf-8")
+    return f"Bearer {token}"
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Role.objects.create(name="admin")
+        for name in ADMIN_PERMISSIONS:
+            Permission.objects.create(name=name, role=cls.admin)
+        cls.user = User.objects.create_user_with_role(
+            "admin", "admin@example.com", "admin", password="Passw0rd!"
+        )
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.user))
+
+    def test_every_route_declares_a_budget(self):
+        self.assertEveryRouteHasBudget(urlpatterns)
+
+    def test_signup(self):
+        self.client.credentials()
+        response = self.request_within_budget(
+            "POST",
+            "/api/users/signup",
+            {
+                "user": {
+                    "username": "jake",
+                    "email": "jake@example.com",
+                    "password": "Passw0rd!",
+                }
+            },
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_login(self):
+        self.client.credentials()
+        response = self.request_within_budget(
+            "POST",
+            "/api/users/login/",
+            {"user": {"email": "admin@example.com", "password": "Passw0rd!"}},
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_create_user_with_role(self):
+        Role.objects.create(name="member")
+        response = self.request_within_budget(
+            "POST",
+            "/api/admin/users/create",
+            {
+                "username": "jake",
+                "email": "jake@example.com",
+                "password": "Passw0rd!",
+                "role": "member",
+            },
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data["role"], "member")
+
+    def test_update_user(self):
+        response = self.request_within_budget(
+            "PUT", f"/api/admin/users/{self.user.pk}/update", {"username": "jake"}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_create_role(self):
+        # RoleSerializer.create attaches the permissions to the role with id 3.
+        Role.objects.create(id=3, name="member")
+        response = self.request_within_budget(
+            "POST",
+            "/api/roles/",
+            {"name": "moderator", "permissions": ["can_edit", "can_review"]},
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_update_role(self):
+        response = self.request_within_budget(
+            "PUT", f"/api/roles/{self.admin.pk}/update", {"name": "moderator"}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_list_roles(self):
+        for name in ["moderator", "member", "guest"]:
+            role = Role.objects.create(name=name)
+            Permission.objects.create(name=f"{name}_permission", role=role)
+        response = self.request_within_budget("GET", "/api/roles/list/")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNoNPlusOne("/api/roles/list/", page_sizes=(1, 4))
+
+    def test_create_permission(self):
+        response = self.request_within_budget(
+            "POST", f"/api/roles/{self.admin.pk}/", {"name": ["can_edit"]}
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_logout_revokes_only_that_token(self):
+        other_token = bearer(self.user)
+        response = self.request_within_budget("POST", "/api/users/logout")
+        self.assertEqual(response.status_code, 200, response.content)
+
+        response = self.client.get("/api/roles/list/")
+        self.assertEqual(response.status_code, 403, response.content)
+        self.assertIn("revoked", response.json()["detail"])
+
+        self.client.credentials(HTTP_AUTHORIZATION=other_token)
+        response = self.client.get("/api/roles/list/")
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_valid_tokens_skip_the_revocation_table(self):
+        refresh_caches()
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=bearer(self.user))
+        # Only the user lookup.
+        with self.assertNumQueries(1):
+            user, _ = JWTAuthentication().authenticate(request)
+        self.assertEqual(user, self.user)
+
+    @override_settings(ROLE_PERMISSION_CACHE_TTL=30)
+    def test_created_permissions_apply_right_away(self):
+        self.assertNotIn("can_edit", self.user.permissions)
+        self.client.post(
+            f"/api/roles/{self.admin.pk}/", {"name": ["can_edit"]}, format="json"
+        )
+        self.assertIn("can_edit", self.user.permissions)
+
+        with self.assertNumQueries(0):
+            self.user.permissions
+
+    def test_only_active_permissions_of_active_roles_apply(self):
+        # The map loaded here would outlive the rolled back test data.
+        self.addCleanup(role_permissions.clear)
+        permission = Permission.objects.get(name="can_update_user")
+        permission.active = False
+        permission.save()
+        for ttl in (30, 0):
+            with override_settings(ROLE_PERMISSION_CACHE_TTL=ttl):
+                self.assertNotIn("can_update_user", self.user.permissions)
+                self.assertIn("can_create_role", self.user.permissions)
+
+        self.admin.active = False
+        self.admin.save()
+        for ttl in (30, 0):
+            with override_settings(ROLE_PERMISSION_CACHE_TTL=ttl):
+                self.assertEqual(self.user.permissions, [])
+
+    def test_renamed_roles_keep_their_users(self):
+        self.admin.name = "moderator"
+        self.admin.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.role.name, "moderator")
+        self.assertEqual(sorted(self.user.permissions), sorted(ADMIN_PERMISSIONS))
+        with self.assertRaises(ProtectedError):
+            self.admin.delete()
+
+    def test_update_permission(self):
+        permission = Permission.objects.get(name="can_update_user")
+        response = self.request_within_budget(
+            "PUT", f"/api/permissions/{permission.pk}/", {"name": "can_review"}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_authorization_check(self):
+        member = Role.objects.create(name="member")
+        Permission.objects.create(name="can_read", role=member)
+        Permission.objects.create(name="can_share", role=member, active=False)
+        guest = Role.objects.create(name="guest", active=False)
+        Permission.objects.create(name="can_browse", role=guest)
+        reader = User.objects.create_user_with_role(
+            "reader", "reader@example.com", "member", password="Passw0rd!"
+        )
+        visitor = User.objects.create_user_with_role(
+            "visitor", "visitor@example.com", "guest", password="Passw0rd!"
+        )
+        checks = [
+            [reader.pk, "can_read"],
+            [reader.pk, "can_share"],
+            [reader.pk, "can_create_role"],
+            [self.user.pk, "can_create_role"],
+            [visitor.pk, "can_browse"],
+            [0, "can_read"],
+        ] * 1000
+        response = self.request_within_budget(
+            "POST", "/api/authorization/check", {"checks": checks}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            response.json()["results"], [True, False, False, True, False, False] * 1000
+        )
+
+        response = self.client.post(
+            "/api/authorization/check", {"checks": [[reader.pk]]}, format="json"
+        )
+        self.assertEqual(response.status_code, 400, response.content)
+        response = self.client.post(
+            "/api/authorization/check", {"checks": checks * 2}, format="json"
+        )
+        self.assertEqual(response.status_code, 400, response.content)
+
+    @override_settings(ROLE_PERMISSION_CACHE_TTL=30)
+    def test_deactivation_revokes_access_everywhere(self):
+        self.addCleanup(role_permissions.clear)
+        member = Role.objects.create(name="member")
+        Permission.objects.create(name="can_create_note", role=member)
+        reader = User.objects.create_user_with_role(
+            "reader", "reader@example.com", "member", password="Passw0rd!"
+        )
+        note = {"title": "Note", "description": "d", "body": "b"}
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(reader))
+        response = self.client.post("/api/notes/", note, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+
+        member.active = False
+        member.save()
+        response = self.client.post("/api/notes/", note, format="json")
+        self.assertEqual(response.status_code, 403, response.content)
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.user))
+        check = {"checks": [[reader.pk, "can_create_note"]]}
+        response = self.client.post("/api/authorization/check", check, format="json")
+        self.assertEqual(response.json()["results"], [False])
+        self.assertFalse(self.client.get("/api/policy").json()["roles"].get("member"))
+
+        permission = Permission.objects.get(name="can_read_policy")
+        permission.active = False
+        permission.save()
+        self.assertEqual(self.client.get("/api/policy").status_code, 403)
+        response = self.client.post(
+            "/api/authorization/check",
+            {"checks": [[self.user.pk, "can_read_policy"]]},
+            format="json",
+        )
+        self.assertEqual(response.json()["results"], [False])
+
+    def test_reassign_users_in_bulk(self):
+        member = Role.objects.create(name="member")
+        guest = Role.objects.create(name="guest")
+        users = [
+            User.objects.create_user_with_role(
+                f"user{number}", f"user{number}@{domain}", guest
+            )
+            for number, domain in enumerate(["sales.example.com"] * 3 + ["x.org"])
+        ]
+        # Stored before addresses were normalized.
+        User.objects.filter(pk=users[2].pk).update(email="User2@SALES.Example.com")
+        version = PolicyChange.objects.count()
+
+        response = self.request_within_budget(
+            "POST",
+            "/api/admin/users/role",
+            {"role": "member", "user_ids": [users[0].pk, users[1].pk, 999999]},
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), {"role": "member", "count": 2})
+        self.assertEqual(PolicyChange.objects.count(), version + 1)
+        self.assertEqual(member.users.count(), 2)
+
+        response = self.request_within_budget(
+            "POST",
+            "/api/admin/users/role",
+            {
+                "role": "member",
+                "from_role": "guest",
+                "email_domain": "Sales.example.com",
+            },
+        )
+        self.assertEqual(response.json(), {"role": "member", "count": 1})
+        self.assertEqual(list(guest.users.all()), [users[3]])
+
+        # Any role that exists can be assigned, not only the built-in ones.
+        editor = Role.objects.create(name="editor")
+        response = self.request_within_budget(
+            "POST",
+            "/api/admin/users/role",
+            {"role": "editor", "user_ids": [users[3].pk]},
+        )
+        self.assertEqual(response.json(), {"role": "editor", "count": 1})
+        self.assertEqual(list(editor.users.all()), [users[3]])
+
+        response = self.client.post(
+            "/api/admin/users/role", {"role": "member"}, format="json"
+        )
+        self.assertEqual(response.status_code, 400, response.content)
+        with override_settings(ROLE_ASSIGNMENT_LIMIT=2):
+            response = self.client.post(
+                "/api/admin/users/role",
+                {"role": "member", "user_ids": [1, 2, 3]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 400, response.content)
+
+    def test_policy_snapshot_and_delta(self):
+        response = self.request_within_budget("GET", "/api/policy")
+        self.assertEqual(response.status_code, 200, response.content)
+        version = response.json()["version"]
+        self.assertEqual(response["ETag"], f'"{version}"')
+        self.assertEqual(
+            response.json()["roles"], {"admin": sorted(ADMIN_PERMISSIONS)}
+        )
+
+        response = self.request_within_budget(
+            "GET", "/api/policy", HTTP_IF_NONE_MATCH=f'"{version}"'
+        )
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(f"/api/policy?since_version={version}")
+        self.assertEqual(response.status_code, 304)
+
+        self.client.post(
+            f"/api/roles/{self.admin.pk}/", {"name": ["can_edit"]}, format="json"
+        )
+        Role.objects.create(name="guest").delete()
+        response = self.request_within_budget(
+            "GET", f"/api/policy?since_version={version}"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertGreater(response.json()["version"], version)
+        self.assertEqual(
+            response.json()["roles"],
+            {"admin": sorted(ADMIN_PERMISSIONS + ["can_edit"]), "guest": None},
+        )
+
+        response = self.client.get("/api/policy?since_version=latest")
+        self.assertEqual(response.status_code, 400, response.content)
 
-# Create your tests here.
@@ -1,13 +1,17 @@
 from django.urls import path
 
 from .views import (
+    AuthorizationCheckView,
     LoginAPIView,
+    LogoutAPIView,
+    PolicyView,
     RegistrationAPIView,
     RoleViewSet,
     RoleUpdateView,
     PermissionCreateView,
     PermissionUpdateView,
     UserCreateView,
+    UserRoleAssignmentView,
     UserUpdateView,
 )
 
@@ -17,10 +21,22 @@ urlpatterns = [
     path("admin/users/create", UserCreateView.as_view(), name="user_signup"),
     # path("admin/users/play/<int:pk>", UserUpdateView.as_view()),
     path("users/login/", LoginAPIView.as_view(), name="user_login"),
+    path("users/logout", LogoutAPIView.as_view(), name="user_logout"),
     path("roles/", RoleViewSet.as_view({"post": "create"}), name="create_role"),
     path("roles/<int:pk>/update", RoleUpdateView.as_view()),
     path("roles/list/", RoleViewSet.as_view({"get": "list"})),
     path("roles/<int:pk>/", PermissionCreateView.as_view()),
     path("permissions/<int:pk>/", PermissionUpdateView.as_view()),
     path("admin/users/<int:pk>/update", UserUpdateView.as_view()),
+    path(
+        "admin/users/role",
+        UserRoleAssignmentView.as_view(),
+        name="user_role_assignment",
+    ),
+    path(
+        "authorization/check",
+        AuthorizationCheckView.as_view(),
+        name="authorization_check",
+    ),
+    path("policy", PolicyView.as_view(), name="policy"),
 ]
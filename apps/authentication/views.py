@@ -4,15 +4,24 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from rest_framework.generics import GenericAPIView
+from rest_framework.views import APIView
 from .models import Role, Permission, User
+from .authorization import check_permissions
+from .policy import policy_changes, policy_roles, policy_version
+from .revocation import revoke_token
 from functools import partial
-from rest_framework.exceptions import NotFound
+from django.utils.http import parse_etags
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework import mixins, status, viewsets
+from apps.core.decorators import latency_budget, query_budget
+from apps.core.idempotency import idempotent
 from apps.core.permissions import UserHasPermission
 from .serializers import (
+    AuthorizationCheckSerializer,
     LoginSerializer,
     RegistrationSerializer,
     RoleSerializer,
+    RoleAssignmentSerializer,
     RolesSerializer,
     RoleUpdateSerializer,
     PermissionSerializer,
@@ -26,6 +35,7 @@ class RegistrationAPIView(GenericAPIView):
     permission_classes = (AllowAny,)
     serializer_class = RegistrationSerializer
 
+    @query_budget(4)
     @swagger_auto_schema(
         operation_description="User Registration", operation_id="register_user"
     )
@@ -42,6 +52,7 @@ class LoginAPIView(GenericAPIView):
     permission_classes = (AllowAny,)
     serializer_class = LoginSerializer
 
+    @query_budget(1)
     @swagger_auto_schema(operation_description="User Login", operation_id="user_login")
     def post(self, request):
         user = request.data.get("user", {})
@@ -50,6 +61,19 @@ class LoginAPIView(GenericAPIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class LogoutAPIView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    @query_budget(2)
+    @swagger_auto_schema(operation_description="User Logout", operation_id="user_logout")
+    def post(self, request):
+        """Revokes the token the request was made with."""
+        revoke_token(request.auth, request.user)
+        return Response(
+            {"message": "You have successfully logged out"}, status=status.HTTP_200_OK
+        )
+
+
 class RoleViewSet(
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
@@ -63,13 +87,16 @@ class RoleViewSet(
     endpoints in one class
     """
 
-    queryset = Role.objects.all()
+    # Prefetching permissions also caches their role, which
+    # RolePermissionSerializer.get_role reads for every permission.
+    queryset = Role.objects.prefetch_related("permissions").order_by("id")
     permission_classes = [
         IsAuthenticated,
         partial(UserHasPermission, "can_create_role"),
     ]
     serializer_class = RoleSerializer
     # pagination_class = LimitOffsetPagination
+    @query_budget(8)
     @swagger_auto_schema(
         operation_description="Create Role", operation_id="role_create"
     )
@@ -87,6 +114,7 @@ class RoleViewSet(
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @query_budget(5)
     @swagger_auto_schema(
         operation_description="Get Roles List",
         operation_id="roles_list",
@@ -109,6 +137,7 @@ class RoleUpdateView(GenericAPIView):
     ]
     serializer_class = RoleUpdateSerializer
 
+    @query_budget(4)
     @swagger_auto_schema(
         operation_description="Update Role", operation_id="role_update"
     )
@@ -140,6 +169,8 @@ class PermissionCreateView(GenericAPIView):
     ]
     serializer_class = PermissionSerializer
 
+    @query_budget(7)
+    @latency_budget(2.0)
     @swagger_auto_schema(
         operation_description="Update Role",
         operation_id="create_permission",
@@ -174,6 +205,7 @@ class PermissionUpdateView(GenericAPIView):
     ]
     serializer_class = PermissionUpdateSerializer
 
+    @query_budget(4)
     @swagger_auto_schema(
         operation_description="Update Role",
         operation_id="create_permission",
@@ -206,11 +238,13 @@ class UserCreateView(GenericAPIView):
     ]
     serializer_class = UserSerializer
 
+    @query_budget(5)
     @swagger_auto_schema(
         operation_description="Update Role",
         operation_id="create_user_with_permission",
         responses={200: UserSerializer},
     )
+    @idempotent
     def post(self, request):
 
         """Updates a role in the database if it does not exist
@@ -231,6 +265,7 @@ class UserUpdateView(GenericAPIView):
         partial(UserHasPermission, "can_update_user"),
     ]
     serializer_class = UserUpdateSerializer
+    @query_budget(4)
     @swagger_auto_schema(
         operation_description="Update User",
         operation_id="create_user_details",
@@ -254,4 +289,93 @@ class UserUpdateView(GenericAPIView):
             serializer_result = serializer.update(serializer_instance, serializer_data)
             return Response(serializer_result.data, status=status.HTTP_200_OK)
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class UserRoleAssignmentView(GenericAPIView):
+    permission_classes = [
+        IsAuthenticated,
+        partial(UserHasPermission, "can_assign_role"),
+    ]
+    serializer_class = RoleAssignmentSerializer
+
+    @query_budget(6)
+    @latency_budget(30.0)
+    @swagger_auto_schema(
+        operation_description="Reassign Users to a Role",
+        operation_id="user_role_assignment",
+    )
+    def post(self, request):
+
+        """Gives a role to every user in user_ids, or matching from_role
+        and email_domain, and returns how many users changed role
+        """
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.save(), status=status.HTTP_200_OK)
+
+
+class AuthorizationCheckView(GenericAPIView):
+    permission_classes = [
+        IsAuthenticated,
+        partial(UserHasPermission, "can_check_permissions"),
+    ]
+    serializer_class = AuthorizationCheckSerializer
+
+    @query_budget(2)
+    @latency_budget(2.0)
+    @swagger_auto_schema(
+        operation_description="Check Permissions",
+        operation_id="authorization_check",
+    )
+    def post(self, request):
+
+        """Tells for every [user id, permission name] pair whether the
+        user has that permission, as an array of booleans in the same order
+        """
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = check_permissions(serializer.validated_data["checks"])
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+class PolicyView(APIView):
+    permission_classes = [
+        IsAuthenticated,
+        partial(UserHasPermission, "can_read_policy"),
+    ]
+
+    @query_budget(4)
+    @swagger_auto_schema(
+        operation_description="Role Permission Policy", operation_id="policy_read"
+    )
+    def get(self, request):
+
+        """Returns the active permissions of every active role with the
+        policy version, or with ?since_version= only the roles changed since
+        """
+        since_version = request.query_params.get("since_version")
+        if since_version is not None:
+            if not since_version.isdigit():
+                raise ValidationError({"since_version": "Must be a version number."})
+            since_version = int(since_version)
+
+        # Read before the roles, a change in between is sent again next time.
+        version = policy_version()
+        etag = f'"{version}"'
+        if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")) or (
+            since_version is not None and since_version >= version
+        ):
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+
+        if since_version is None:
+            roles = policy_roles()
+        else:
+            roles = policy_changes(since_version)
+        return Response(
+            {"version": version, "delta": since_version is not None, "roles": roles},
+            status=status.HTTP_200_OK,
+            headers={"ETag": etag, "Cache-Control": "no-cache"},
+        )
@@ -0,0 +1,163 @@
+import io
+import json
+from datetime import date, datetime, time
+
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def copy_rows(table, columns, rows, using=DEFAULT_DB_ALIAS):
+    """
+    Streams `rows` into `table` with a single PostgreSQL COPY statement.
+    Every row must be a sequence of database-ready values lined up with
+    `columns`. Returns the number of rows written.
+    """
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+
+    buffer = io.StringIO()
+    count = 0
+    for row in rows:
+        buffer.write("\t".join(_copy_value(value) for value in row))
+        buffer.write("\n")
+        count += 1
+
+    if not count:
+        return 0
+
+    buffer.seek(0)
+    sql = "COPY {} ({}) FROM STDIN".format(
+        quote_name(table), ", ".join(quote_name(column) for column in columns)
+    )
+    with connection.cursor() as cursor:
+        cursor.copy_expert(sql, buffer)
+    return count
+
+
+def bulk_insert(model, objs, using=DEFAULT_DB_ALIAS, batch_size=1000):
+    """
+    Inserts unsaved model instances as fast as the backend allows.
+    PostgreSQL gets a COPY, every other backend falls back to bulk_create().
+    Primary keys are only written when every instance already carries one,
+    otherwise the database sequence hands them out.
+    Model save() and signals are not called, exactly like bulk_create().
+    """
+    objs = list(objs)
+    if not objs:
+        return 0
+
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        model._default_manager.using(using).bulk_create(objs, batch_size=batch_size)
+        return len(objs)
+
+    with_pk = all(obj.pk is not None for obj in objs)
+    fields = [
+        field
+        for field in model._meta.concrete_fields
+        if with_pk or not field.primary_key
+    ]
+    rows = (
+        [
+            field.get_db_prep_save(field.pre_save(obj, True), connection)
+            for field in fields
+        ]
+        for obj in objs
+    )
+    return copy_rows(
+        model._meta.db_table, [field.column for field in fields], rows, using=using
+    )
+
+
+def copy_values(model, attnames, rows, using=DEFAULT_DB_ALIAS):
+    """
+    Writes plain tuples into `model`'s table without building model
+    instances, the fastest path for generated data. `rows` line up with
+    `attnames` and hold database-ready values; every other field gets its
+    default. Falls back to bulk_create() on backends without COPY.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        objs = [model(**dict(zip(attnames, row))) for row in rows]
+        model._default_manager.using(using).bulk_create(objs, batch_size=1000)
+        return len(objs)
+
+    positions = {attname: index for index, attname in enumerate(attnames)}
+    fields = [
+        field
+        for field in model._meta.concrete_fields
+        if field.attname in positions or not field.primary_key
+    ]
+    defaults = [
+        (
+            None
+            if field.attname in positions
+            else field.get_db_prep_save(field.get_default(), connection)
+        )
+        for field in fields
+    ]
+    indexes = [positions.get(field.attname) for field in fields]
+
+    def expand(row):
+        return [
+            row[index] if index is not None else default
+            for index, default in zip(indexes, defaults)
+        ]
+
+    return copy_rows(
+        model._meta.db_table,
+        [field.column for field in fields],
+        map(expand, rows),
+        using=using,
+    )
+
+
+def reset_sequences(*models, using=DEFAULT_DB_ALIAS):
+    """
+    Moves the primary key sequences of `models` past the highest stored id,
+    needed after rows were written with explicit primary keys.
+    """
+    connection = connections[using]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def _copy_value(value):
+    # COPY text format: tab separated, `\N` for NULL, backslash escapes.
+    if value is None:
+        return "\\N"
+    if type(value) is int:
+        # Most values are ids, which never need escaping.
+        return str(value)
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (list, tuple)):
+        value = _array_literal(value)
+    elif isinstance(value, (datetime, date, time)):
+        value = value.isoformat()
+    elif isinstance(value, dict):
+        value = json.dumps(value)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        value = "\\x" + bytes(value).hex()
+    else:
+        value = str(value)
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _array_literal(values):
+    items = []
+    for item in values:
+        if item is None:
+            items.append("NULL")
+        else:
+            item = str(item).replace("\\", "\\\\").replace('"', '\\"')
+            items.append('"{}"'.format(item))
+    return "{" + ",".join(items) + "}"
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Cache backends whose entries live in the memory of one process.
+PROCESS_LOCAL_CACHES = ("django.core.cache.backends.locmem.LocMemCache",)
+
+
+@register()
+def check_rate_limit_cache(app_configs, **kwargs):
+    """
+    Rate limits are one budget per user only when every worker counts in the
+    same cache, with a per process cache each worker grants the full limit.
+    """
+    backend = settings.CACHES["ratelimit"]["BACKEND"]
+    if settings.WORKER_PROCESSES > 1 and backend in PROCESS_LOCAL_CACHES:
+        return [
+            Warning(
+                f"The ratelimit cache ({backend}) is per process, each of the "
+                f"{settings.WORKER_PROCESSES} workers enforces the full limits.",
+                hint="Set RATE_LIMIT_CACHE_BACKEND and RATE_LIMIT_CACHE_LOCATION "
+                "to a shared cache, e.g. memcached.",
+                id="core.W001",
+            )
+        ]
+    return []
@@ -0,0 +1,107 @@
+import gzip
+import re
+import threading
+
+import brotli
+from django.conf import settings
+from rest_framework.response import Response
+
+# The encodings responses can be sent in, most preferred first.
+ENCODINGS = ("br", "gzip")
+
+# Content types worth compressing, binary formats are compressed already.
+COMPRESSIBLE_TYPES = re.compile(
+    r"^(text/|application/([\w.-]+\+)?(json|xml|yaml|javascript)\b)", re.IGNORECASE
+)
+
+# The suffix encoded_etag() adds to the strong ETag of an encoding.
+_ENCODING_SUFFIX = re.compile(r'-(?:{})"'.format("|".join(ENCODINGS)))
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Picks the encoding of an Accept-Encoding header, the supported one with
+    the highest q-value and br over gzip on ties. None means identity.
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def encoded_etag(etag, encoding):
+    """
+    The ETag of the `encoding` of a representation tagged `etag`: strong
+    ETags get the encoding as suffix, "3" becomes "3-gzip", since the
+    encodings differ byte for byte. Weak ETags apply to every encoding.
+    """
+    if not etag.startswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def strip_encoded_etags(header):
+    """Turns the ETags of encodings in an If-Match or If-None-Match back."""
+    return _ENCODING_SUFFIX.sub('"', header)
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class PrecompressedBody:
+    """
+    A rendered response body meant to be cached and sent many times. Each
+    encoding is compressed once, by the first response that needs it, and
+    kept along with the body, so later responses only copy bytes.
+    """
+
+    __slots__ = ("body", "content_type", "encoded", "lock")
+
+    def __init__(self, body, content_type=None):
+        self.body = body
+        self.content_type = content_type
+        self.encoded = {}
+        self.lock = threading.Lock()
+
+    def encode(self, encoding):
+        with self.lock:
+            encoded = self.encoded.get(encoding)
+            if encoded is None:
+                encoded = self.encoded[encoding] = compress(self.body, encoding)
+            return encoded
+
+
+class PrecompressedResponse(Response):
+    """
+    A Response sent from a PrecompressedBody instead of rendering `data`
+    again, CompressionMiddleware then takes the stored encoding as well.
+    `data` is kept for tests and other code that reads it.
+    """
+
+    def __init__(self, data, precompressed, **kwargs):
+        super().__init__(data, content_type=precompressed.content_type, **kwargs)
+        self.precompressed = precompressed
+
+    @property
+    def rendered_content(self):
+        self["Content-Type"] = self.precompressed.content_type
+        return self.precompressed.body
@@ -0,0 +1,121 @@
+import threading
+import time
+
+from rest_framework.permissions import SAFE_METHODS
+
+# Endpoint classes by path prefix, the first match wins. Note reads and
+# writes are told apart by the method. Authorization checks, which come in
+# bulk, and the role and permission endpoints get a class of their own so
+# they cannot take the capacity kept for admin work. Other paths are never
+# limited.
+ENDPOINT_CLASSES = (
+    ("/api/users/", "auth"),
+    ("/api/notes/", "notes"),
+    ("/api/authorization/", "authorization"),
+    ("/api/policy", "authorization"),
+    ("/api/roles/", "authorization"),
+    ("/api/permissions/", "authorization"),
+    ("/api/admin/", "admin"),
+    ("/admin/", "admin"),
+)
+
+
+def endpoint_class(request):
+    for prefix, name in ENDPOINT_CLASSES:
+        if request.path_info.startswith(prefix):
+            if name == "notes":
+                return "note_reads" if request.method in SAFE_METHODS else "note_writes"
+            return name
+    return None
+
+
+class AdaptiveLimiter:
+    """
+    Caps the requests of one endpoint class in flight in this process.
+    Requests over the cap wait in a short queue for at most `wait` seconds,
+    when the queue is full or the wait runs out they are turned away.
+
+    The cap adapts to latency in the AIMD way: it grows by one per round of
+    requests while latency is normal and the cap is in use, and shrinks by
+    `backoff` at most once per round when latency rises. Like in Vegas and
+    gradient limiters, latency counts as risen when its short term average
+    goes `tolerance` times over its long term average, so a slow database
+    lowers the cap before requests pile up. It never goes under `min_limit`,
+    which keeps capacity for that class reserved.
+    """
+
+    tolerance = 2.0
+    backoff = 0.9
+    short_weight = 0.1
+    # The long term average rises ten times slower than it falls, a lasting
+    # slowdown is only taken for the new normal after thousands of requests.
+    long_weight_up = 0.001
+    long_weight_down = 0.01
+
+    def __init__(self, initial, min_limit, max_limit, queue, wait):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.queue_size = queue
+        self.max_wait = wait
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.short_latency = None
+        self.long_latency = None
+        self.cooldown = 0
+
+    @property
+    def capacity(self):
+        return max(self.min_limit, int(self.limit))
+
+    def acquire(self):
+        """Returns whether the request may go ahead, waiting if need be."""
+        with self.condition:
+            if self.in_flight < self.capacity:
+                self.in_flight += 1
+                return True
+            if self.waiting >= self.queue_size:
+                return False
+            deadline = time.monotonic() + self.max_wait
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.capacity:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            return True
+
+    def release(self, latency):
+        """Ends a request that took `latency` seconds."""
+        with self.condition:
+            busy = self.in_flight
+            self.in_flight -= 1
+            self._adapt(latency, busy)
+            self.condition.notify()
+
+    def _adapt(self, latency, busy):
+        if self.short_latency is None:
+            self.short_latency = self.long_latency = latency
+            return
+        self.short_latency += self.short_weight * (latency - self.short_latency)
+        long_weight = (
+            self.long_weight_up
+            if latency > self.long_latency
+            else self.long_weight_down
+        )
+        self.long_latency += long_weight * (latency - self.long_latency)
+        if self.cooldown:
+            self.cooldown -= 1
+
+        if self.short_latency > self.long_latency * self.tolerance:
+            if not self.cooldown:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                # One decrease per round of requests, not per slow request.
+                self.cooldown = self.capacity
+        elif busy * 2 >= self.limit:
+            self.limit = min(self.max_limit, self.limit + 1 / max(self.limit, 1))
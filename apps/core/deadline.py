@@ -0,0 +1,87 @@
+import time
+
+from django.db import OperationalError
+from rest_framework.exceptions import APIException
+
+# SQLSTATE of a statement cancelled by statement_timeout.
+QUERY_CANCELED = "57014"
+
+# Transaction control is left alone, the statements it wraps carry the
+# timeout already.
+UNTIMED_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+# How far, in ms, queries outside transactions may run past the deadline
+# before statement_timeout is set again.
+TIMEOUT_SLACK_MS = 100
+
+
+class DeadlineExceeded(APIException):
+    status_code = 504
+    default_detail = "The request took too long, please try again shortly."
+    default_code = "deadline_exceeded"
+
+
+class Deadline:
+    """
+    Database execute wrapper that makes every query of a request share one
+    latency budget. Each query runs with a PostgreSQL statement_timeout of
+    the time left, a query started after the deadline is not run at all.
+    Either way the request ends with DeadlineExceeded.
+
+        with connection.execute_wrapper(Deadline(2.0)):
+            ...
+    """
+
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+        # The statement_timeout last set on the connection, in ms, or None.
+        self.applied = None
+
+    def remaining(self):
+        return self.expires - time.monotonic()
+
+    def __call__(self, execute, sql, params, many, context):
+        remaining_ms = int(self.remaining() * 1000)
+        # A statement_timeout of 0 would switch the timeout off.
+        if remaining_ms <= 0:
+            raise DeadlineExceeded()
+        connection = context["connection"]
+        if connection.vendor != "postgresql" or sql.startswith(UNTIMED_STATEMENTS):
+            return execute(sql, params, many, context)
+
+        self.apply(connection, remaining_ms)
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as error:
+            if getattr(error.__cause__, "pgcode", None) == QUERY_CANCELED:
+                raise DeadlineExceeded() from error
+            raise
+
+    def apply(self, connection, remaining_ms):
+        """
+        Sets statement_timeout to the time left in a statement of its own,
+        the query itself is sent unchanged, so server side cursors and
+        executemany() work as usual. Outside transactions the setting sticks
+        and is only renewed once the time left is TIMEOUT_SLACK_MS below it.
+        Inside one a rollback would undo it, so it is set before each query.
+        """
+        if (
+            self.applied is not None
+            and not connection.in_atomic_block
+            and self.applied - remaining_ms < TIMEOUT_SLACK_MS
+        ):
+            return
+        # The raw cursor keeps the setting out of query logs and budgets.
+        with connection.wrap_database_errors:
+            with connection.connection.cursor() as cursor:
+                cursor.execute(f"SET statement_timeout = {remaining_ms}")
+        self.applied = remaining_ms
+
+    def reset(self, connection):
+        """Restores the statement_timeout of the server configuration."""
+        if self.applied is None or connection.connection is None:
+            return
+        # The raw cursor keeps the reset out of query logs and budgets.
+        with connection.connection.cursor() as cursor:
+            cursor.execute("SET statement_timeout = DEFAULT")
+        self.applied = None
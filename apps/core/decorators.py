@@ -0,0 +1,81 @@
+def query_budget(queries):
+    """
+    Declares the most database queries a view handler may run for a single
+    request, authentication and permission checks included. The budget is
+    enforced by apps.core.testing.QueryBudgetTestMixin.
+
+        @query_budget(4)
+        def list(self, request):
+            ...
+    """
+
+    def decorator(handler):
+        handler.query_budget = queries
+        return handler
+
+    return decorator
+
+
+def latency_budget(seconds):
+    """
+    Declares how long a view handler may take, in seconds. Database queries
+    past the budget are cancelled and the request gets a 504, handlers
+    without a budget get LATENCY_BUDGET. Enforced by LatencyBudgetMiddleware.
+
+        @latency_budget(1.5)
+        def list(self, request):
+            ...
+    """
+
+    def decorator(handler):
+        handler.latency_budget = seconds
+        return handler
+
+    return decorator
+
+
+def view_handler(view_func, method):
+    """
+    Returns the class-based view and the handler that `view_func`, as
+    returned by as_view(), dispatches `method` to. Viewsets map methods to
+    actions, other views use the method name itself.
+    """
+    view_class = getattr(view_func, "cls", None) or getattr(
+        view_func, "view_class", None
+    )
+    if view_class is None:
+        return None, view_func
+
+    actions = getattr(view_func, "actions", None)
+    if actions is not None:
+        handler_name = actions.get(method.lower())
+    else:
+        handler_name = method.lower()
+    return view_class, getattr(view_class, handler_name or "", None)
+
+
+def handler_methods(view_func):
+    """Lists the HTTP methods `view_func` implements, OPTIONS excluded."""
+    actions = getattr(view_func, "actions", None)
+    if actions is not None:
+        return sorted(method.upper() for method in actions)
+
+    view_class = getattr(view_func, "cls", None) or getattr(
+        view_func, "view_class", None
+    )
+    return sorted(
+        method.upper()
+        for method in view_class.http_method_names
+        if method != "options" and hasattr(view_class, method)
+    )
+
+
+def get_view_attribute(view_func, method, name, default=None):
+    """
+    Reads a setting such as `query_budget` declared on the handler of
+    `method`, falling back to the view class and then to `default`.
+    """
+    view_class, handler = view_handler(view_func, method)
+    if hasattr(handler, name):
+        return getattr(handler, name)
+    return getattr(view_class, name, default)
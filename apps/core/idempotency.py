@@ -0,0 +1,123 @@
+import functools
+import hashlib
+import json
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+# Response headers stored along with the body.
+REPLAYED_HEADERS = ("ETag", "Location")
+
+
+def idempotent(handler):
+    """
+    Lets clients retry a request safely. A request with an Idempotency-Key
+    header runs once per user and key, retries within IDEMPOTENCY_KEY_TTL
+    seconds get the stored response without running the handler. A retry
+    sent while the first request is still running waits for it to finish.
+    A key reused for a different request gets a 422. The handler runs in
+    the transaction that stores its response.
+
+    Responses the handler returns are stored unless they are server errors,
+    requests that raise, e.g. on invalid data, can be retried with the key.
+    Apply it below the other decorators of the handler:
+
+        @query_budget(6)
+        @idempotent
+        def create(self, request):
+            ...
+    """
+
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        client_key = request.META.get("HTTP_IDEMPOTENCY_KEY")
+        if client_key is None:
+            return handler(view, request, *args, **kwargs)
+        if not client_key or len(client_key) > 255:
+            raise ValidationError(
+                {"Idempotency-Key": "Send a key of 1 to 255 characters."}
+            )
+
+        key = idempotency_key(request.user.pk, client_key)
+        fingerprint = _digest(
+            request.method,
+            request.path,
+            json.dumps(request.data, sort_keys=True, default=str),
+        )
+        with key_lock(key):
+            stored = IdempotencyKey.objects.filter(key=key).first()
+            now = timezone.now()
+            if stored is not None and stored.expires_at > now:
+                if stored.fingerprint != fingerprint:
+                    return Response(
+                        {"message": "This key was sent with another request"},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                response = Response(
+                    stored.body, status=stored.status_code, headers=stored.headers
+                )
+                response["Idempotent-Replayed"] = "true"
+                return response
+
+            # The handler's writes and the stored response commit together,
+            # a request failing in between leaves neither and can be retried.
+            with transaction.atomic():
+                response = handler(view, request, *args, **kwargs)
+                if response.status_code < 500:
+                    # An expired row of the same key is taken over.
+                    stored = stored or IdempotencyKey(key=key)
+                    stored.fingerprint = fingerprint
+                    stored.status_code = response.status_code
+                    stored.body = response.data
+                    stored.headers = {
+                        header: response[header]
+                        for header in REPLAYED_HEADERS
+                        if response.has_header(header)
+                    }
+                    stored.expires_at = now + timedelta(
+                        seconds=settings.IDEMPOTENCY_KEY_TTL
+                    )
+                    stored.save()
+            return response
+
+    return wrapper
+
+
+def idempotency_key(user_id, client_key):
+    """The stored key, the same client key of two users never clashes."""
+    return _digest(str(user_id), client_key)
+
+
+@contextmanager
+def key_lock(key):
+    """
+    Holds a PostgreSQL advisory lock for `key`, requests with the same key
+    queue up on it. Waiting counts towards the latency budget of the view.
+    """
+    if connection.vendor != "postgresql":
+        yield
+        return
+
+    # The first 64 bits of the digest, as the signed bigint locks take.
+    lock_id = int(key[:16], 16) - (1 << 63)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", [lock_id])
+    try:
+        yield
+    finally:
+        # The raw cursor is not subject to the latency budget, the lock has
+        # to be released even when the budget ran out.
+        with connection.connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [lock_id])
+
+
+def _digest(*parts):
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
@@ -0,0 +1,269 @@
+import json
+import math
+import platform
+import time
+from datetime import datetime, timezone
+from functools import partial
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from apps.authentication.authentication import JWTAuthentication
+from apps.authentication.models import Permission, Role, User
+from apps.core.permissions import UserHasPermission
+from apps.notes.models import Note
+
+PASSWORD = "Benchmark1!"
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the login, notes, roles and authentication hot paths "
+        "against a throwaway test database created next to the configured "
+        "one, so a local PostgreSQL is enough. Writes throughput and "
+        "p50/p95/p99 latency as JSON and can compare a run with an earlier "
+        "one, failing when a scenario got slower than the allowed threshold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument(
+            "--login-iterations",
+            type=int,
+            default=20,
+            help="Login hashes a password on every call, keep it short.",
+        )
+        parser.add_argument("--notes", type=int, default=200)
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            help="Only run the named scenario, may be repeated.",
+        )
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument(
+            "--compare", help="JSON results of an earlier run to compare with."
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.15,
+            help="Allowed relative p95 slowdown before a scenario fails.",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the benchmark database between runs.",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as source:
+                baseline = json.load(source)
+
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options["keepdb"]
+        )
+        try:
+            self._seed(options["notes"])
+            # Repeats would otherwise be answered from the shared note reads
+            # and the notes scenarios would stop measuring queries and
+            # serialization.
+            with override_settings(NOTE_READ_CACHE_SECONDS=0):
+                results = self._run(options)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options["keepdb"]
+            )
+            teardown_test_environment()
+
+        report = {
+            "meta": {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "iterations": options["iterations"],
+                "notes": options["notes"],
+            },
+            "results": results,
+        }
+        self._print(results)
+        if options["output"]:
+            with open(options["output"], "w") as target:
+                json.dump(report, target, indent=2)
+            self.stdout.write(f"Results written to {options['output']}.")
+
+        if baseline is not None:
+            regressions = self._compare(baseline["results"], results, options)
+            if regressions:
+                raise CommandError(
+                    "Slower than the baseline: {}.".format(", ".join(regressions))
+                )
+
+    def _seed(self, note_count):
+        role = Role.objects.create(name="admin")
+        Permission.objects.bulk_create(
+            Permission(name=name, role=role)
+            for name in ["can_create_note", "can_create_role"]
+        )
+        for name in ["moderator", "member", "guest"]:
+            other = Role.objects.create(name=name)
+            Permission.objects.create(name=f"can_act_as_{name}", role=other)
+
+        self.user = User.objects.create_user_with_role(
+            "benchmark", "benchmark@example.com", "admin", password=PASSWORD
+        )
+        Note.objects.bulk_create(
+            Note(
+                slug=f"benchmark-note-{number}",
+                title=f"Benchmark note {number}",
+                description="A note created by the benchmark command.",
+                body="Lorem ipsum dolor sit amet. " * 20,
+                author=self.user,
+            )
+            for number in range(note_count)
+        )
+        self.note = Note.objects.order_by("id").first()
+        Note.like.through.objects.bulk_create(
+            Note.like.through(note_id=note_id, user_id=self.user.id)
+            for note_id in list(Note.objects.values_list("id", flat=True))[::2]
+        )
+
+        token = self.user.token
+        self.token = token.decode("utf-8") if isinstance(token, bytes) else token
+
+    def _scenarios(self, options):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        anonymous = APIClient()
+        login = {"user": {"email": self.user.email, "password": PASSWORD}}
+
+        scenarios = {
+            "login": (
+                lambda: anonymous.post("/api/users/login/", login, format="json"),
+                options["login_iterations"],
+            ),
+            "note_detail": (lambda: client.get(f"/api/notes/{self.note.pk}"), None),
+            "roles_list": (lambda: client.get("/api/roles/list/"), None),
+            "auth_permission": (self._auth_permission_check(), None),
+        }
+        for page_size in (10, 50, 100):
+            scenarios[f"notes_list_{page_size}"] = (
+                partial(client.get, f"/api/notes/list?limit={page_size}"),
+                None,
+            )
+        return scenarios
+
+    def _auth_permission_check(self):
+        """JWTAuthentication and UserHasPermission without the HTTP stack."""
+        factory = APIRequestFactory()
+        authentication = JWTAuthentication()
+        permission = UserHasPermission("can_create_note")
+        header = f"Bearer {self.token}"
+
+        def check():
+            request = Request(factory.get("/", HTTP_AUTHORIZATION=header))
+            user, _ = authentication.authenticate(request)
+            request.user = user
+            if not permission.has_permission(request, None):
+                raise CommandError("The benchmark user lost its permission.")
+
+        return check
+
+    def _run(self, options):
+        scenarios = self._scenarios(options)
+        selected = options["scenario"] or list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(
+                "Unknown scenario {}, choose from {}.".format(
+                    ", ".join(sorted(unknown)), ", ".join(scenarios)
+                )
+            )
+
+        results = {}
+        for name in selected:
+            call, iterations = scenarios[name]
+            iterations = iterations or options["iterations"]
+            for _ in range(min(options["warmup"], iterations)):
+                self._check(name, call())
+
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                response = call()
+                timings.append(time.perf_counter() - started)
+                self._check(name, response)
+            results[name] = _summarize(timings)
+        return results
+
+    def _check(self, name, response):
+        status_code = getattr(response, "status_code", 200)
+        if status_code >= 400:
+            raise CommandError(f"{name} answered with status {status_code}.")
+
+    def _print(self, results):
+        self.stdout.write(
+            "{:<18} {:>10} {:>9} {:>9} {:>9}".format(
+                "scenario", "req/s", "p50 ms", "p95 ms", "p99 ms"
+            )
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                "{:<18} {:>10.1f} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+                    name,
+                    result["throughput"],
+                    result["p50_ms"],
+                    result["p95_ms"],
+                    result["p99_ms"],
+                )
+            )
+
+    def _compare(self, baseline, results, options):
+        regressions = []
+        self.stdout.write("\nCompared with the baseline (p95):")
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]["p95_ms"]
+            change = (result["p95_ms"] - before) / before if before else 0.0
+            slower = change > options["threshold"]
+            if slower:
+                regressions.append(name)
+            line = "{:<18} {:>9.2f} -> {:>9.2f} ms ({:+.1%})".format(
+                name, before, result["p95_ms"], change
+            )
+            self.stdout.write(self.style.ERROR(line) if slower else line)
+        return regressions
+
+
+def _summarize(timings):
+    ordered = sorted(timings)
+    total = sum(ordered)
+    return {
+        "iterations": len(ordered),
+        "throughput": len(ordered) / total if total else 0.0,
+        "mean_ms": total / len(ordered) * 1000,
+        "min_ms": ordered[0] * 1000,
+        "p50_ms": _percentile(ordered, 50) * 1000,
+        "p95_ms": _percentile(ordered, 95) * 1000,
+        "p99_ms": _percentile(ordered, 99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def _percentile(ordered, percent):
+    # Nearest-rank percentile of an already sorted list.
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
@@ -0,0 +1,42 @@
+import glob
+import os
+
+from django.core.management.base import BaseCommand
+
+from apps.core.schema import cached_schema_view, code_version, schema_cache_dir
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates the OpenAPI schema of the current code version into "
+        "SCHEMA_CACHE_DIR, e.g. during a deploy, so that workers running with "
+        "SCHEMA_CACHE=file serve it without introspecting the views."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Delete the schemas of other code versions.",
+        )
+
+    def handle(self, *args, **options):
+        view = cached_schema_view()
+        codec_classes = [
+            renderer.codec_class
+            for renderer in view.renderer_classes
+            if getattr(renderer, "codec_class", None)
+        ]
+        paths = view.cache.write_files(codec_classes)
+        for path in paths:
+            self.stdout.write(f"Wrote {path}")
+
+        if options["prune"]:
+            pattern = os.path.join(schema_cache_dir(), "openapi-*")
+            for path in set(glob.glob(pattern)) - set(paths):
+                os.remove(path)
+                self.stdout.write(f"Removed {path}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Schema of code version {code_version()} is ready.")
+        )
@@ -0,0 +1,124 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so that nothing is imported or warm yet.
+CHILD_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import permissions_app.wsgi
+loaded = time.perf_counter() - started
+from apps.core.warmup import warm_up
+timings = warm_up(connect={connect})
+sys.stdout.write(json.dumps({{"load": loaded, "warm_up": timings}}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Starts the WSGI application in a fresh Python process and reports "
+        "the import time per package and module (python -X importtime) and "
+        "the cost of every warm-up step, which is what a cold worker would "
+        "otherwise pay on its first requests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit", type=int, default=20, help="Slowest modules to list."
+        )
+        parser.add_argument(
+            "--skip-database",
+            action="store_true",
+            help="Leave out the database connection and permission map steps.",
+        )
+        parser.add_argument("--output", help="Write the report to this JSON file.")
+
+    def handle(self, *args, **options):
+        environment = dict(os.environ, WARM_UP="False")
+        environment.setdefault("DJANGO_SETTINGS_MODULE", "permissions_app.settings")
+        script = CHILD_SCRIPT.format(connect=not options["skip_database"])
+        child = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", script],
+            cwd=settings.BASE_DIR,
+            env=environment,
+            capture_output=True,
+            text=True,
+        )
+        if child.returncode:
+            raise CommandError(
+                "The application failed to start:\n" + child.stderr[-2000:]
+            )
+
+        modules = _parse_importtime(child.stderr)
+        result = json.loads(child.stdout)
+        packages = defaultdict(float)
+        for module in modules:
+            packages[_package(module["module"])] += module["self_ms"]
+
+        report = {
+            "import_ms": sum(module["self_ms"] for module in modules),
+            "load_ms": result["load"] * 1000,
+            "packages": dict(sorted(packages.items(), key=lambda item: -item[1])),
+            "modules": sorted(modules, key=lambda module: -module["cumulative_ms"])[
+                : options["limit"]
+            ],
+            "warm_up": [
+                {"step": step, "ms": seconds * 1000}
+                for step, seconds in result["warm_up"]
+            ],
+        }
+        self._print(report)
+        if options["output"]:
+            with open(options["output"], "w") as target:
+                json.dump(report, target, indent=2)
+            self.stdout.write(f"Report written to {options['output']}.")
+
+    def _print(self, report):
+        self.stdout.write(
+            "Imports took {import_ms:.1f} ms, loading the WSGI application "
+            "{load_ms:.1f} ms.".format(**report)
+        )
+        self.stdout.write("\nImport time per package (self, ms):")
+        for package, milliseconds in list(report["packages"].items())[:15]:
+            self.stdout.write(f"  {milliseconds:9.1f}  {package}")
+        self.stdout.write("\nSlowest modules (cumulative, ms):")
+        for module in report["modules"]:
+            self.stdout.write("  {cumulative_ms:9.1f}  {module}".format(**module))
+        self.stdout.write("\nFirst request costs paid by the warm-up (ms):")
+        for step in report["warm_up"]:
+            self.stdout.write("  {ms:9.2f}  {step}".format(**step))
+        self.stdout.write(
+            "  {:9.2f}  total".format(sum(step["ms"] for step in report["warm_up"]))
+        )
+
+
+def _parse_importtime(output):
+    """Parses `import time: self | cumulative | module` lines."""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        modules.append(
+            {
+                "module": fields[2].strip(),
+                "self_ms": int(fields[0]) / 1000,
+                "cumulative_ms": int(fields[1]) / 1000,
+            }
+        )
+    return modules
+
+
+def _package(module):
+    # Project modules are grouped per app, libraries per top level package.
+    parts = module.split(".")
+    if parts[0] == "apps" and len(parts) > 1:
+        return ".".join(parts[:2])
+    return parts[0]
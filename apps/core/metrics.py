@@ -0,0 +1,147 @@
+import threading
+import time
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """
+    A Prometheus style histogram kept in process memory. Every label
+    combination owns a list holding the per bucket counts, the +Inf count
+    and finally the sum of all observed values.
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        # Callers hold the registry lock.
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for labels, series in sorted(self.series.items()):
+            label_text = ",".join(
+                '{}="{}"'.format(name, _escape(value))
+                for name, value in zip(self.labelnames, labels)
+            )
+            separator = "," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{{{label_text}{separator}le="{bound}"}} '
+                    f"{cumulative}"
+                )
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return "\n".join(lines)
+
+
+class RequestMetrics:
+    """
+    Collects the timings of a single request. The middleware installs it as
+    a database execute wrapper so it also counts and times every query.
+    """
+
+    __slots__ = ("queries", "db_time", "auth_time", "permission_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.auth_time = 0.0
+        self.permission_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.request_duration = Histogram(
+            "http_request_duration_seconds",
+            "Total time spent handling the request.",
+            ("view", "method", "status"),
+            LATENCY_BUCKETS,
+        )
+        self.db_queries = Histogram(
+            "http_request_db_queries",
+            "Database queries executed per request.",
+            ("view",),
+            QUERY_COUNT_BUCKETS,
+        )
+        self.db_duration = Histogram(
+            "http_request_db_duration_seconds",
+            "Time spent in database queries per request.",
+            ("view",),
+            LATENCY_BUCKETS,
+        )
+        self.auth_duration = Histogram(
+            "http_request_auth_duration_seconds",
+            "Time spent in JWTAuthentication per request.",
+            ("view",),
+            LATENCY_BUCKETS,
+        )
+        self.permission_duration = Histogram(
+            "http_request_permission_duration_seconds",
+            "Time spent in UserHasPermission checks per request.",
+            ("view",),
+            LATENCY_BUCKETS,
+        )
+
+    def observe_request(self, view, method, status, duration, sample):
+        view_labels = (view,)
+        with self.lock:
+            self.request_duration.observe((view, method, status), duration)
+            self.db_queries.observe(view_labels, sample.queries)
+            self.db_duration.observe(view_labels, sample.db_time)
+            self.auth_duration.observe(view_labels, sample.auth_time)
+            self.permission_duration.observe(view_labels, sample.permission_time)
+
+    def render(self):
+        with self.lock:
+            histograms = [
+                self.request_duration,
+                self.db_queries,
+                self.db_duration,
+                self.auth_duration,
+                self.permission_duration,
+            ]
+            return "\n".join(histogram.render() for histogram in histograms) + "\n"
+
+
+registry = Registry()
+
+
+def add_time(request, attribute, seconds):
+    """
+    Adds `seconds` to the `attribute` timing of the request being measured.
+    Accepts both Django and DRF requests and does nothing when the metrics
+    middleware is not installed.
+    """
+    sample = getattr(getattr(request, "_request", request), "_metrics", None)
+    if sample is not None:
+        setattr(sample, attribute, getattr(sample, attribute) + seconds)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,195 @@
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+
+from .compression import (
+    COMPRESSIBLE_TYPES,
+    compress,
+    encoded_etag,
+    negotiate_encoding,
+    strip_encoded_etags,
+)
+from .concurrency import AdaptiveLimiter, endpoint_class
+from .deadline import Deadline, DeadlineExceeded
+from .decorators import get_view_attribute
+from .metrics import RequestMetrics, registry
+
+
+class RequestMetricsMiddleware:
+    """
+    Records latency, database queries and database time of every request,
+    plus the time spent in authentication and permission checks, into the
+    in-process histograms served by the metrics endpoint.
+    Should be the first middleware so the latency covers the whole stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample = request._metrics = RequestMetrics()
+        # Same as connection.execute_wrapper() without the context manager.
+        execute_wrappers = connection.execute_wrappers
+        execute_wrappers.append(sample)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            duration = time.perf_counter() - started
+            execute_wrappers.remove(sample)
+
+        # Unresolved paths share a label so scanners cannot blow up the
+        # number of series.
+        match = request.resolver_match
+        view = match.view_name if match is not None else "unresolved"
+        registry.observe_request(
+            view, request.method, str(response.status_code), duration, sample
+        )
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of COMPRESSION_MIN_SIZE bytes or more in the
+    encoding the client prefers, brotli or gzip, see
+    apps.core.compression. Responses sent from a PrecompressedBody use the
+    encoding stored with it instead of compressing again.
+
+    A strong ETag gets the encoding as suffix. If-Match and If-None-Match
+    reach views without it, so they compare their own ETags as usual.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH", "")
+        for header in ("HTTP_IF_MATCH", "HTTP_IF_NONE_MATCH"):
+            if header in request.META:
+                request.META[header] = strip_encoded_etags(request.META[header])
+        encoding = negotiate_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+
+        response = self.get_response(request)
+        if response.status_code == 304:
+            # Confirms the encoding the client has, if it sent its ETag.
+            etag = response.get("ETag")
+            if etag and encoding and encoded_etag(etag, encoding) in if_none_match:
+                response["ETag"] = encoded_etag(etag, encoding)
+            return response
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or not COMPRESSIBLE_TYPES.match(response.get("Content-Type", ""))
+        ):
+            return response
+        content = response.content
+        if len(content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if encoding is None:
+            return response
+        precompressed = getattr(response, "precompressed", None)
+        if precompressed is not None and precompressed.body == content:
+            compressed = precompressed.encode(encoding)
+        else:
+            compressed = compress(content, encoding)
+        if len(compressed) >= len(content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+        if response.has_header("ETag"):
+            response["ETag"] = encoded_etag(response["ETag"], encoding)
+        return response
+
+
+class RateLimitHeadersMiddleware:
+    """
+    Adds the RateLimit-Limit, RateLimit-Remaining and RateLimit-Reset
+    headers of the RoleRateThrottle check to the response.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        rate_limit = getattr(request, "_rate_limit", None)
+        if rate_limit is not None:
+            for header, value in rate_limit.headers().items():
+                response[header] = value
+        return response
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Sheds load before requests pile up in the worker: every endpoint class
+    of CONCURRENCY_LIMITS gets an AdaptiveLimiter, requests it turns away
+    get a 503 right away instead of timing out later.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limiters = {
+            name: AdaptiveLimiter(**options)
+            for name, options in settings.CONCURRENCY_LIMITS.items()
+        }
+
+    def __call__(self, request):
+        limiter = self.limiters.get(endpoint_class(request))
+        if limiter is None:
+            return self.get_response(request)
+        if not limiter.acquire():
+            response = JsonResponse(
+                {"message": "The server is busy, please try again shortly"},
+                status=503,
+            )
+            response["Retry-After"] = "1"
+            return response
+
+        started = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            limiter.release(time.perf_counter() - started)
+
+
+
+class LatencyBudgetMiddleware:
+    """
+    Gives the database queries of every view the latency budget it declared
+    with @latency_budget, or LATENCY_BUDGET, see apps.core.deadline.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            deadline = getattr(request, "_deadline", None)
+            if deadline is not None:
+                connection.execute_wrappers.remove(deadline)
+                deadline.reset(connection)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        budget = get_view_attribute(
+            view_func, request.method, "latency_budget", settings.LATENCY_BUDGET
+        )
+        if budget:
+            request._deadline = Deadline(budget)
+            connection.execute_wrappers.append(request._deadline)
+
+    def process_exception(self, request, exception):
+        # Rest framework views answer DeadlineExceeded themselves.
+        if isinstance(exception, DeadlineExceeded):
+            return JsonResponse(
+                {"message": str(exception.detail)}, status=exception.status_code
+            )
+        return None
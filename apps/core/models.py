@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 
@@ -13,3 +14,22 @@ class TimestampedModel(models.Model):
     class Meta:
         abstract = True
         ordering = ["-created_at", "-updated_at"]
+
+
+class IdempotencyKey(models.Model):
+    """
+    The response to a request sent with an Idempotency-Key header, replayed
+    when the client retries it. Rows can be purged once `expires_at` has
+    passed, see apps.core.idempotency.
+    """
+
+    # Hex digests, of the user and their key and of the request.
+    key = models.CharField(max_length=64, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    body = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    headers = models.JSONField(default=dict)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
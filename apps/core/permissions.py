@@ -1,12 +1,18 @@
+import time
+
 from rest_framework import permissions
 
+from . import metrics
+
 
 class UserHasPermission(permissions.BasePermission):
     def __init__(self, permission):
         self.permission = permission
 
     def has_permission(self, request, view):
+        started = time.perf_counter()
         permissions = request.user.permissions
+        metrics.add_time(request, "permission_time", time.perf_counter() - started)
         if self.permission in permissions:
             return True
         return False
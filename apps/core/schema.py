@@ -0,0 +1,180 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from functools import lru_cache
+
+import django
+import drf_yasg
+import rest_framework
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.urls import resolve, reverse
+from django.utils.http import parse_etags
+from drf_yasg.codecs import OpenAPICodecYaml
+from drf_yasg.views import get_schema_view
+
+from .compression import PrecompressedBody
+
+# Packages whose Python sources make up the code version.
+SOURCE_PACKAGES = ("apps", "permissions_app")
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """
+    Identifies the code the schema is generated from: APP_VERSION when the
+    deployment sets one, otherwise a fingerprint of the project sources and
+    of the libraries that shape the schema.
+    """
+    if settings.APP_VERSION:
+        return re.sub(r"[^\w.-]", "_", settings.APP_VERSION)
+
+    digest = hashlib.sha1()
+    for library in (django, rest_framework, drf_yasg):
+        digest.update(f"{library.__name__}={library.__version__}\n".encode())
+    for package in SOURCE_PACKAGES:
+        root = os.path.join(settings.BASE_DIR, package)
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories.sort()
+            for name in sorted(files):
+                if name.endswith(".py"):
+                    path = os.path.join(directory, name)
+                    digest.update(os.path.relpath(path, settings.BASE_DIR).encode())
+                    with open(path, "rb") as source:
+                        digest.update(source.read())
+    return digest.hexdigest()[:16]
+
+
+class SchemaDocument:
+    """
+    A rendered schema along with its ETag. Its compressed encodings are
+    kept in `precompressed`, CompressionMiddleware makes each one once.
+    """
+
+    __slots__ = ("body", "precompressed", "etag")
+
+    def __init__(self, body):
+        self.body = body
+        self.precompressed = PrecompressedBody(body)
+        self.etag = '"{}"'.format(hashlib.sha1(body).hexdigest()[:20])
+
+    def response(self, request, content_type):
+        etags = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+        if self.etag in etags or "*" in etags:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(self.body, content_type=content_type)
+            response.precompressed = self.precompressed
+        response["ETag"] = self.etag
+        response["Cache-Control"] = "no-cache"
+        response["Vary"] = "Accept-Encoding"
+        return response
+
+
+class SchemaCache:
+    """
+    Generates the schema at most once per code version and keeps the
+    rendered documents. In "file" mode the documents are also written to
+    SCHEMA_CACHE_DIR, so other worker processes and later restarts of the
+    same version read them instead of introspecting the views again.
+    """
+
+    def __init__(self, generate):
+        self.generate = generate
+        self.lock = threading.Lock()
+        self.swagger = None
+        self.documents = {}
+
+    def get_document(self, codec_class):
+        extension = "yaml" if issubclass(codec_class, OpenAPICodecYaml) else "json"
+        with self.lock:
+            document = self.documents.get(extension)
+            if document is None:
+                document = self.documents[extension] = self._load(
+                    codec_class, extension
+                )
+            return document
+
+    def write_files(self, codec_classes):
+        """Renders every format into SCHEMA_CACHE_DIR, returns the paths."""
+        paths = []
+        for codec_class in codec_classes:
+            self.get_document(codec_class)
+        with self.lock:
+            for extension, document in self.documents.items():
+                paths.append(self._write(extension, document.body))
+        return paths
+
+    def _load(self, codec_class, extension):
+        # Called with the lock held, so a cold cache generates only once.
+        if settings.SCHEMA_CACHE == "file":
+            try:
+                with open(self._path(extension), "rb") as cached:
+                    return SchemaDocument(cached.read())
+            except FileNotFoundError:
+                pass
+
+        if self.swagger is None:
+            self.swagger = self.generate()
+        body = codec_class(validators=[]).encode(self.swagger)
+        if settings.SCHEMA_CACHE == "file":
+            self._write(extension, body)
+        return SchemaDocument(body)
+
+    def _path(self, extension):
+        return os.path.join(schema_cache_dir(), f"openapi-{code_version()}.{extension}")
+
+    def _write(self, extension, body):
+        path = self._path(extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a half written schema.
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(descriptor, "wb") as target:
+            target.write(body)
+        os.replace(temporary_path, path)
+        return path
+
+
+def schema_cache_dir():
+    return settings.SCHEMA_CACHE_DIR or os.path.join(
+        tempfile.gettempdir(), "permissions_app-schema"
+    )
+
+
+def get_cached_schema_view(info, url=None, patterns=None, urlconf=None, **kwargs):
+    """
+    Same as drf_yasg's get_schema_view(), but a public schema is generated
+    once and then served from a SchemaCache with an ETag, compressed once
+    per encoding, following the SCHEMA_CACHE setting.
+    """
+    base = get_schema_view(info, url, patterns, urlconf, **kwargs)
+
+    def generate():
+        generator = base.generator_class(info, "", url, patterns, urlconf)
+        return generator.get_schema(request=None, public=True)
+
+    class CachedSchemaView(base):
+        cache = SchemaCache(generate)
+
+        def get(self, request, version="", format=None):
+            if not self.public or settings.SCHEMA_CACHE == "off":
+                return super().get(request, version, format)
+
+            renderer = request.accepted_renderer
+            codec_class = getattr(renderer, "codec_class", None)
+            if codec_class is None:
+                # UI pages only carry the title and fetch the schema itself.
+                return super().get(request, version, format)
+            document = self.cache.get_document(codec_class)
+            return document.response(
+                request, f"{renderer.media_type}; charset={renderer.charset}"
+            )
+
+    return CachedSchemaView
+
+
+def cached_schema_view():
+    """The schema view class behind the project's `schema-json` route."""
+    return resolve(reverse("schema-json", kwargs={"format": ".json"})).func.cls
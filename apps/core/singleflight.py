@@ -0,0 +1,85 @@
+import threading
+import time
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "expires")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.expires = 0.0
+
+
+class SingleFlight:
+    """
+    Coalesces identical work within the process: while a thread computes a
+    key, other threads asking for the same key wait for it and share its
+    result, or its exception, instead of computing it again. The result is
+    then kept for `ttl` seconds, so the requests right behind reuse it too.
+
+    Keys are tuples, forget() drops every key starting with the given
+    items, e.g. forget("note", 42) drops ("note", 42, ...).
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, compute, ttl=0.0):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None or (
+                call.done.is_set() and call.expires <= time.monotonic()
+            )
+            if leader:
+                if len(self.calls) >= self.max_entries:
+                    self._evict()
+                call = self.calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = compute()
+        except BaseException as error:
+            call.error = error
+            self._drop(key, call)
+            raise
+        finally:
+            call.expires = time.monotonic() + ttl
+            call.done.set()
+        if ttl <= 0:
+            self._drop(key, call)
+        return call.result
+
+    def forget(self, *prefix):
+        """
+        Drops the keys starting with `prefix`. Computations in flight still
+        answer the requests waiting for them, later requests start anew.
+        """
+        size = len(prefix)
+        with self.lock:
+            for key in [key for key in self.calls if key[:size] == prefix]:
+                del self.calls[key]
+
+    def _drop(self, key, call):
+        with self.lock:
+            if self.calls.get(key) is call:
+                del self.calls[key]
+
+    def _evict(self):
+        # Called with the lock held. Expired results go first, then every
+        # finished one, computations in flight are always kept.
+        now = time.monotonic()
+        for keep in (lambda call: call.expires > now, lambda call: False):
+            for key, call in list(self.calls.items()):
+                if call.done.is_set() and not keep(call):
+                    del self.calls[key]
+            if len(self.calls) < self.max_entries:
+                return
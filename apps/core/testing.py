@@ -0,0 +1,95 @@
+from urllib.parse import urlsplit
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, resolve
+
+from .decorators import get_view_attribute, handler_methods
+from .warmup import refresh_caches
+
+
+class QueryBudgetTestMixin:
+    """
+    Test case mixin that fails a test when a request runs more queries than
+    the view declared with @query_budget, or when a list endpoint runs more
+    queries for bigger pages, the signature of an N+1 pattern. Budgets hold
+    for a warm worker: due per process caches are loaded before measuring.
+    Use it with rest_framework.test.APITestCase.
+    """
+
+    def request_within_budget(self, method, path, data=None, **extra):
+        """Performs the request and asserts it stayed within budget."""
+        view_func = resolve(urlsplit(path).path).func
+        budget = get_view_attribute(view_func, method, "query_budget")
+        if budget is None:
+            self.fail(f"{method} {path} does not declare a query budget.")
+
+        refresh_caches()
+        with CaptureQueriesContext(connection) as captured:
+            response = self._request(method, path, data, **extra)
+
+        queries = _counted_queries(captured)
+        if len(queries) > budget:
+            self.fail(
+                "{} {} ran {} queries, its budget is {}:\n{}".format(
+                    method,
+                    path,
+                    len(queries),
+                    budget,
+                    "\n".join(f"  {query['sql']}" for query in queries),
+                )
+            )
+        return response
+
+    def assertNoNPlusOne(self, path, page_sizes=(1, 5), param="limit", **extra):
+        """
+        Requests `path` with every page size and asserts the query count is
+        the same for all of them. Make sure there are enough rows to fill
+        the biggest page.
+        """
+        counts = {}
+        for page_size in page_sizes:
+            separator = "&" if "?" in path else "?"
+            refresh_caches()
+            with CaptureQueriesContext(connection) as captured:
+                response = self._request(
+                    "GET", f"{path}{separator}{param}={page_size}", **extra
+                )
+            self.assertEqual(response.status_code, 200, response.content)
+            counts[page_size] = len(_counted_queries(captured))
+
+        if len(set(counts.values())) > 1:
+            self.fail(f"GET {path} has an N+1 query pattern, {counts}")
+
+    def assertEveryRouteHasBudget(self, urlpatterns):
+        """Asserts that every handler behind `urlpatterns` declares a budget."""
+        missing = [
+            f"{method} {route}"
+            for route, view_func in _routes(urlpatterns)
+            for method in handler_methods(view_func)
+            if get_view_attribute(view_func, method, "query_budget") is None
+        ]
+        self.assertEqual(missing, [], "Routes without a query budget")
+
+    def _request(self, method, path, data=None, **extra):
+        if method == "GET":
+            return self.client.get(path, data, **extra)
+        return getattr(self.client, method.lower())(path, data, format="json", **extra)
+
+
+def _counted_queries(captured):
+    # Test cases run inside a transaction which turns the BEGIN/COMMIT of
+    # atomic() blocks into savepoints; neither is a query worth budgeting.
+    return [
+        query
+        for query in captured.captured_queries
+        if not query["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT"))
+    ]
+
+
+def _routes(urlpatterns, prefix=""):
+    for pattern in urlpatterns:
+        if isinstance(pattern, URLResolver):
+            yield from _routes(pattern.url_patterns, prefix + str(pattern.pattern))
+        elif isinstance(pattern, URLPattern):
+            yield prefix + str(pattern.pattern), pattern.callback
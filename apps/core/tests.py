@@ -1,3 +1,718 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import brotli
+
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apps.authentication.models import Permission, Role, User
+from apps.authentication.role_permissions import role_permissions
+from apps.authentication.tests import bearer
+from apps.notes.models import Note
+from apps.notes.reads import note_reads
+from apps.notes.views import NoteViewSet
+from . import middleware, views
+from .checks import check_rate_limit_cache
+from .compression import PrecompressedBody, negotiate_encoding
+from .concurrency import AdaptiveLimiter, endpoint_class
+from .deadline import Deadline, DeadlineExceeded
+from .idempotency import idempotency_key, key_lock
+from .management.commands import benchmark
+from .middleware import CompressionMiddleware
+from .metrics import Histogram, Registry
+from .models import IdempotencyKey
+from .singleflight import SingleFlight
+from .schema import SchemaCache, code_version
+from .throttling import RoleRateThrottle
+
+
+class SchemaCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.view = resolve("/swagger.json").func.cls
+        generate = self.view.cache.generate
+        self.generated = 0
+
+        def counting_generate():
+            self.generated += 1
+            return generate()
+
+        self.addCleanup(setattr, self.view, "cache", self.view.cache)
+        self.view.cache = SchemaCache(counting_generate)
+
+    def test_schema_is_generated_once(self):
+        first = self.client.get("/swagger.json")
+        second = self.client.get("/swagger.json")
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertEqual(self.generated, 1)
+
+        self.client.get("/swagger.yaml")
+        self.assertEqual(self.generated, 1)
+
+    def test_etag_and_gzip(self):
+        plain = self.client.get("/swagger.json")
+        not_modified = self.client.get(
+            "/swagger.json", HTTP_IF_NONE_MATCH=plain["ETag"]
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+
+        compressed = self.client.get("/swagger.json", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertEqual(compressed["ETag"], plain["ETag"][:-1] + '-gzip"')
+        not_modified = self.client.get(
+            "/swagger.json",
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=compressed["ETag"],
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], compressed["ETag"])
+
+        refused = self.client.get("/swagger.json", HTTP_ACCEPT_ENCODING="gzip;q=0")
+        self.assertFalse(refused.has_header("Content-Encoding"))
+        self.assertEqual(refused.content, plain.content)
+
+    def test_file_mode_serves_the_generated_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(SCHEMA_CACHE="file", SCHEMA_CACHE_DIR=directory):
+                call_command("generate_schema", stdout=io.StringIO())
+                path = os.path.join(directory, f"openapi-{code_version()}.json")
+                with open(path, "rb") as generated:
+                    body = generated.read()
+
+                self.view.cache = SchemaCache(self.fail)
+                response = self.client.get("/swagger.json")
+        self.assertEqual(response.content, body)
+
+    def test_off_mode_generates_per_request(self):
+        with override_settings(SCHEMA_CACHE="off"):
+            response = self.client.get("/swagger.json")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+
+
+class HistogramTests(SimpleTestCase):
+    def test_exposition_format(self):
+        histogram = Histogram(
+            "request_seconds", "Time per request.", ("view", "status"), (0.1, 1)
+        )
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(("notes", "200"), value)
+        histogram.observe(('say "hi"\n', "500"), 0.2)
+
+        self.assertEqual(
+            histogram.render().splitlines(),
+            [
+                "# HELP request_seconds Time per request.",
+                "# TYPE request_seconds histogram",
+                'request_seconds_bucket{view="notes",status="200",le="0.1"} 2',
+                'request_seconds_bucket{view="notes",status="200",le="1"} 3',
+                'request_seconds_bucket{view="notes",status="200",le="+Inf"} 4',
+                'request_seconds_sum{view="notes",status="200"} 3.65',
+                'request_seconds_count{view="notes",status="200"} 4',
+                'request_seconds_bucket{view="say \\"hi\\"\\n",status="500",le="0.1"} 0',
+                'request_seconds_bucket{view="say \\"hi\\"\\n",status="500",le="1"} 1',
+                'request_seconds_bucket{view="say \\"hi\\"\\n",status="500",le="+Inf"} 1',
+                'request_seconds_sum{view="say \\"hi\\"\\n",status="500"} 0.2',
+                'request_seconds_count{view="say \\"hi\\"\\n",status="500"} 1',
+            ],
+        )
+
+
+@override_settings(METRICS_TOKEN="scrape-me")
+class MetricsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="member")
+        Permission.objects.create(name="can_create_note", role=role)
+        cls.jake = User.objects.create_user_with_role(
+            "jake", "jake@example.com", "member", password="Passw0rd!"
+        )
+
+    def setUp(self):
+        caches["ratelimit"].clear()
+        self.registry = Registry()
+        for module in (middleware, views):
+            patcher = mock.patch.object(module, "registry", self.registry)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def scrape(self, token="scrape-me"):
+        return self.client.get("/metrics", HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_requests_are_recorded_per_view(self):
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.jake))
+        self.client.get("/api/notes/list")
+        self.client.get("/api/notes/list")
+        self.client.get("/nowhere")
+        self.client.credentials()
+
+        text = self.scrape().content.decode()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", text)
+        self.assertIn(
+            'http_request_duration_seconds_count{view="notes:fetch_notes",method="GET",'
+            'status="200"} 2',
+            text,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count{view="unresolved",method="GET",'
+            'status="404"} 1',
+            text,
+        )
+        [queries] = self.registry.db_queries.series[("notes:fetch_notes",)][-1:]
+        self.assertGreater(queries, 0)
+        [permission_time] = self.registry.permission_duration.series[
+            ("notes:fetch_notes",)
+        ][-1:]
+        self.assertGreater(permission_time, 0)
+
+    def test_scrapers_need_the_token(self):
+        self.assertEqual(self.scrape().status_code, 200)
+        response = self.scrape("guess")
+        self.assertEqual(response.status_code, 401, response.content)
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        with override_settings(METRICS_TOKEN=""):
+            self.assertEqual(self.scrape("").status_code, 403)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionTests(SimpleTestCase):
+    def compressed(self, response, accept_encoding="gzip", **headers):
+        request = RequestFactory().get(
+            "/", HTTP_ACCEPT_ENCODING=accept_encoding, **headers
+        )
+        self.request = request
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_encoding_negotiation(self):
+        self.assertEqual(negotiate_encoding("gzip, deflate"), "gzip")
+        self.assertEqual(negotiate_encoding("GZIP;q=0.5, identity"), "gzip")
+        self.assertIsNone(negotiate_encoding("gzip;q=0, deflate"))
+        self.assertIsNone(negotiate_encoding(""))
+        self.assertEqual(negotiate_encoding("gzip, br"), "br")
+        self.assertEqual(negotiate_encoding("br;q=0.5, gzip"), "gzip")
+        self.assertEqual(negotiate_encoding("*"), "br")
+
+    def test_large_responses_are_compressed(self):
+        data = {"notes": ["note"] * 100}
+        response = self.compressed(JsonResponse(data))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+        self.assertEqual(gzip.decompress(response.content), JsonResponse(data).content)
+        response = self.compressed(JsonResponse(data), accept_encoding="gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(
+            brotli.decompress(response.content), JsonResponse(data).content
+        )
+
+        response = self.compressed(JsonResponse({"notes": []}))
+        self.assertFalse(response.has_header("Content-Encoding"))
+        response = self.compressed(JsonResponse(data), accept_encoding="identity")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        response = self.compressed(HttpResponse(b"\0" * 1000, content_type="image/png"))
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_each_encoding_gets_its_own_etag(self):
+        response = JsonResponse({"notes": ["note"] * 100})
+        response["ETag"] = '"3"'
+        response = self.compressed(response, HTTP_IF_MATCH='"3-gzip", "4"')
+        self.assertEqual(response["ETag"], '"3-gzip"')
+        self.assertEqual(self.request.META["HTTP_IF_MATCH"], '"3", "4"')
+
+        response = JsonResponse({"notes": ["note"] * 100})
+        response["ETag"] = 'W/"3"'
+        self.assertEqual(self.compressed(response)["ETag"], 'W/"3"')
+
+        not_modified = HttpResponseNotModified()
+        not_modified["ETag"] = '"3"'
+        response = self.compressed(not_modified, HTTP_IF_NONE_MATCH='"3-gzip"')
+        self.assertEqual(response["ETag"], '"3-gzip"')
+        self.assertEqual(self.request.META["HTTP_IF_NONE_MATCH"], '"3"')
+
+    def test_precompressed_bodies_are_compressed_once(self):
+        body = PrecompressedBody(b"note " * 100, "application/json")
+        for _ in range(2):
+            response = HttpResponse(body.body, content_type=body.content_type)
+            response.precompressed = body
+            with mock.patch("gzip.compress", wraps=gzip.compress) as compress:
+                response = self.compressed(response)
+            self.assertEqual(response.content, body.encoded["gzip"])
+        self.assertEqual(compress.call_count, 0)
+
+
+@override_settings(RATE_LIMITS={"anonymous": "2/m", "member": "3/m"})
+class RateLimitTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="member")
+        Permission.objects.create(name="can_create_note", role=role)
+        cls.jake = User.objects.create_user_with_role(
+            "jake", "jake@example.com", "member", password="Passw0rd!"
+        )
+        cls.jane = User.objects.create_user_with_role(
+            "jane", "jane@example.com", "member", password="Passw0rd!"
+        )
+
+    def setUp(self):
+        caches["ratelimit"].clear()
+        RoleRateThrottle.previous_counts.clear()
+
+    def test_every_user_gets_the_limit_of_their_role(self):
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.jake))
+        for remaining in (2, 1, 0):
+            response = self.client.get("/api/notes/list")
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(response["RateLimit-Limit"], "3")
+            self.assertEqual(response["RateLimit-Remaining"], str(remaining))
+        response = self.client.get("/api/notes/list")
+        self.assertEqual(response.status_code, 429, response.content)
+        self.assertIn("Retry-After", response)
+
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.jane))
+        response = self.client.get("/api/notes/list")
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_anonymous_requests_are_limited_per_address(self):
+        for status_code in (400, 400, 429):
+            response = self.client.post("/api/users/login/", {}, format="json")
+            self.assertEqual(response.status_code, status_code, response.content)
+
+    def test_previous_window_counts_towards_the_limit(self):
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.jake))
+        with mock.patch("apps.core.throttling.time.time", return_value=6000 - 1):
+            for _ in range(3):
+                self.client.get("/api/notes/list")
+        # 10% into the next window, 90% of the previous one still counts.
+        with mock.patch("apps.core.throttling.time.time", return_value=6000 + 6):
+            response = self.client.get("/api/notes/list")
+        self.assertEqual(response.status_code, 429, response.content)
+        with mock.patch("apps.core.throttling.time.time", return_value=6000 + 45):
+            response = self.client.get("/api/notes/list")
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_per_process_counters_are_flagged_with_several_workers(self):
+        self.assertEqual(check_rate_limit_cache(None), [])
+        with override_settings(WORKER_PROCESSES=4):
+            [warning] = check_rate_limit_cache(None)
+        self.assertEqual(warning.id, "core.W001")
+
+        shared = {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": "127.0.0.1:11211",
+        }
+        with override_settings(WORKER_PROCESSES=4, CACHES={"ratelimit": shared}):
+            self.assertEqual(check_rate_limit_cache(None), [])
+
+
+class AdaptiveLimiterTests(SimpleTestCase):
+    def limiter(self, **options):
+        return AdaptiveLimiter(
+            **{
+                "initial": 2,
+                "min_limit": 1,
+                "max_limit": 8,
+                "queue": 1,
+                "wait": 0.05,
+                **options,
+            }
+        )
+
+    def test_requests_over_the_cap_wait_for_a_bounded_time(self):
+        limiter = self.limiter()
+        self.assertTrue(limiter.acquire())
+        self.assertTrue(limiter.acquire())
+        started = time.monotonic()
+        self.assertFalse(limiter.acquire())
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_released_capacity_goes_to_the_queue(self):
+        limiter = self.limiter(initial=1, wait=5)
+        limiter.acquire()
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(limiter.acquire()))
+        waiter.start()
+        while not limiter.waiting:
+            time.sleep(0.001)
+
+        # The queue is full, no waiting at all.
+        started = time.monotonic()
+        self.assertFalse(limiter.acquire())
+        self.assertLess(time.monotonic() - started, 1)
+
+        limiter.release(0.01)
+        waiter.join()
+        self.assertEqual(results, [True])
+
+    def test_cap_follows_latency(self):
+        limiter = self.limiter(initial=4, min_limit=2)
+
+        def rounds(latency, count):
+            for _ in range(count):
+                acquired = limiter.capacity
+                for _ in range(acquired):
+                    limiter.acquire()
+                for _ in range(acquired):
+                    limiter.release(latency)
+
+        rounds(0.01, 50)
+        self.assertEqual(limiter.capacity, 8)
+        rounds(0.2, 50)
+        self.assertEqual(limiter.capacity, 2)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_calls_share_one_computation(self):
+        flight = SingleFlight()
+        calls = []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return "note"
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(flight.do(("note", 1), compute))
+        )
+        leader.start()
+        started.wait()
+        followers = [
+            threading.Thread(
+                target=lambda: results.append(flight.do(("note", 1), compute))
+            )
+            for _ in range(10)
+        ]
+        for thread in followers:
+            thread.start()
+        for thread in [leader, *followers]:
+            thread.join()
+        self.assertEqual(results, ["note"] * 11)
+        self.assertEqual(len(calls), 1)
+
+        # Without a ttl nothing is kept once the computation is done.
+        flight.do(("note", 1), compute)
+        self.assertEqual(len(calls), 2)
+
+    def test_results_are_kept_until_they_expire_or_are_forgotten(self):
+        flight = SingleFlight()
+        counter = iter(range(100))
+        self.assertEqual(flight.do(("note", 1, "a"), lambda: next(counter), 60), 0)
+        self.assertEqual(flight.do(("note", 1, "a"), lambda: next(counter), 60), 0)
+        self.assertEqual(flight.do(("note", 2), lambda: next(counter), 60), 1)
+        flight.forget("note", 1)
+        self.assertEqual(flight.do(("note", 1, "a"), lambda: next(counter), 60), 2)
+        self.assertEqual(flight.do(("note", 2), lambda: next(counter), 60), 1)
+
+    def test_errors_are_not_kept(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("database went away")
+
+        with self.assertRaises(ValueError):
+            flight.do(("note", 1), fail, 60)
+        self.assertEqual(flight.do(("note", 1), lambda: "note", 60), "note")
+
+
+class LoadSheddingTests(APITestCase):
+    @override_settings(
+        CONCURRENCY_LIMITS={
+            "auth": {
+                "initial": 1,
+                "min_limit": 1,
+                "max_limit": 1,
+                "queue": 0,
+                "wait": 0,
+            },
+            "note_reads": {
+                "initial": 0,
+                "min_limit": 0,
+                "max_limit": 0,
+                "queue": 0,
+                "wait": 0,
+            },
+        }
+    )
+    def test_a_full_class_is_shed_while_others_are_served(self):
+        response = self.client.get("/api/notes/list")
+        self.assertEqual(response.status_code, 503, response.content)
+        self.assertEqual(response["Retry-After"], "1")
+
+        response = self.client.post("/api/users/login/", {}, format="json")
+        self.assertEqual(response.status_code, 400, response.content)
+
+    def test_endpoint_classes(self):
+        factory = RequestFactory()
+        for method, path, expected in [
+            ("post", "/api/users/login/", "auth"),
+            ("get", "/api/notes/list", "note_reads"),
+            ("post", "/api/notes/", "note_writes"),
+            ("post", "/api/authorization/check", "authorization"),
+            ("get", "/api/policy", "authorization"),
+            ("get", "/api/roles/list/", "authorization"),
+            ("post", "/api/admin/users/role", "admin"),
+            ("get", "/admin/", "admin"),
+            ("get", "/metrics", None),
+        ]:
+            request = getattr(factory, method)(path)
+            self.assertEqual(endpoint_class(request), expected, path)
+
+
+class LatencyBudgetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="member")
+        Permission.objects.create(name="can_create_note", role=role)
+        cls.jake = User.objects.create_user_with_role(
+            "jake", "jake@example.com", "member", password="Passw0rd!"
+        )
+
+    def setUp(self):
+        caches["ratelimit"].clear()
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.jake))
+
+    def statement_timeout(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW statement_timeout")
+            return cursor.fetchone()[0]
+
+    def test_slow_queries_are_cancelled(self):
+        default = self.statement_timeout()
+        deadline = Deadline(0.05)
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            with transaction.atomic(), connection.execute_wrapper(deadline):
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_sleep(2)")
+        self.assertLess(time.monotonic() - started, 1)
+
+        deadline.reset(connection)
+        self.assertEqual(self.statement_timeout(), default)
+
+    def test_queries_run_unchanged_under_a_deadline(self):
+        for number in range(3):
+            Note.objects.create(
+                title=f"Note {number}", description="d", body="b", author=self.jake
+            )
+        deadline = Deadline(5)
+        with connection.execute_wrapper(deadline):
+            # Server side cursors reject anything but a single SELECT.
+            titles = [note.title for note in Note.objects.iterator(chunk_size=2)]
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(
+                    "UPDATE notes_note SET version = version + %s WHERE id = %s",
+                    [(1, note.id) for note in Note.objects.all()],
+                )
+                cursor.execute("SHOW statement_timeout")
+                timeout = cursor.fetchone()[0]
+        deadline.reset(connection)
+
+        self.assertEqual(sorted(titles), ["Note 0", "Note 1", "Note 2"])
+        self.assertEqual(
+            sorted(Note.objects.values_list("version", flat=True)), [2, 2, 2]
+        )
+        self.assertRegex(timeout, r"^\d+(ms|s)$")
+
+    def test_requests_over_budget_get_504(self):
+        default = self.statement_timeout()
+        response = self.client.get("/api/notes/list")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.statement_timeout(), default)
+
+        with mock.patch.object(NoteViewSet.list, "latency_budget", 0.000001):
+            response = self.client.get("/api/notes/list")
+        self.assertEqual(response.status_code, 504, response.content)
+        self.assertEqual(self.statement_timeout(), default)
+
+
+class IdempotencyTests(APITestCase):
+    note = {"title": "Retried", "description": "Sent twice", "body": "Once."}
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="member")
+        Permission.objects.create(name="can_create_note", role=role)
+        cls.jake = User.objects.create_user_with_role(
+            "jake", "jake@example.com", "member", password="Passw0rd!"
+        )
+
+    def setUp(self):
+        caches["ratelimit"].clear()
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.jake))
+
+    def create(self, data, key="retry-1"):
+        return self.client.post(
+            "/api/notes/", data, format="json", HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retries_get_the_stored_response(self):
+        first = self.create(self.note)
+        self.assertEqual(first.status_code, 201, first.content)
+        with self.assertNumQueries(3):
+            retry = self.create(self.note)
+        self.assertEqual(retry.status_code, 201, retry.content)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["ETag"], first["ETag"])
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Note.objects.count(), 1)
+
+        response = self.create({**self.note, "title": "Changed"})
+        self.assertEqual(response.status_code, 422, response.content)
+        response = self.create(self.note, key="retry-2")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Note.objects.count(), 2)
+
+    def test_failing_to_store_the_key_undoes_the_request(self):
+        with mock.patch.object(IdempotencyKey, "save", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.create(self.note)
+        self.assertFalse(Note.objects.exists())
+
+        response = self.create(self.note)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Note.objects.count(), 1)
+
+    def test_expired_keys_are_purged_and_run_again(self):
+        self.create(self.note)
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        call_command("purge_idempotency_keys", stdout=io.StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        response = self.create(self.note)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Note.objects.count(), 2)
+
+    def test_concurrent_duplicates_wait_for_the_first(self):
+        key = idempotency_key(self.jake.pk, "retry-1")
+        locked = threading.Event()
+
+        def first_request():
+            # Stands in for the first request, on its own connection.
+            try:
+                with key_lock(key):
+                    locked.set()
+                    time.sleep(0.2)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=first_request)
+        thread.start()
+        locked.wait()
+        started = time.monotonic()
+        response = self.create(self.note)
+        thread.join()
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+        self.assertEqual(response.status_code, 201, response.content)
+
+
+class BenchmarkTests(APITestCase):
+    def setUp(self):
+        # The test runner already provides the environment and database the
+        # command would set up for itself.
+        for name in ("setup_test_environment", "teardown_test_environment"):
+            patcher = mock.patch.object(benchmark, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        creation = connection.creation
+        for name, value in (("create_test_db", None), ("destroy_test_db", None)):
+            patcher = mock.patch.object(creation, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        caches["ratelimit"].clear()
+        self.addCleanup(role_permissions.clear)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def benchmark(self, *args):
+        stdout = io.StringIO()
+        # Each run seeds the same users and roles, throw them away after.
+        with transaction.atomic():
+            try:
+                call_command(
+                    "benchmark",
+                    "--notes=5",
+                    "--iterations=3",
+                    "--warmup=1",
+                    "--login-iterations=1",
+                    *args,
+                    stdout=stdout,
+                )
+            finally:
+                transaction.set_rollback(True)
+        return stdout.getvalue()
+
+    def test_results_and_comparison(self):
+        path = os.path.join(self.directory, "baseline.json")
+        self.benchmark(f"--output={path}")
+        with open(path) as source:
+            report = json.load(source)
+
+        self.assertEqual(report["meta"]["notes"], 5)
+        self.assertEqual(
+            set(report["results"]),
+            {
+                "login",
+                "note_detail",
+                "roles_list",
+                "auth_permission",
+                "notes_list_10",
+                "notes_list_50",
+                "notes_list_100",
+            },
+        )
+        for name, result in report["results"].items():
+            self.assertEqual(result["iterations"], 1 if name == "login" else 3)
+            self.assertGreater(result["throughput"], 0)
+            self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+            self.assertLessEqual(result["p95_ms"], result["p99_ms"])
+
+        # A baseline far slower passes, one where a scenario was far faster
+        # stands in for a regression.
+        for result in report["results"].values():
+            result["p95_ms"] *= 100
+        with open(path, "w") as target:
+            json.dump(report, target)
+        self.benchmark("--scenario=auth_permission", f"--compare={path}")
+
+        report["results"]["auth_permission"]["p95_ms"] /= 1e6
+        with open(path, "w") as target:
+            json.dump(report, target)
+        with self.assertRaisesMessage(
+            CommandError, "Slower than the baseline: auth_permission."
+        ):
+            self.benchmark(
+                "--scenario=auth_permission",
+                "--scenario=roles_list",
+                f"--compare={path}",
+            )
+
+    def test_note_reads_are_not_shared_between_iterations(self):
+        with mock.patch.object(note_reads, "do", wraps=note_reads.do) as do:
+            self.benchmark("--scenario=note_detail", "--scenario=notes_list_10")
+        self.assertGreaterEqual(do.call_count, 8)
+        self.assertEqual({call.kwargs["ttl"] for call in do.call_args_list}, {0})
+
+    def test_unknown_scenarios_are_refused(self):
+        with self.assertRaisesMessage(CommandError, "Unknown scenario nothing"):
+            self.benchmark("--scenario=nothing")
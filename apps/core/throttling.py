@@ -0,0 +1,106 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """Turns "<count>/<period>", e.g. "600/m", into (count, seconds)."""
+    count, period = rate.split("/")
+    return int(count), PERIODS[period[0]]
+
+
+class RateLimit:
+    """The outcome of one rate limit check, sent as RateLimit-* headers."""
+
+    __slots__ = ("limit", "remaining", "reset")
+
+    def __init__(self, limit, remaining, reset):
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+
+    def headers(self):
+        return {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(self.reset),
+        }
+
+
+class RoleRateThrottle(BaseThrottle):
+    """
+    Sliding window rate limit per user, at the rate RATE_LIMITS sets for
+    the user's role, and per client address for anonymous requests.
+
+    The sliding window is approximated from two fixed windows: the count of
+    the current window plus the count of the previous one, weighted by how
+    much of it the sliding window still covers. Counters live in the
+    "ratelimit" cache, every worker using the same cache server shares one
+    budget. A check costs a single incr(); the final count of the previous
+    window is read once per window and then remembered by the process.
+    """
+
+    cache_alias = "ratelimit"
+    # (ident, window) -> (window index, count of the window before it).
+    previous_counts = {}
+    max_previous_counts = 100000
+
+    def allow_request(self, request, view):
+        scope, ident = self.get_scope(request)
+        rate = settings.RATE_LIMITS.get(scope)
+        if not rate:
+            return True
+        limit, window = parse_rate(rate)
+
+        now = time.time()
+        index = int(now // window)
+        count = self._increment(f"ratelimit:{ident}:{window}:{index}", window)
+        previous = self._previous_count(ident, window, index)
+        elapsed = now - index * window
+        used = count + previous * (1 - elapsed / window)
+
+        self.rate_limit = RateLimit(
+            limit, max(0, math.floor(limit - used)), math.ceil(window - elapsed)
+        )
+        # Picked up by RateLimitHeadersMiddleware.
+        request._request._rate_limit = self.rate_limit
+        return used <= limit
+
+    def wait(self):
+        return self.rate_limit.reset
+
+    def get_scope(self, request):
+        """Returns the RATE_LIMITS key and the counter key of the request."""
+        user = request.user
+        if user is not None and user.is_authenticated:
+            role = user.role.name if user.role_id else "guest"
+            return role, f"user:{user.pk}"
+        return "anonymous", f"address:{self.get_ident(request)}"
+
+    def _increment(self, key, window):
+        cache = caches[self.cache_alias]
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # First request of the window. Only one add() wins, the others
+            # count on top of it.
+            if cache.add(key, 1, timeout=window * 2):
+                return 1
+            return cache.incr(key)
+
+    def _previous_count(self, ident, window, index):
+        remembered = self.previous_counts.get((ident, window))
+        if remembered is not None and remembered[0] == index:
+            return remembered[1]
+        count = caches[self.cache_alias].get(
+            f"ratelimit:{ident}:{window}:{index - 1}", 0
+        )
+        if len(self.previous_counts) >= self.max_previous_counts:
+            self.previous_counts.clear()
+        self.previous_counts[(ident, window)] = (index, count)
+        return count
@@ -1,3 +1,32 @@
-from django.shortcuts import render
+import hmac
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+from .metrics import registry
+
+
+def metrics(request):
+    """
+    Serves the request metrics of this process in Prometheus text format to
+    scrapers sending `Authorization: Bearer <METRICS_TOKEN>`. Without a
+    METRICS_TOKEN the endpoint is off.
+    """
+    if not settings.METRICS_TOKEN:
+        return JsonResponse(
+            {"message": "Metrics are off, set METRICS_TOKEN to serve them"},
+            status=403,
+        )
+    expected = f"Bearer {settings.METRICS_TOKEN}"
+    if not hmac.compare_digest(
+        request.META.get("HTTP_AUTHORIZATION", "").encode(), expected.encode()
+    ):
+        response = JsonResponse(
+            {"message": "Send the metrics token as a bearer token"}, status=401
+        )
+        response["WWW-Authenticate"] = 'Bearer realm="metrics"'
+        return response
+
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
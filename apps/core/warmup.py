@@ -0,0 +1,117 @@
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.urls import URLPattern, URLResolver, get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up(connect=True):
+    """
+    Does the work a cold worker would otherwise do on its first requests:
+    compiles every URL pattern, builds the fields of every serializer a view
+    uses, opens the database connections, loads the role permission map and
+    the revoked token filter and renders the cached OpenAPI schema. A failing
+    step is logged and skipped, it never stops a worker from booting.
+
+    Returns a list of (step, seconds); serializers are timed one by one.
+    """
+    timings = []
+
+    def timed(name, step, *args):
+        started = time.perf_counter()
+        try:
+            step(*args)
+        except Exception:
+            logger.warning("Warm-up step %s failed.", name, exc_info=True)
+        timings.append((name, time.perf_counter() - started))
+
+    views = []
+    timed("urls", _compile_urls, get_resolver(), views)
+    for serializer_class in _serializer_classes(views):
+        name = f"serializer {serializer_class.__module__}.{serializer_class.__name__}"
+        timed(name, _build_serializer, serializer_class)
+    if connect:
+        timed("database", _connect)
+        timed("role permissions", _load_role_permissions)
+        timed("revoked tokens", _load_revoked_tokens)
+    if settings.SCHEMA_CACHE != "off":
+        timed("schema", _render_schema)
+    return timings
+
+
+def refresh_caches():
+    """
+    Loads the per process caches that are due, the way the next request
+    would. The query budget tests call it so those loads are not counted.
+    """
+    from apps.authentication.revocation import revocation_list
+    from apps.authentication.role_permissions import role_permissions
+
+    role_permissions.refresh()
+    revocation_list.refresh()
+
+
+def close_connections_before_fork():
+    """
+    Keeps forked workers from sharing the parent's database sockets when the
+    application is preloaded (and warmed up) in a pre-fork master process.
+    """
+    os.register_at_fork(before=connections.close_all)
+
+
+def _compile_urls(resolver, views):
+    # Populating the resolver builds the reverse lookups, reading `regex`
+    # compiles the lazily compiled pattern of every route.
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            _compile_urls(pattern, views)
+        elif isinstance(pattern, URLPattern):
+            views.append(pattern.callback)
+
+
+def _serializer_classes(views):
+    seen = []
+    for view_func in views:
+        view_class = getattr(view_func, "cls", None) or getattr(
+            view_func, "view_class", None
+        )
+        serializer_class = getattr(view_class, "serializer_class", None)
+        if serializer_class is not None and serializer_class not in seen:
+            seen.append(serializer_class)
+    return seen
+
+
+def _build_serializer(serializer_class):
+    serializer_class().fields
+
+
+def _connect():
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def _load_role_permissions():
+    from apps.authentication.role_permissions import role_permissions
+
+    role_permissions.load()
+
+
+def _load_revoked_tokens():
+    from apps.authentication.revocation import revocation_list
+
+    revocation_list.rebuild()
+
+
+def _render_schema():
+    from .schema import cached_schema_view
+
+    view = cached_schema_view()
+    for renderer in view.renderer_classes:
+        if getattr(renderer, "codec_class", None):
+            view.cache.get_document(renderer.codec_class)
@@ -0,0 +1,114 @@
+import math
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import LeaderboardEntry, Note
+
+# Scores are anchored to a fixed epoch so they never have to be recomputed
+# just because time passed: a newer note simply starts higher.
+SCORE_EPOCH = 1609459200  # 2021-01-01T00:00:00Z
+
+
+def hot_score(like, dislike, rating_count, rating_sum, created_at):
+    """
+    Time-decayed popularity of a note. Likes count up, dislikes down and
+    every rating counts for its distance from three stars. The order of
+    magnitude of that vote total is offset by the note's age, so a note
+    has to collect ten times the votes to keep up with one that is
+    LEADERBOARD_DECAY_SECONDS younger.
+    """
+    votes = like - dislike + (rating_sum - 3 * rating_count)
+    sign = (votes > 0) - (votes < 0)
+    order = math.log10(max(abs(votes), 1))
+    age = created_at.timestamp() - SCORE_EPOCH
+    return round(sign * order + age / settings.LEADERBOARD_DECAY_SECONDS, 7)
+
+
+def refresh_leaderboard(full=False, batch_size=2000):
+    """
+    Rescores the notes that were created, edited, liked, disliked or rated
+    since the previous refresh, or every note when `full` is set.
+    Returns the number of leaderboard entries written.
+    """
+    started = timezone.now()
+    notes = Note.objects.order_by("id")
+    if not full:
+        since = LeaderboardEntry.objects.aggregate(last=Max("refreshed_at"))["last"]
+        if since is not None:
+            notes = notes.filter(
+                Q(updated_at__gte=since) | Q(activity_at__gte=since)
+            )
+
+    written = 0
+    last_id = 0
+    while True:
+        rows = list(
+            notes.filter(id__gt=last_id)
+            .with_reaction_counts()
+            .values(
+                "id",
+                "slug",
+                "title",
+                "created_at",
+                "rating_count",
+                "rating_sum",
+                "like_count",
+                "dislike_count",
+            )[:batch_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+
+        entries = [
+            LeaderboardEntry(
+                note_id=row["id"],
+                slug=row["slug"],
+                title=row["title"],
+                score=hot_score(
+                    row["like_count"],
+                    row["dislike_count"],
+                    row["rating_count"],
+                    row["rating_sum"],
+                    row["created_at"],
+                ),
+                like=row["like_count"],
+                dislike=row["dislike_count"],
+                rating_count=row["rating_count"],
+                rating_average=(
+                    row["rating_sum"] / row["rating_count"]
+                    if row["rating_count"]
+                    else None
+                ),
+                note_created_at=row["created_at"],
+                refreshed_at=started,
+            )
+            for row in rows
+        ]
+        existing = set(
+            LeaderboardEntry.objects.filter(
+                note_id__in=[entry.note_id for entry in entries]
+            ).values_list("note_id", flat=True)
+        )
+        LeaderboardEntry.objects.bulk_create(
+            [entry for entry in entries if entry.note_id not in existing]
+        )
+        LeaderboardEntry.objects.bulk_update(
+            [entry for entry in entries if entry.note_id in existing],
+            [
+                "slug",
+                "title",
+                "score",
+                "like",
+                "dislike",
+                "rating_count",
+                "rating_average",
+                "note_created_at",
+                "refreshed_at",
+            ],
+        )
+        written += len(entries)
+
+    return written
@@ -0,0 +1,358 @@
+import itertools
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from apps.authentication.models import Role, User
+from apps.core.bulk import copy_values, reset_sequences
+from apps.notes.models import Note, NoteRating, make_excerpt
+from apps.notes.slugs import SlugAllocator
+
+# Share of generated users per role, most people only browse.
+ROLE_WEIGHTS = (("guest", 70), ("member", 24), ("moderator", 5), ("admin", 1))
+# Ratings lean towards the good end, as they do on most sites.
+RATING_WEIGHTS = (5, 7, 15, 33, 40)
+# Newest note date unless --until is given, fixed so a seed always
+# produces the same timestamps and hot scores.
+DEFAULT_UNTIL = "2025-01-01"
+
+WORDS = (
+    "django rest api permission role note guide python query index cache "
+    "token review release plan design bug fix meeting weekly daily notes "
+    "ideas todo draft report summary budget team project roadmap sprint "
+    "retro deploy server database migration backup security audit access "
+    "admin member guest moderator onboarding handbook recipe travel book "
+    "reading list journal health workout garden music movie family home"
+).split()
+TAGS = (
+    "python django api work personal ideas todo reading travel health "
+    "finance meeting project draft important archive music books recipes "
+    "security devops"
+).split()
+SENTENCES = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit.",
+    "Remember to follow up on this next week.",
+    "The first draft is done, the details still need work.",
+    "Queries should stay flat no matter how many rows there are.",
+    "Everyone agreed on the plan, the dates are still open.",
+    "A short reminder of what was decided and why.",
+    "This needs a second look before it is shared.",
+    "Numbers are taken from last month's report.",
+    "Links and references are collected at the bottom.",
+    "Nothing urgent here, just keeping track of it.",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with synthetic users, notes, likes, dislikes and "
+        "ratings for scale testing. Users spread over the four roles, note "
+        "titles and tags follow a long tailed distribution so many notes "
+        "share a slug base, and the same --seed always produces the same "
+        "data in an empty database. Rows are written with COPY in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--notes", type=int, default=100000)
+        parser.add_argument(
+            "--likes", type=float, default=4.0, help="Mean likes per note."
+        )
+        parser.add_argument(
+            "--dislikes", type=float, default=1.0, help="Mean dislikes per note."
+        )
+        parser.add_argument(
+            "--ratings", type=float, default=2.0, help="Mean ratings per note."
+        )
+        parser.add_argument(
+            "--titles",
+            type=int,
+            default=5000,
+            help="Distinct titles to draw from, fewer means more slug collisions.",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=20000)
+        parser.add_argument(
+            "--password",
+            default="Password1!",
+            help="Password of every generated user, hashed only once.",
+        )
+        parser.add_argument(
+            "--until",
+            default=DEFAULT_UNTIL,
+            help=f"Date (YYYY-MM-DD) of the newest note, {DEFAULT_UNTIL} by default.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Notes are spread over this many days before --until.",
+        )
+        parser.add_argument(
+            "--append",
+            action="store_true",
+            help="Add to users and notes already there. Ids then continue "
+            "after the existing ones, so the data depends on them as well.",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 0 or options["notes"] < 0:
+            raise CommandError("--users and --notes cannot be negative.")
+        if min(options["titles"], options["batch_size"], options["days"]) < 1:
+            raise CommandError("--titles, --batch-size and --days must be positive.")
+
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.until = self._until(options["until"])
+        self.days = options["days"]
+        if not options["append"]:
+            self._check_empty(options)
+
+        started = time.perf_counter()
+        if options["users"]:
+            self._generate_users(options["users"], options["password"])
+
+        user_ids = list(User.objects.order_by("id").values_list("id", flat=True))
+        if options["notes"]:
+            if not user_ids:
+                raise CommandError("Notes need authors, generate some --users.")
+            self._generate_notes(options, user_ids)
+
+        reset_sequences(User, Note, NoteRating, Note.like.through, Note.dislike.through)
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Generated {} users and {} notes in {:.1f}s.".format(
+                    options["users"],
+                    options["notes"],
+                    time.perf_counter() - started,
+                )
+            )
+        )
+
+    def _check_empty(self, options):
+        # Ids start after the highest one, only empty tables start them at
+        # the same place every time.
+        models = []
+        if options["users"]:
+            models.append(User)
+        if options["notes"]:
+            models += [Note, NoteRating, Note.like.through, Note.dislike.through]
+        filled = [model for model in models if model.objects.exists()]
+        if filled:
+            raise CommandError(
+                "{} already hold rows, pass --append to add to them.".format(
+                    ", ".join(model._meta.db_table for model in filled)
+                )
+            )
+
+    def _first_id(self, model):
+        return (model.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+
+    def _until(self, value):
+        try:
+            return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        except ValueError:
+            raise CommandError("--until must look like YYYY-MM-DD.")
+
+    def _timestamp(self):
+        return self.until - timedelta(seconds=self.random.random() * self.days * 86400)
+
+    def _generate_users(self, count, password):
+        role_ids = {}
+        for name, _ in ROLE_WEIGHTS:
+            role_ids[name] = Role.objects.get_or_create(name=name)[0].id
+
+        # One hash for everybody, hashing millions of passwords takes days.
+        password_hash = make_password(password)
+        roles = [role_ids[name] for name, _ in ROLE_WEIGHTS]
+        role_weights = list(itertools.accumulate(w for _, w in ROLE_WEIGHTS))
+        first_id = self._first_id(User)
+
+        attnames = (
+            "id",
+            "username",
+            "email",
+            "password",
+            "role_id",
+            "created_at",
+            "updated_at",
+        )
+        for start in range(first_id, first_id + count, self.batch_size):
+            batch_started = time.perf_counter()
+            stop = min(start + self.batch_size, first_id + count)
+            chosen = self.random.choices(
+                roles, cum_weights=role_weights, k=stop - start
+            )
+            rows = []
+            for user_id, role_id in zip(range(start, stop), chosen):
+                joined = self._timestamp()
+                rows.append(
+                    (
+                        user_id,
+                        f"user{user_id}",
+                        f"user{user_id}@example.com",
+                        password_hash,
+                        role_id,
+                        joined,
+                        joined,
+                    )
+                )
+            with transaction.atomic():
+                copy_values(User, attnames, rows)
+            self._progress("users", stop - first_id, count, len(rows), batch_started)
+
+    def _generate_notes(self, options, user_ids):
+        titles = self._title_pool(options["titles"])
+        # Zipf like popularity, the first titles and tags are the common ones.
+        title_weights = list(
+            itertools.accumulate(1 / rank for rank in range(1, len(titles) + 1))
+        )
+        tag_weights = list(
+            itertools.accumulate(1 / rank for rank in range(1, len(TAGS) + 1))
+        )
+        slugs = SlugAllocator()
+        count = options["notes"]
+        first_id = self._first_id(Note)
+        rating_id = self._first_id(NoteRating)
+        like_id = self._first_id(Note.like.through)
+        dislike_id = self._first_id(Note.dislike.through)
+
+        note_attnames = (
+            "id",
+            "slug",
+            "title",
+            "description",
+            "body",
+            "excerpt",
+            "tagList",
+            "author_id",
+            "created_at",
+            "updated_at",
+            "activity_at",
+            "rating_count",
+            "rating_sum",
+        ) + tuple(f"rating_star_{star}" for star in range(1, 6))
+        for start in range(first_id, first_id + count, self.batch_size):
+            batch_started = time.perf_counter()
+            stop = min(start + self.batch_size, first_id + count)
+            batch_titles = self.random.choices(
+                titles, cum_weights=title_weights, k=stop - start
+            )
+            slugs.prime(batch_titles)
+
+            notes, likes, dislikes, ratings = [], [], [], []
+            for note_id, title in zip(range(start, stop), batch_titles):
+                created_at = self._timestamp()
+                liked, disliked, rated = self._reactions(options, user_ids)
+                for user_id in liked:
+                    likes.append((like_id, note_id, user_id))
+                    like_id += 1
+                for user_id in disliked:
+                    dislikes.append((dislike_id, note_id, user_id))
+                    dislike_id += 1
+
+                stars = [0] * 5
+                for rater_id in rated:
+                    rating = self.random.choices(range(1, 6), RATING_WEIGHTS)[0]
+                    stars[rating - 1] += 1
+                    ratings.append((rating_id, rater_id, note_id, rating, ""))
+                    rating_id += 1
+
+                sentences = self.random.choices(SENTENCES, k=self.random.randint(2, 20))
+                body = " ".join(sentences)
+                tag_count = self.random.randint(0, 4)
+                notes.append(
+                    (
+                        note_id,
+                        slugs.allocate(title),
+                        title,
+                        sentences[0],
+                        body,
+                        make_excerpt(body),
+                        sorted(
+                            set(
+                                self.random.choices(
+                                    TAGS, cum_weights=tag_weights, k=tag_count
+                                )
+                            )
+                        )
+                        or None,
+                        # A few prolific authors write most of the notes.
+                        user_ids[int(len(user_ids) * self.random.random() ** 3)],
+                        created_at,
+                        created_at,
+                        created_at if liked or disliked or rated else None,
+                        len(rated),
+                        sum(star * total for star, total in enumerate(stars, 1)),
+                        *stars,
+                    )
+                )
+
+            with transaction.atomic():
+                copy_values(Note, note_attnames, notes)
+                copy_values(Note.like.through, ("id", "note_id", "user_id"), likes)
+                copy_values(
+                    Note.dislike.through, ("id", "note_id", "user_id"), dislikes
+                )
+                copy_values(
+                    NoteRating,
+                    ("id", "rater_id", "note_id", "rating", "note_text"),
+                    ratings,
+                )
+            self._progress("notes", stop - first_id, count, len(notes), batch_started)
+
+    def _title_pool(self, size):
+        word_weights = list(
+            itertools.accumulate(1 / rank for rank in range(1, len(WORDS) + 1))
+        )
+        return [
+            " ".join(
+                self.random.choices(
+                    WORDS, cum_weights=word_weights, k=self.random.randint(2, 5)
+                )
+            ).capitalize()
+            for _ in range(size)
+        ]
+
+    def _reactions(self, options, user_ids):
+        """
+        Picks distinct users who like, dislike and rate a note. Counts are
+        exponentially distributed around the requested means, so most notes
+        get a handful of reactions and a few get a lot.
+        """
+        seen = set()
+
+        def pick(mean):
+            if mean <= 0:
+                return []
+            wanted = min(int(self.random.expovariate(1 / mean)), len(user_ids))
+            picked = []
+            for _ in range(wanted * 2):
+                if len(picked) == wanted:
+                    break
+                user_id = user_ids[self.random.randrange(len(user_ids))]
+                if user_id not in seen:
+                    seen.add(user_id)
+                    picked.append(user_id)
+            return picked
+
+        return (
+            pick(options["likes"]),
+            pick(options["dislikes"]),
+            pick(options["ratings"]),
+        )
+
+    def _progress(self, label, done, total, rows, batch_started):
+        self.stdout.write(
+            "{done}/{total} {label} ({rate:.0f} rows/s)".format(
+                done=done,
+                total=total,
+                label=label,
+                rate=rows / max(time.perf_counter() - batch_started, 1e-9),
+            )
+        )
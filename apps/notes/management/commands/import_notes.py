@@ -0,0 +1,216 @@
+import csv
+import itertools
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.authentication.models import User
+from apps.core.bulk import bulk_insert
+from apps.notes.models import Note, make_excerpt
+from apps.notes.slugs import SlugAllocator
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports notes from an NDJSON or CSV file in streaming chunks. "
+        "Each record needs a `title`, `body` and an `author` given as an "
+        "email or username; `description` and `tagList` are optional. "
+        "Progress is checkpointed after every chunk so an interrupted "
+        "import resumes where it stopped."
+    )
+
+    # Upper bound on the author lookup cache before it gets reset.
+    author_cache_size = 100000
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="NDJSON or CSV file to import.")
+        parser.add_argument(
+            "--format",
+            choices=["ndjson", "csv"],
+            help="Input format, guessed from the file extension by default.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument(
+            "--checkpoint",
+            help="Checkpoint file, defaults to <path>.checkpoint.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and import from the start.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+
+        source_format = options["format"] or self._guess_format(path)
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be a positive number.")
+
+        checkpoint_path = options["checkpoint"] or f"{path}.checkpoint"
+        progress = {"rows": 0, "imported": 0, "skipped": 0}
+        if not options["restart"]:
+            progress.update(self._load_checkpoint(checkpoint_path, path))
+            if progress["rows"]:
+                self.stdout.write(f"Resuming after row {progress['rows']}.")
+
+        records = self._read(path, source_format, skip=progress["rows"])
+        self.authors = {}
+        self.slugs = SlugAllocator()
+
+        started = time.perf_counter()
+        rows_this_run = 0
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                break
+
+            chunk_started = time.perf_counter()
+            notes = self._build_notes(chunk)
+            with transaction.atomic():
+                bulk_insert(Note, notes)
+
+            progress["rows"] += len(chunk)
+            progress["imported"] += len(notes)
+            progress["skipped"] += len(chunk) - len(notes)
+            self._save_checkpoint(checkpoint_path, path, progress)
+
+            rows_this_run += len(chunk)
+            now = time.perf_counter()
+            self.stdout.write(
+                "{rows} rows read, {imported} imported, {skipped} skipped "
+                "({chunk_rate:.0f} rows/s, {rate:.0f} rows/s overall)".format(
+                    chunk_rate=len(chunk) / max(now - chunk_started, 1e-9),
+                    rate=rows_this_run / max(now - started, 1e-9),
+                    **progress,
+                )
+            )
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Imported {imported} notes, skipped {skipped} rows "
+                "in {elapsed:.1f}s ({rate:.0f} rows/s).".format(
+                    elapsed=elapsed,
+                    rate=rows_this_run / max(elapsed, 1e-9),
+                    **progress,
+                )
+            )
+        )
+
+    def _guess_format(self, path):
+        extension = os.path.splitext(path)[1].lower()
+        if extension in (".ndjson", ".jsonl", ".json"):
+            return "ndjson"
+        if extension == ".csv":
+            return "csv"
+        raise CommandError(f"Cannot guess the format of {path}, pass --format.")
+
+    def _read(self, path, source_format, skip=0):
+        """
+        Yields one dict per record, lazily, skipping the first `skip`.
+        NDJSON lines that hold no JSON object are reported and yield an
+        empty record, which gets skipped like one missing its fields.
+        """
+        with open(path, newline="", encoding="utf-8") as source:
+            if source_format == "csv":
+                yield from itertools.islice(csv.DictReader(source), skip, None)
+                return
+
+            lines = itertools.islice(source, skip, None)
+            for row, line in enumerate(lines, start=skip + 1):
+                record = json.loads(line) if line.strip() else {}
+                if not isinstance(record, dict):
+                    self.stderr.write(f"Row {row} is not a JSON object, skipped.")
+                    record = {}
+                yield record
+
+    def _build_notes(self, chunk):
+        """
+        Turns a chunk of raw records into unsaved notes. Authors are resolved
+        with at most two queries per chunk and slugs are allocated in memory.
+        Records without a title, body or known author are dropped.
+        """
+        records = [
+            record
+            for record in chunk
+            if record.get("title") and record.get("body") and record.get("author")
+        ]
+        self._resolve_authors({record["author"] for record in records})
+        self.slugs.prime(record["title"] for record in records)
+
+        notes = []
+        for record in records:
+            author_id = self.authors.get(record["author"])
+            if author_id is None:
+                continue
+            notes.append(
+                Note(
+                    slug=self.slugs.allocate(record["title"]),
+                    title=record["title"],
+                    description=record.get("description") or "",
+                    body=record["body"],
+                    excerpt=make_excerpt(record["body"]),
+                    tagList=self._tags(record.get("tagList")),
+                    author_id=author_id,
+                )
+            )
+        return notes
+
+    def _resolve_authors(self, keys):
+        missing = keys - self.authors.keys()
+        if not missing:
+            return
+        if len(self.authors) > self.author_cache_size:
+            self.authors = {}
+
+        emails = {key for key in missing if "@" in key}
+        usernames = missing - emails
+        if emails:
+            self.authors.update(
+                User.objects.filter(email__in=emails).values_list("email", "id")
+            )
+        if usernames:
+            self.authors.update(
+                User.objects.filter(username__in=usernames).values_list(
+                    "username", "id"
+                )
+            )
+        # Remember unknown authors too so they are not looked up again.
+        for key in missing - self.authors.keys():
+            self.authors[key] = None
+
+    def _tags(self, tags):
+        # NDJSON carries a list, CSV a `|` separated string.
+        if not tags:
+            return None
+        if isinstance(tags, str):
+            tags = tags.split("|")
+        return [tag.strip() for tag in tags if tag.strip()]
+
+    def _load_checkpoint(self, checkpoint_path, path):
+        if not os.path.exists(checkpoint_path):
+            return {}
+        with open(checkpoint_path) as checkpoint:
+            state = json.load(checkpoint)
+        if state.get("source") != os.path.abspath(path):
+            raise CommandError(
+                f"{checkpoint_path} belongs to another file, use --restart."
+            )
+        return {key: state[key] for key in ("rows", "imported", "skipped")}
+
+    def _save_checkpoint(self, checkpoint_path, path, progress):
+        # Write then rename so a crash never leaves a half written checkpoint.
+        temporary_path = f"{checkpoint_path}.tmp"
+        with open(temporary_path, "w") as checkpoint:
+            json.dump(dict(progress, source=os.path.abspath(path)), checkpoint)
+        os.replace(temporary_path, checkpoint_path)
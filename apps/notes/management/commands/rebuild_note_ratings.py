@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+
+from apps.notes.models import RATING_AGGREGATE_FIELDS, Note, rating_totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the rating aggregates stored on notes from their "
+        "NoteRating rows and repairs the ones that drifted, for example "
+        "after ratings were changed with SQL."
+    )
+
+    aggregate_fields = RATING_AGGREGATE_FIELDS
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many notes drifted.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        checked = repaired = 0
+        last_id = 0
+        while True:
+            notes = list(
+                Note.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", *self.aggregate_fields)[:batch_size]
+            )
+            if not notes:
+                break
+            last_id = notes[-1].id
+
+            totals = rating_totals([note.id for note in notes])
+            unrated = dict.fromkeys(self.aggregate_fields, 0)
+            drifted = []
+            for note in notes:
+                expected = totals.get(note.id, unrated)
+                if any(getattr(note, f) != v for f, v in expected.items()):
+                    for field, value in expected.items():
+                        setattr(note, field, value)
+                    drifted.append(note)
+
+            if drifted and not options["dry_run"]:
+                Note.objects.bulk_update(drifted, self.aggregate_fields)
+            checked += len(notes)
+            repaired += len(drifted)
+
+        verb = "drifted" if options["dry_run"] else "repaired"
+        self.stdout.write(
+            self.style.SUCCESS(f"Checked {checked} notes, {repaired} {verb}.")
+        )
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.notes.leaderboard import refresh_leaderboard
+
+
+class Command(BaseCommand):
+    help = (
+        "Rescores the notes that changed since the last run and writes them "
+        "to the trending leaderboard. Meant to run periodically, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rescore every note instead of only the changed ones.",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = refresh_leaderboard(
+            full=options["full"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Refreshed {written} leaderboard entries "
+                f"in {time.perf_counter() - started:.1f}s."
+            )
+        )
@@ -0,0 +1,70 @@
+# Generated by Django 3.2.9 on 2026-10-19 14:58
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_rating_aggregates(apps, schema_editor):
+    Note = apps.get_model("notes", "Note")
+    NoteRating = apps.get_model("notes", "NoteRating")
+
+    totals = NoteRating.objects.values("note").annotate(
+        count=Count("id"),
+        total=Sum("rating"),
+        **{
+            f"star_{star}": Count("id", filter=Q(rating=star))
+            for star in range(1, 6)
+        },
+    )
+    for row in totals.iterator():
+        Note.objects.filter(pk=row["note"]).update(
+            rating_count=row["count"],
+            rating_sum=row["total"],
+            **{f"rating_star_{star}": row[f"star_{star}"] for star in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notes", "0003_auto_20211106_0702"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="note",
+            name="rating_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="note",
+            name="rating_star_1",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="note",
+            name="rating_star_2",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="note",
+            name="rating_star_3",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="note",
+            name="rating_star_4",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="note",
+            name="rating_star_5",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="note",
+            name="rating_sum",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_rating_aggregates, migrations.RunPython.noop),
+    ]
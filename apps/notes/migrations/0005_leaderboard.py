@@ -0,0 +1,46 @@
+# Generated by Django 3.2.9 on 2026-10-19 15:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notes", "0004_note_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaderboardEntry",
+            fields=[
+                (
+                    "note",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="leaderboard",
+                        serialize=False,
+                        to="notes.note",
+                    ),
+                ),
+                ("slug", models.SlugField(max_length=255)),
+                ("title", models.CharField(max_length=255)),
+                ("score", models.FloatField(db_index=True)),
+                ("like", models.IntegerField(default=0)),
+                ("dislike", models.IntegerField(default=0)),
+                ("rating_count", models.IntegerField(default=0)),
+                ("rating_average", models.FloatField(null=True)),
+                ("note_created_at", models.DateTimeField(db_index=True)),
+                ("refreshed_at", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "ordering": ["-score", "-note_id"],
+            },
+        ),
+        migrations.AddField(
+            model_name="note",
+            name="activity_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
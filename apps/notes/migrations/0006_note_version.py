@@ -0,0 +1,18 @@
+# Generated by Django 3.2.9 on 2026-10-19 15:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notes", "0005_leaderboard"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="note",
+            name="version",
+            field=models.IntegerField(default=1),
+        ),
+    ]
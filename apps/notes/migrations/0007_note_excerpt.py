@@ -0,0 +1,53 @@
+# Generated by Django 3.2.9 on 2026-10-19 15:28
+
+from django.db import migrations, models
+from django.db.models.functions import Substr
+
+# Frozen copies of apps.notes.models.EXCERPT_LENGTH and make_excerpt() as
+# they were when this migration was written, later changes to the model must
+# not change what it does.
+EXCERPT_LENGTH = 280
+
+
+def make_excerpt(body):
+    if len(body) <= EXCERPT_LENGTH:
+        return body
+    excerpt = body[:EXCERPT_LENGTH]
+    space = excerpt.rfind(" ")
+    if space > EXCERPT_LENGTH // 2:
+        excerpt = excerpt[:space]
+    return excerpt.rstrip() + "\u2026"
+
+
+def populate_excerpts(apps, schema_editor):
+    Note = apps.get_model("notes", "Note")
+
+    # Only the start of each body is read, bodies can be hundreds of KB.
+    heads = (
+        Note.objects.annotate(head=Substr("body", 1, EXCERPT_LENGTH + 1))
+        .values_list("id", "head")
+        .iterator(chunk_size=2000)
+    )
+    batch = []
+    for note_id, head in heads:
+        batch.append(Note(id=note_id, excerpt=make_excerpt(head)))
+        if len(batch) == 2000:
+            Note.objects.bulk_update(batch, ["excerpt"])
+            batch = []
+    Note.objects.bulk_update(batch, ["excerpt"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notes", "0006_note_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="note",
+            name="excerpt",
+            field=models.CharField(blank=True, default="", max_length=281),
+        ),
+        migrations.RunPython(populate_excerpts, migrations.RunPython.noop),
+    ]
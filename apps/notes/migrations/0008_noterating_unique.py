@@ -0,0 +1,51 @@
+# Generated by Django 3.2.9 on 2026-10-19 16:01
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remove_duplicate_ratings(apps, schema_editor):
+    Note = apps.get_model("notes", "Note")
+    NoteRating = apps.get_model("notes", "NoteRating")
+
+    duplicates = (
+        NoteRating.objects.values("note_id", "rater_id")
+        .annotate(count=Count("id"), last_id=Max("id"))
+        .filter(count__gt=1)
+    )
+    note_ids = set()
+    for duplicate in duplicates:
+        # The latest rating of a user is the one they meant.
+        NoteRating.objects.filter(
+            note_id=duplicate["note_id"], rater_id=duplicate["rater_id"]
+        ).exclude(id=duplicate["last_id"]).delete()
+        note_ids.add(duplicate["note_id"])
+
+    for note_id in note_ids:
+        stars = dict(
+            NoteRating.objects.filter(note_id=note_id)
+            .values_list("rating")
+            .annotate(count=Count("id"))
+        )
+        Note.objects.filter(id=note_id).update(
+            rating_count=sum(stars.values()),
+            rating_sum=sum(star * count for star, count in stars.items()),
+            **{f"rating_star_{star}": stars.get(star, 0) for star in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notes", "0007_note_excerpt"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_ratings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="noterating",
+            constraint=models.UniqueConstraint(
+                fields=("note", "rater"), name="unique_note_rating_per_rater"
+            ),
+        ),
+    ]
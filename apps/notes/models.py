@@ -1,5 +1,20 @@
 import os
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import (
+    BooleanField,
+    Count,
+    Exists,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.text import slugify
 from django.contrib.postgres.fields import ArrayField
 
@@ -28,11 +43,97 @@ class TimestampedModel(models.Model):
         ordering = ["-created_at", "-updated_at"]
 
 
+# Characters of the body kept in Note.excerpt for list views.
+EXCERPT_LENGTH = 280
+
+
+def make_excerpt(body):
+    """The start of `body`, cut after a word when the body is longer."""
+    if len(body) <= EXCERPT_LENGTH:
+        return body
+    excerpt = body[:EXCERPT_LENGTH]
+    space = excerpt.rfind(" ")
+    if space > EXCERPT_LENGTH // 2:
+        excerpt = excerpt[:space]
+    return excerpt.rstrip() + "\u2026"
+
+
+class NoteQuerySet(models.QuerySet):
+    def with_reaction_counts(self, like=True, dislike=True):
+        """
+        Annotates `like_count` and `dislike_count` with one correlated
+        subquery each, instead of a count query per note.
+        """
+        counts = {}
+        if like:
+            counts["like_count"] = _through_count(self.model.like.through)
+        if dislike:
+            counts["dislike_count"] = _through_count(self.model.dislike.through)
+        return self.annotate(**counts)
+
+    def with_viewer_reactions(self, user, liked=True, disliked=True):
+        """
+        Annotates whether `user` likes (`liked_by_me`) and dislikes
+        (`disliked_by_me`) each note, with an EXISTS subquery each.
+        """
+        reactions = {}
+        if liked:
+            reactions["liked_by_me"] = _through_exists(self.model.like.through, user)
+        if disliked:
+            reactions["disliked_by_me"] = _through_exists(
+                self.model.dislike.through, user
+            )
+        return self.annotate(**reactions)
+
+    def refresh_rating_aggregates(self):
+        """
+        Recomputes the rating aggregates of the notes from their ratings,
+        after writes that bypass NoteRating.save(). Returns the notes that
+        had drifted.
+        """
+        notes = list(self.only("id", *RATING_AGGREGATE_FIELDS))
+        totals = rating_totals([note.id for note in notes])
+        unrated = dict.fromkeys(RATING_AGGREGATE_FIELDS, 0)
+        drifted = []
+        for note in notes:
+            expected = totals.get(note.id, unrated)
+            if any(getattr(note, f) != v for f, v in expected.items()):
+                for field, value in expected.items():
+                    setattr(note, field, value)
+                drifted.append(note)
+        if drifted:
+            self.model.objects.bulk_update(drifted, RATING_AGGREGATE_FIELDS)
+        return drifted
+
+
+def _through_exists(through, user):
+    if user.pk is None:
+        return Value(False, output_field=BooleanField())
+    return Exists(through.objects.filter(note_id=OuterRef("pk"), user_id=user.pk))
+
+
+def _through_count(through):
+    return Coalesce(
+        Subquery(
+            through.objects.filter(note_id=OuterRef("pk"))
+            .order_by()
+            .values("note_id")
+            .annotate(total=Count("*"))
+            .values("total"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
 class Note(TimestampedModel):
     slug = models.SlugField(db_index=True, max_length=255, unique=True)
     title = models.CharField(db_index=True, max_length=255)
     description = models.TextField()
     body = models.TextField()
+    # Kept up to date by save() and every other write of the body, so lists
+    # never have to read the body itself.
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH + 1, blank=True, default="")
     tagList = ArrayField(
         models.CharField(max_length=255), default=None, null=True, blank=True
     )
@@ -50,6 +151,25 @@ class Note(TimestampedModel):
         "authentication.User", on_delete=models.CASCADE, related_name="notes"
     )
     ratings_counter = models.IntegerField(default=0)
+    # Running aggregates of the note's NoteRating rows, kept up to date by
+    # NoteRating.save(), the rating post_delete signal and NoteRatingQuerySet
+    # so that the average and the per-star distribution never need a scan of
+    # the ratings table.
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_star_1 = models.IntegerField(default=0)
+    rating_star_2 = models.IntegerField(default=0)
+    rating_star_3 = models.IntegerField(default=0)
+    rating_star_4 = models.IntegerField(default=0)
+    rating_star_5 = models.IntegerField(default=0)
+    # Last time somebody liked, disliked or rated the note. Together with
+    # updated_at it tells the leaderboard refresh which notes changed.
+    activity_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Bumped by every update through the API and sent as the ETag, an update
+    # only applies to the version the client read (If-Match).
+    version = models.IntegerField(default=1)
+
+    objects = NoteQuerySet.as_manager()
 
     prepopulated_fields = {"slug": ("title",)}
 
@@ -57,7 +177,9 @@ class Note(TimestampedModel):
         slug = slugify(self.title)
         unique_slug = slug
         num = 1
-        while Note.objects.filter(slug=unique_slug).exists():
+        # A saved note keeps its own slug instead of moving to slug-1.
+        others = Note.objects.exclude(pk=self.pk) if self.pk else Note.objects
+        while others.filter(slug=unique_slug).exists():
             unique_slug = "{}-{}".format(slug, num)
             num += 1
         return unique_slug
@@ -69,18 +191,107 @@ class Note(TimestampedModel):
         Slug: NoteOne-1
         """
         self.slug = self._get_unique_slug()
+        self.excerpt = make_excerpt(self.body)
         super(Note, self).save(*args, **kwargs)
 
     def updaterate(self, rating):
         """ """
         self.ratings_counter = rating
 
+    @property
+    def rating_average(self):
+        """Average star rating, None when the note has not been rated"""
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+
+    @property
+    def rating_distribution(self):
+        """Number of ratings given per star, e.g. {1: 0, 2: 3, ...}"""
+        return {star: getattr(self, f"rating_star_{star}") for star in RATING_STARS}
+
+    @staticmethod
+    def rating_changes(rating, sign=1):
+        """
+        Returns the update() arguments that add (sign=1) or remove (sign=-1)
+        a single rating from the aggregate columns. Legacy ratings outside
+        RATING_STARS have no star column, they only count in the totals,
+        like rating_totals() counts them.
+        """
+        changes = {
+            "rating_count": F("rating_count") + sign,
+            "rating_sum": F("rating_sum") + sign * rating,
+            "activity_at": timezone.now(),
+        }
+        if rating in RATING_STARS:
+            changes[f"rating_star_{rating}"] = F(f"rating_star_{rating}") + sign
+        return changes
+
+    @property
+    def etag(self):
+        return f'"{self.version}"'
+
     def __str__(self):
         """Returns a title of the note as object representation"""
 
         return self.title
 
 
+RATING_STARS = range(1, 6)
+
+RATING_AGGREGATE_FIELDS = ["rating_count", "rating_sum"] + [
+    f"rating_star_{star}" for star in RATING_STARS
+]
+
+# NoteRating fields whose change moves a rating between aggregates.
+RATED_FIELDS = {"rating", "note", "note_id"}
+
+
+def rating_totals(note_ids):
+    """The rating aggregates of the notes with `note_ids` that have ratings."""
+    rows = (
+        NoteRating.objects.filter(note_id__in=note_ids)
+        .values("note_id")
+        .annotate(
+            rating_count=Count("id"),
+            rating_sum=Sum("rating"),
+            **{
+                f"rating_star_{star}": Count("id", filter=Q(rating=star))
+                for star in RATING_STARS
+            },
+        )
+    )
+    return {row.pop("note_id"): row for row in rows}
+
+
+class NoteRatingQuerySet(models.QuerySet):
+    """
+    Bulk writes skip NoteRating.save(), so these recompute the aggregates
+    of the notes they touch. Deletes, bulk or cascading, are handled by the
+    post_delete signal.
+    """
+
+    def update(self, **kwargs):
+        if not RATED_FIELDS & set(kwargs):
+            return super().update(**kwargs)
+        with transaction.atomic():
+            note_ids = set(self.values_list("note_id", flat=True))
+            updated = super().update(**kwargs)
+            note = kwargs.get("note", kwargs.get("note_id"))
+            if note is not None:
+                note_ids.add(getattr(note, "pk", note))
+            Note.objects.filter(id__in=note_ids).refresh_rating_aggregates()
+        return updated
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic():
+            created = super().bulk_create(objs, *args, **kwargs)
+            Note.objects.filter(
+                id__in={rating.note_id for rating in created}
+            ).refresh_rating_aggregates()
+        return created
+
+
 class NoteRating(models.Model):
     """
     Defines the ratings fields for a rater
@@ -94,5 +305,71 @@ class NoteRating(models.Model):
     note = models.ForeignKey(Note, on_delete=models.CASCADE, related_name="noteratings")
     rating = models.IntegerField()
 
+    objects = NoteRatingQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["note", "rater"], name="unique_note_rating_per_rater"
+            )
+        ]
+
     def __str__(self):
         return self.note_text
+
+    def save(self, *args, **kwargs):
+        """
+        Ensure that the rating is between 1 and 5 stars and move it into
+        the note's rating aggregates in the same transaction.
+        """
+        if self.rating not in RATING_STARS:
+            raise ValidationError(f"{self.rating} is not a valid rating.")
+
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = (
+                    NoteRating.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("note_id", "rating")
+                    .first()
+                )
+            super().save(*args, **kwargs)
+
+            if previous == (self.note_id, self.rating):
+                return
+            if previous:
+                note_id, rating = previous
+                Note.objects.filter(pk=note_id).update(
+                    **Note.rating_changes(rating, -1)
+                )
+            Note.objects.filter(pk=self.note_id).update(
+                **Note.rating_changes(self.rating)
+            )
+
+
+class LeaderboardEntry(models.Model):
+    """
+    Precomputed ranking of a note, refreshed by refresh_leaderboard.
+    Slug and title are copied over so the leaderboard is served from this
+    table alone.
+    """
+
+    note = models.OneToOneField(
+        Note, primary_key=True, on_delete=models.CASCADE, related_name="leaderboard"
+    )
+    slug = models.SlugField(max_length=255)
+    title = models.CharField(max_length=255)
+    score = models.FloatField(db_index=True)
+    like = models.IntegerField(default=0)
+    dislike = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+    rating_average = models.FloatField(null=True)
+    note_created_at = models.DateTimeField(db_index=True)
+    refreshed_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ["-score", "-note_id"]
+
+    def __str__(self):
+        return self.title
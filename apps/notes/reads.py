@@ -0,0 +1,13 @@
+from apps.core.singleflight import SingleFlight
+
+# Note reads shared between concurrent identical requests of the process
+# and kept for NOTE_READ_CACHE_SECONDS, keyed ("note", pk, ...) for single
+# notes and ("notes", url, ...) for list pages, along with their rendered
+# and compressed responses. See NoteViewSet.
+note_reads = SingleFlight()
+
+
+def forget_note(pk):
+    """Drops the shared reads that show the note, after it changed."""
+    note_reads.forget("note", pk)
+    note_reads.forget("notes")
@@ -5,7 +5,7 @@ from django.contrib.auth.tokens import default_token_generator
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 from apps.authentication.serializers import UserSerializer
-from .models import Note
+from .models import LeaderboardEntry, Note, NoteRating, RATING_STARS
 
 
 
@@ -15,6 +15,8 @@ class NoteSerializer(serializers.ModelSerializer):
     slug = serializers.SlugField(required=False)
     like = serializers.SerializerMethodField(method_name="get_like_count")
     dislike = serializers.SerializerMethodField(method_name="get_dislike_count")
+    liked_by_me = serializers.SerializerMethodField()
+    disliked_by_me = serializers.SerializerMethodField()
     created_at_date = serializers.SerializerMethodField(method_name="get_created_at")
     updated_at_date = serializers.SerializerMethodField(method_name="get_updated_at")
 
@@ -24,6 +26,7 @@ class NoteSerializer(serializers.ModelSerializer):
             "id",
             "author",
             "body",
+            "excerpt",
             "tagList",
             "created_at_date",
             "description",
@@ -32,8 +35,54 @@ class NoteSerializer(serializers.ModelSerializer):
             "updated_at_date",
             "like",
             "dislike",
+            "liked_by_me",
+            "disliked_by_me",
         )
-        
+        read_only_fields = ("excerpt",)
+
+    # What each field reads from the note: model fields for only(), and
+    # for the counts the with_reaction_counts() annotation they need.
+    field_sources = {
+        "id": ["id"],
+        "author": ["author"],
+        "body": ["body"],
+        "excerpt": ["excerpt"],
+        "tagList": ["tagList"],
+        "created_at_date": ["created_at"],
+        "description": ["description"],
+        "slug": ["slug"],
+        "title": ["title"],
+        "updated_at_date": ["updated_at"],
+        "like": [],
+        "dislike": [],
+        "liked_by_me": [],
+        "disliked_by_me": [],
+    }
+    # Fields that depend on the user making the request.
+    viewer_fields = ("liked_by_me", "disliked_by_me")
+    # Same for fields named in `expand`, which render the related object.
+    expanded_sources = {
+        "author": [
+            "author__id",
+            "author__email",
+            "author__username",
+            "author__role__name",
+        ],
+    }
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        """
+        `fields` limits the representation to those fields. Then the author
+        is only an id, unless it is named in `expand`.
+        """
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            return
+        for name in set(self.fields) - set(fields):
+            self.fields.pop(name)
+        if "author" in self.fields and "author" not in (expand or ()):
+            self.fields["author"] = serializers.PrimaryKeyRelatedField(read_only=True)
+
     def get_created_at(self, instance):
         # Returns the date when article was created in isoformat()
         # Example:
@@ -50,16 +99,84 @@ class NoteSerializer(serializers.ModelSerializer):
     def get_like_count(self, obj):
         """Sets the value of like field to the serializer
         by returning the length of the like object."""
-        # counts the number of children the like object has
-        return obj.like.count()
+        # counts the number of children the like object has, unless the
+        # queryset already annotated it (see NoteQuerySet.with_reaction_counts)
+        like_count = getattr(obj, "like_count", None)
+        return like_count if like_count is not None else obj.like.count()
 
     def get_dislike_count(self, obj):
         """Sets the value of dislike field to the
         serializer by returning the length of the dislike object."""
         # counts the number of children the dislike object has
-        return obj.dislike.count()
+        dislike_count = getattr(obj, "dislike_count", None)
+        return dislike_count if dislike_count is not None else obj.dislike.count()
+
+    def get_liked_by_me(self, obj):
+        """Whether the user making the request likes the note."""
+        # Annotated for whole pages by NoteQuerySet.with_viewer_reactions.
+        liked = getattr(obj, "liked_by_me", None)
+        return liked if liked is not None else self._reacted(obj.like)
+
+    def get_disliked_by_me(self, obj):
+        """Whether the user making the request dislikes the note."""
+        disliked = getattr(obj, "disliked_by_me", None)
+        return disliked if disliked is not None else self._reacted(obj.dislike)
+
+    def _reacted(self, users):
+        request = self.context.get("request")
+        if request is None or not request.user.is_authenticated:
+            return False
+        return users.filter(pk=request.user.pk).exists()
 
     def create(self, validated_data):
         """Method creates an article based on validated data"""
         note = Note.objects.create(**validated_data)
-        return note
\ No newline at end of file
+        return note
+
+
+class NoteRatingSerializer(serializers.ModelSerializer):
+    note_text = serializers.CharField(required=False, allow_blank=True, default="")
+
+    class Meta:
+        model = NoteRating
+        fields = ["id", "note", "rating", "note_text"]
+        read_only_fields = ["note"]
+
+    def validate_rating(self, rating):
+        if rating not in RATING_STARS:
+            raise serializers.ValidationError(f"{rating} is not a valid rating.")
+        return rating
+
+
+class NoteRatingSummarySerializer(serializers.ModelSerializer):
+    """Reads a note's rating aggregates, no ratings are scanned."""
+
+    average = serializers.FloatField(source="rating_average", read_only=True)
+    distribution = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Note
+        fields = ["id", "rating_count", "average", "distribution"]
+
+    def get_distribution(self, instance):
+        # JSON object keys are strings, use the star as key e.g. {"5": 12}
+        return {
+            str(star): count for star, count in instance.rating_distribution.items()
+        }
+
+
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source="note_id", read_only=True)
+
+    class Meta:
+        model = LeaderboardEntry
+        fields = [
+            "id",
+            "slug",
+            "title",
+            "score",
+            "like",
+            "dislike",
+            "rating_count",
+            "rating_average",
+        ]
@@ -0,0 +1,50 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Note, NoteRating
+from .reads import forget_note, note_reads
+
+
+@receiver(m2m_changed, sender=Note.like.through)
+@receiver(m2m_changed, sender=Note.dislike.through)
+def touch_note_activity(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Marks notes whose likes or dislikes changed so that the leaderboard
+    refresh picks them up.
+    """
+    if reverse:
+        # `instance` is the user, `pk_set` holds note ids.
+        if action == "pre_clear":
+            note_ids = sender.objects.filter(user_id=instance.pk).values("note_id")
+        elif action in ("post_add", "post_remove"):
+            note_ids = pk_set
+        else:
+            return
+        Note.objects.filter(id__in=note_ids).update(activity_at=timezone.now())
+    elif action in ("post_add", "post_remove", "post_clear"):
+        Note.objects.filter(id=instance.pk).update(activity_at=timezone.now())
+
+
+@receiver(post_save, sender=Note)
+@receiver(m2m_changed, sender=Note.like.through)
+@receiver(m2m_changed, sender=Note.dislike.through)
+def forget_note_reads(sender, instance, reverse=False, **kwargs):
+    """Drops the shared reads of notes that changed, see apps.notes.reads."""
+    if reverse:
+        # `instance` is a user who reacted to any number of notes.
+        note_reads.forget("note")
+        note_reads.forget("notes")
+    else:
+        forget_note(instance.pk)
+
+
+@receiver(post_delete, sender=NoteRating)
+def remove_rating_from_aggregates(sender, instance, **kwargs):
+    """
+    Takes a deleted rating out of its note's aggregates, however it was
+    deleted: one rating, a queryset, or a cascade from its note or rater.
+    """
+    Note.objects.filter(pk=instance.note_id).update(
+        **Note.rating_changes(instance.rating, -1)
+    )
@@ -0,0 +1,63 @@
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .models import Note
+
+
+class SlugAllocator:
+    """
+    Hands out unique note slugs in memory, following the same
+    `title`, `title-1`, `title-2` scheme as Note._get_unique_slug
+    without a query per candidate.
+
+    Existing slugs are loaded once per base slug with prime(), which takes
+    a snapshot of every stored slug sharing that prefix.
+    """
+
+    # Keeps the OR-ed prefix lookups of a single snapshot query reasonable.
+    prime_batch_size = 500
+
+    def __init__(self, queryset=None):
+        self.queryset = queryset if queryset is not None else Note.objects.all()
+        self._taken = set()
+        self._next_suffix = {}
+        self._primed = set()
+
+    def prime(self, titles):
+        """Snapshots the stored slugs for every title not seen before."""
+        bases = list({slugify(title) for title in titles} - self._primed)
+        for start in range(0, len(bases), self.prime_batch_size):
+            batch = bases[start : start + self.prime_batch_size]
+            prefixes = Q()
+            for base in batch:
+                prefixes |= Q(slug=base) | Q(slug__startswith=base + "-")
+            self._taken.update(
+                self.queryset.filter(prefixes).values_list("slug", flat=True)
+            )
+            self._primed.update(batch)
+
+    def allocate(self, title):
+        """Returns the next free slug for `title` and reserves it."""
+        base = slugify(title)
+        if base not in self._primed:
+            self.prime([title])
+
+        if base not in self._taken and not self._suffixed(base):
+            self._taken.add(base)
+            return base
+
+        # Suffixes only grow, so suffixed slugs handed out here are not kept
+        # in _taken, which holds the primed snapshot and the bare bases. That
+        # keeps memory flat when millions of notes share a few titles.
+        suffix = self._next_suffix.get(base, 1)
+        slug = "{}-{}".format(base, suffix)
+        while slug in self._taken:
+            suffix += 1
+            slug = "{}-{}".format(base, suffix)
+        self._next_suffix[base] = suffix + 1
+        return slug
+
+    def _suffixed(self, slug):
+        """Whether `slug` was already handed out as `<base>-<n>`."""
+        base, _, suffix = slug.rpartition("-")
+        return suffix.isdigit() and int(suffix) < self._next_suffix.get(base, 1)
@@ -1,3 +1,775 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.text import slugify
+from drf_yasg import openapi
+from drf_yasg.generators import OpenAPISchemaGenerator
+from rest_framework.test import APITestCase
+
+from apps.authentication.models import Permission, Role, User
+from apps.authentication.tests import bearer
+from apps.core.testing import QueryBudgetTestMixin
+from .leaderboard import hot_score, refresh_leaderboard
+from .management.commands import import_notes
+from .models import EXCERPT_LENGTH, Note, NoteRating, make_excerpt, rating_totals
+from .serializers import NoteRatingSerializer
+from .urls import urlpatterns
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="member")
+        for name in ["can_create_note", "can_rate_note"]:
+            Permission.objects.create(name=name, role=role)
+        cls.user = User.objects.create_user_with_role(
+            "jake", "jake@example.com", "member", password="Passw0rd!"
+        )
+        cls.other = User.objects.create_user_with_role(
+            "jane", "jane@example.com", "member", password="Passw0rd!"
+        )
+        for number in range(6):
+            note = Note.objects.create(
+                title=f"Note {number}",
+                description="description",
+                body="body",
+                tagList=["tag"],
+                author=cls.user,
+            )
+            note.like.add(cls.user, cls.other)
+            note.dislike.add(cls.other)
+            NoteRating.objects.create(
+                note=note, rater=cls.other, rating=4, note_text="good"
+            )
+        cls.note = note
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.user))
+
+    def test_every_route_declares_a_budget(self):
+        self.assertEveryRouteHasBudget(urlpatterns)
+
+    def test_create_note(self):
+        response = self.request_within_budget(
+            "POST",
+            "/api/notes/",
+            {"title": "Note", "description": "d", "body": "b", "tagList": ["t"]},
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_list_notes(self):
+        response = self.request_within_budget("GET", "/api/notes/list")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNoNPlusOne("/api/notes/list")
+
+    def test_lists_send_the_excerpt(self):
+        body = "long " * 100000
+        self.client.put(
+            f"/api/notes/{self.note.pk}/update",
+            {"body": body},
+            HTTP_IF_MATCH=self.note.etag,
+        )
+        with CaptureQueriesContext(connection) as captured:
+            response = self.request_within_budget("GET", "/api/notes/list?limit=1")
+        note = response.json()["results"][0]
+        self.assertNotIn("body", note)
+        self.assertEqual(note["excerpt"], make_excerpt(body.strip()))
+        self.assertLessEqual(len(note["excerpt"]), EXCERPT_LENGTH + 1)
+        self.assertNotIn('"body"', captured.captured_queries[-1]["sql"])
+
+        response = self.client.get(f"/api/notes/{self.note.pk}")
+        self.assertEqual(response.json()["note"]["body"], body.strip())
+        response = self.client.get("/api/notes/list?fields=title,body")
+        self.assertEqual(response.status_code, 400, response.content)
+
+    def test_reactions_of_the_viewer(self):
+        self.note.like.remove(self.other)
+        response = self.request_within_budget("GET", "/api/notes/list")
+        notes = {note["id"]: note for note in response.json()["results"]}
+        self.assertTrue(notes[self.note.pk]["liked_by_me"])
+        self.assertFalse(notes[self.note.pk]["disliked_by_me"])
+
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.other))
+        self.assertNoNPlusOne("/api/notes/list?fields=id,liked_by_me,disliked_by_me")
+        response = self.request_within_budget("GET", f"/api/notes/{self.note.pk}")
+        note = response.json()["note"]
+        self.assertEqual((note["liked_by_me"], note["disliked_by_me"]), (False, True))
+
+    def test_reads_are_shared_between_viewers(self):
+        path = f"/api/notes/{self.note.pk}"
+        self.note.like.remove(self.other)
+        first = self.client.get(path).json()["note"]
+
+        # Another viewer reuses the note, only their reactions are queried.
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.other))
+        with self.assertNumQueries(2):
+            response = self.client.get(path)
+        note = response.json()["note"]
+        self.assertEqual((first["liked_by_me"], note["liked_by_me"]), (True, False))
+        self.assertEqual(
+            (first["disliked_by_me"], note["disliked_by_me"]), (False, True)
+        )
+        self.assertEqual(note["title"], first["title"])
+
+        # Writes drop the shared read right away.
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.user))
+        self.client.put(
+            f"{path}/update", {"title": "Fresh"}, format="json", HTTP_IF_MATCH="*"
+        )
+        self.assertEqual(self.client.get(path).json()["note"]["title"], "Fresh")
+        self.note.like.add(self.other)
+        self.client.get("/api/notes/list")
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.other))
+        response = self.client.get("/api/notes/list")
+        notes = {note["id"]: note for note in response.json()["results"]}
+        self.assertEqual(notes[self.note.pk]["like"], 2)
+        self.assertTrue(notes[self.note.pk]["liked_by_me"])
+
+    @override_settings(COMPRESSION_MIN_SIZE=200)
+    def test_shared_pages_are_stored_compressed(self):
+        path = "/api/notes/list?fields=id,slug,title,excerpt"
+        plain = self.client.get(path)
+        self.assertNotIn("Content-Encoding", plain)
+
+        # The page is compressed once, other viewers get the same bytes.
+        with mock.patch("gzip.compress", wraps=gzip.compress) as compress:
+            first = self.client.get(path, HTTP_ACCEPT_ENCODING="gzip, br;q=0")
+            self.client.credentials(HTTP_AUTHORIZATION=bearer(self.other))
+            second = self.client.get(path, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(first["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", first["Vary"])
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(gzip.decompress(second.content), plain.content)
+
+        # The ETag of the compressed note is good for If-Match.
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.user))
+        note = self.client.get(f"/api/notes/{self.note.pk}", HTTP_ACCEPT_ENCODING="br")
+        self.assertEqual(note["Content-Encoding"], "br")
+        self.assertEqual(note["ETag"], f'"{self.note.version}-br"')
+        response = self.client.put(
+            f"/api/notes/{self.note.pk}/update",
+            {"title": "Compressed"},
+            format="json",
+            HTTP_IF_MATCH=note["ETag"],
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    @override_settings(COMPRESSION_MIN_SIZE=200)
+    def test_default_pages_are_stored_compressed_per_viewer(self):
+        self.note.like.remove(self.user)
+
+        def liked(response):
+            notes = json.loads(gzip.decompress(response.content))["results"]
+            return {note["id"]: note["liked_by_me"] for note in notes}
+
+        # The default fields include the reactions of the viewer, each
+        # viewer's page is compressed once and then served as stored.
+        with mock.patch("gzip.compress", wraps=gzip.compress) as compress:
+            first = self.client.get("/api/notes/list", HTTP_ACCEPT_ENCODING="gzip")
+            again = self.client.get("/api/notes/list", HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(compress.call_count, 1)
+            self.client.credentials(HTTP_AUTHORIZATION=bearer(self.other))
+            other = self.client.get("/api/notes/list", HTTP_ACCEPT_ENCODING="gzip")
+            self.client.get("/api/notes/list", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(compress.call_count, 2)
+        self.assertEqual(again.content, first.content)
+        self.assertFalse(liked(first)[self.note.pk])
+        self.assertTrue(liked(other)[self.note.pk])
+
+        with mock.patch("gzip.compress", wraps=gzip.compress) as compress:
+            path = f"/api/notes/{self.note.pk}"
+            first = self.client.get(path, HTTP_ACCEPT_ENCODING="gzip")
+            again = self.client.get(path, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertLessEqual(compress.call_count, 1)
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(again["ETag"], first["ETag"])
+
+    def test_sparse_fieldsets(self):
+        path = "/api/notes/list?fields=id,slug,title"
+        with CaptureQueriesContext(connection) as captured:
+            response = self.request_within_budget("GET", path)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(set(response.json()["results"][0]), {"id", "slug", "title"})
+        page_query = captured.captured_queries[-1]["sql"]
+        self.assertNotIn('"body"', page_query)
+        self.assertNotIn("JOIN", page_query)
+        self.assertNotIn("notes_note_like", page_query)
+
+        path = "/api/notes/list?fields=title,author,like&expand=author"
+        self.assertNoNPlusOne(path)
+        note = self.client.get(path).json()["results"][0]
+        self.assertEqual(note["author"]["username"], "jake")
+        self.assertEqual(note["like"], 2)
+
+        response = self.request_within_budget(
+            "GET", f"/api/notes/{self.note.pk}?fields=title,author"
+        )
+        self.assertEqual(
+            response.json()["note"], {"title": self.note.title, "author": self.user.pk}
+        )
+        response = self.client.get("/api/notes/list?fields=title,secret")
+        self.assertEqual(response.status_code, 400, response.content)
+
+    def test_schema_generation_needs_no_viewer(self):
+        generator = OpenAPISchemaGenerator(openapi.Info("Notes", "v1"))
+        with mock.patch("drf_yasg.inspectors.base.logger") as logger:
+            generator.get_schema(request=None, public=True)
+        failed = {call.args[1] for call in logger.warning.call_args_list}
+        self.assertFalse(failed & {"NoteViewSet", "NoteRatingView"}, failed)
+
+    def test_trending_notes(self):
+        refresh_leaderboard(full=True)
+        response = self.request_within_budget("GET", "/api/notes/trending")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNoNPlusOne("/api/notes/trending")
+
+    def test_retrieve_note(self):
+        response = self.request_within_budget("GET", f"/api/notes/{self.note.pk}")
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_update_note(self):
+        response = self.request_within_budget(
+            "PUT",
+            f"/api/notes/{self.note.pk}/update",
+            {"title": "Renamed"},
+            HTTP_IF_MATCH=self.note.etag,
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["slug"], "renamed")
+        self.assertNotEqual(response["ETag"], self.note.etag)
+
+        response = self.request_within_budget(
+            "PUT",
+            f"/api/notes/{self.note.pk}/update",
+            {"body": "New body"},
+            HTTP_IF_MATCH=response["ETag"],
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        note = Note.objects.get(pk=self.note.pk)
+        self.assertEqual((note.slug, note.body), ("renamed", "New body"))
+
+    def test_update_needs_the_current_version(self):
+        path = f"/api/notes/{self.note.pk}/update"
+        response = self.client.put(path, {"body": "Mine"}, format="json")
+        self.assertEqual(response.status_code, 428, response.content)
+
+        etag = self.client.get(f"/api/notes/{self.note.pk}")["ETag"]
+        first = self.client.put(path, {"body": "First"}, HTTP_IF_MATCH=etag)
+        self.assertEqual(first.status_code, 200, first.content)
+        second = self.request_within_budget(
+            "PUT", path, {"body": "Second"}, HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(second.status_code, 412, second.content)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(Note.objects.get(pk=self.note.pk).body, "First")
+
+    def test_delete_note(self):
+        response = self.request_within_budget(
+            "DELETE", f"/api/notes/{self.note.pk}/delete"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertFalse(Note.objects.filter(pk=self.note.pk).exists())
+
+    def test_writes_check_the_author(self):
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.other))
+        for method, action in [("PUT", "update"), ("DELETE", "delete")]:
+            response = self.request_within_budget(
+                method,
+                f"/api/notes/{self.note.pk}/{action}",
+                {"title": "Mine"},
+                HTTP_IF_MATCH=self.note.etag,
+            )
+            self.assertEqual(response.status_code, 401, response.content)
+            response = self.request_within_budget(
+                method, f"/api/notes/0/{action}", {"title": "Mine"}, HTTP_IF_MATCH="*"
+            )
+            self.assertEqual(response.status_code, 404, response.content)
+        self.assertEqual(Note.objects.get(pk=self.note.pk).title, self.note.title)
+
+    def test_rating_summary(self):
+        response = self.request_within_budget(
+            "GET", f"/api/notes/{self.note.pk}/rating"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_rate_note(self):
+        response = self.request_within_budget(
+            "POST", f"/api/notes/{self.note.pk}/rating", {"rating": 5}
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.request_within_budget(
+            "POST", f"/api/notes/{self.note.pk}/rating", {"rating": 3}
+        )
+        self.assertEqual(response.json()["rating_count"], 2)
+
+    def test_withdraw_rating(self):
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.other))
+        response = self.request_within_budget(
+            "DELETE", f"/api/notes/{self.note.pk}/rating"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["rating_count"], 0)
+
+
+class RatingAggregateTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="member")
+        Permission.objects.create(name="can_rate_note", role=role)
+        cls.author = User.objects.create_user_with_role(
+            "jake", "jake@example.com", "member", password="Passw0rd!"
+        )
+        cls.raters = [
+            User.objects.create_user_with_role(
+                f"rater{number}", f"rater{number}@example.com", "member"
+            )
+            for number in range(3)
+        ]
+        cls.notes = [
+            Note.objects.create(
+                title=f"Note {number}", description="d", body="b", author=cls.author
+            )
+            for number in range(2)
+        ]
+
+    def assertAggregates(self, note, stars):
+        """Checks the stored aggregates against `stars` and a recount."""
+        note.refresh_from_db()
+        self.assertEqual(
+            note.rating_distribution,
+            {star: stars.count(star) for star in range(1, 6)},
+        )
+        self.assertEqual((note.rating_count, note.rating_sum), (len(stars), sum(stars)))
+        expected = rating_totals([note.id]).get(note.id, {"rating_count": 0})
+        self.assertEqual(note.rating_count, expected["rating_count"])
+
+    def rate(self, rater, note, rating):
+        return NoteRating.objects.create(
+            note=note, rater=rater, rating=rating, note_text=""
+        )
+
+    def test_single_ratings(self):
+        note = self.notes[0]
+        first = self.rate(self.raters[0], note, 4)
+        self.rate(self.raters[1], note, 2)
+        self.assertAggregates(note, [4, 2])
+
+        first.rating = 5
+        first.save()
+        self.assertAggregates(note, [5, 2])
+        first.note = self.notes[1]
+        first.save()
+        self.assertAggregates(note, [2])
+        self.assertAggregates(self.notes[1], [5])
+
+        first.delete()
+        self.assertAggregates(self.notes[1], [])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.rate(self.raters[1], note, 3)
+        self.assertAggregates(note, [2])
+
+    def test_bulk_writes(self):
+        note, other = self.notes
+        NoteRating.objects.bulk_create(
+            NoteRating(note=note, rater=rater, rating=3, note_text="")
+            for rater in self.raters
+        )
+        self.assertAggregates(note, [3, 3, 3])
+
+        NoteRating.objects.filter(rater=self.raters[0]).update(rating=1)
+        self.assertAggregates(note, [1, 3, 3])
+        NoteRating.objects.filter(rater=self.raters[1]).update(note=other)
+        self.assertAggregates(note, [1, 3])
+        self.assertAggregates(other, [3])
+        NoteRating.objects.filter(rater=self.raters[0]).update(note_text="fine")
+        self.assertAggregates(note, [1, 3])
+
+        NoteRating.objects.filter(rating=3).delete()
+        self.assertAggregates(note, [1])
+        self.assertAggregates(other, [])
+
+    def test_cascading_deletes(self):
+        note, other = self.notes
+        for rater in self.raters:
+            self.rate(rater, note, 5)
+            self.rate(rater, other, 2)
+
+        self.raters[0].delete()
+        self.assertAggregates(note, [5, 5])
+        self.assertAggregates(other, [2, 2])
+        note.delete()
+        self.assertAggregates(other, [2, 2])
+
+    def test_legacy_ratings_out_of_range(self):
+        note = self.notes[0]
+        # Rows from before ratings were validated, counted in the totals by
+        # the aggregates migration but in no star column.
+        legacy, other = NoteRating.objects.bulk_create(
+            NoteRating(note=note, rater=rater, rating=rating, note_text="")
+            for rater, rating in zip(self.raters, [0, 9])
+        )
+        self.rate(self.raters[2], note, 4)
+        note.refresh_from_db()
+        self.assertEqual((note.rating_count, note.rating_sum), (3, 13))
+        self.assertEqual(note.rating_distribution[4], 1)
+
+        other.rating = 2
+        other.save()
+        legacy.delete()
+        self.assertAggregates(note, [2, 4])
+
+    def test_concurrent_first_ratings_become_an_update(self):
+        note = self.notes[0]
+        rater = self.raters[0]
+        save = NoteRatingSerializer.save
+        raced = []
+
+        def save_after_a_concurrent_rating(serializer, **kwargs):
+            if not raced:
+                # Stands in for the same user's rating committed after this
+                # request found none, the insert then hits the constraint.
+                raced.append(self.rate(rater, note, 1))
+            return save(serializer, **kwargs)
+
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(rater))
+        with mock.patch.object(
+            NoteRatingSerializer, "save", save_after_a_concurrent_rating
+        ):
+            response = self.client.post(
+                f"/api/notes/{note.pk}/rating", {"rating": 5}, format="json"
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["rating_count"], 1)
+        self.assertAggregates(note, [5])
+
+
+class ImportNotesTests(APITestCase):
+    # Records whose text and tags need every escape of the COPY text format
+    # and of array literals, and values that only look like NULL.
+    records = [
+        {
+            "title": "Windows paths",
+            "description": "C:\\temp\\new\tcolumn",
+            "body": "line one\nline two\r\n\ttabbed \\N and \\\\",
+            "tagList": ['say "hi"', "a,b", "{braces}", "back\\slash", "NULL"],
+            "author": "jake@example.com",
+        },
+        {
+            "title": "Nothing optional",
+            "description": None,
+            "body": "\\N",
+            "author": "jake",
+        },
+        ["not", "an", "object"],
+        {"title": "Nobody wrote this", "body": "b", "author": "nobody"},
+        {
+            "title": "Last",
+            "description": "d",
+            "body": "b",
+            "tagList": [" spaced ", ""],
+            "author": "jake",
+        },
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        Role.objects.create(name="member")
+        cls.author = User.objects.create_user_with_role(
+            "jake", "jake@example.com", "member", password="Passw0rd!"
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "notes.ndjson")
+        with open(self.path, "w", encoding="utf-8") as source:
+            for record in self.records:
+                source.write(json.dumps(record) + "\n")
+
+    def import_notes(self, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command("import_notes", self.path, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def assertRoundTrip(self):
+        stored = {note.title: note for note in Note.objects.filter(author=self.author)}
+        self.assertEqual(set(stored), {"Windows paths", "Nothing optional", "Last"})
+        for record in self.records:
+            if not isinstance(record, dict) or record["title"] not in stored:
+                continue
+            note = stored[record["title"]]
+            self.assertEqual(note.body, record["body"])
+            self.assertEqual(note.description, record["description"] or "")
+            self.assertEqual(note.excerpt, make_excerpt(record["body"]))
+        self.assertEqual(stored["Windows paths"].tagList, self.records[0]["tagList"])
+        self.assertIsNone(stored["Nothing optional"].tagList)
+        self.assertEqual(stored["Last"].tagList, ["spaced"])
+
+    def test_round_trip(self):
+        stdout, stderr = self.import_notes()
+        self.assertRoundTrip()
+        self.assertIn("Imported 3 notes, skipped 2 rows", stdout)
+        self.assertEqual(stderr, "Row 3 is not a JSON object, skipped.\n")
+        self.assertFalse(os.path.exists(f"{self.path}.checkpoint"))
+
+    def test_resume_from_checkpoint(self):
+        bulk_insert = import_notes.bulk_insert
+        chunks = []
+
+        def fail_on_second_chunk(model, notes):
+            chunks.append(notes)
+            if len(chunks) == 2:
+                raise KeyboardInterrupt
+            return bulk_insert(model, notes)
+
+        with mock.patch.object(import_notes, "bulk_insert", fail_on_second_chunk):
+            with self.assertRaises(KeyboardInterrupt):
+                self.import_notes("--chunk-size", "2")
+        self.assertEqual(Note.objects.count(), 2)
+        with open(f"{self.path}.checkpoint") as checkpoint:
+            self.assertEqual(json.load(checkpoint)["rows"], 2)
+
+        stdout, stderr = self.import_notes("--chunk-size", "2")
+        self.assertIn("Resuming after row 2.", stdout)
+        self.assertIn("Imported 3 notes, skipped 2 rows", stdout)
+        self.assertEqual(stderr, "Row 3 is not a JSON object, skipped.\n")
+        self.assertRoundTrip()
+        self.assertFalse(os.path.exists(f"{self.path}.checkpoint"))
+
+
+class LeaderboardTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="member")
+        Permission.objects.create(name="can_create_note", role=role)
+        cls.author = User.objects.create_user_with_role(
+            "jake", "jake@example.com", "member", password="Passw0rd!"
+        )
+        cls.voters = [
+            User.objects.create_user_with_role(
+                f"voter{number}", f"voter{number}@example.com", "member"
+            )
+            for number in range(6)
+        ]
+        cls.notes = [
+            Note.objects.create(
+                title=f"Note {number}", description="d", body="b", author=cls.author
+            )
+            for number in range(4)
+        ]
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.author))
+
+    def react(self, note, likes=0, dislikes=0, stars=()):
+        note.like.add(*self.voters[:likes])
+        note.dislike.add(*self.voters[likes : likes + dislikes])
+        for voter, rating in zip(reversed(self.voters), stars):
+            NoteRating.objects.create(
+                note=note, rater=voter, rating=rating, note_text=""
+            )
+
+    def trending(self, **params):
+        response = self.client.get("/api/notes/trending", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["results"]
+
+    def live_order(self):
+        """Note ids best first, scored from the current reactions."""
+        rows = Note.objects.with_reaction_counts().values(
+            "id",
+            "created_at",
+            "rating_count",
+            "rating_sum",
+            "like_count",
+            "dislike_count",
+        )
+        scores = {
+            row["id"]: hot_score(
+                row["like_count"],
+                row["dislike_count"],
+                row["rating_count"],
+                row["rating_sum"],
+                row["created_at"],
+            )
+            for row in rows
+        }
+        return sorted(scores, key=lambda id: (scores[id], id), reverse=True)
+
+    def test_refresh_command_ranks_by_reactions(self):
+        first, second, third, fourth = self.notes
+        self.react(first, likes=1, dislikes=3)
+        self.react(second, likes=5, stars=[1])
+        self.react(third, likes=2, stars=[5, 5])
+        self.react(fourth, dislikes=1, stars=[2])
+
+        stdout = io.StringIO()
+        call_command("refresh_leaderboard", stdout=stdout)
+        self.assertIn("Refreshed 4 leaderboard entries", stdout.getvalue())
+
+        entries = self.trending(window="all")
+        self.assertEqual([entry["id"] for entry in entries], self.live_order())
+        self.assertEqual([entry["id"] for entry in entries[:2]], [third.id, second.id])
+        self.assertEqual(
+            entries[0],
+            {
+                "id": third.id,
+                "slug": third.slug,
+                "title": third.title,
+                "score": entries[0]["score"],
+                "like": 2,
+                "dislike": 0,
+                "rating_count": 2,
+                "rating_average": 5.0,
+            },
+        )
+
+    def test_trending_is_stale_until_the_next_refresh(self):
+        refresh_leaderboard(full=True)
+        before = [entry["id"] for entry in self.trending()]
+        self.assertEqual(before, self.live_order())
+
+        oldest, deleted = self.notes[:2]
+        self.react(oldest, likes=6)
+        deleted_id = deleted.id
+        deleted.delete()
+        # New reactions wait for the refresh, deleted notes leave at once.
+        self.assertEqual(
+            [entry["id"] for entry in self.trending()],
+            [id for id in before if id != deleted_id],
+        )
+
+        # Only the note with new reactions is rescored.
+        self.assertEqual(refresh_leaderboard(), 1)
+        after = [entry["id"] for entry in self.trending()]
+        self.assertEqual(after, self.live_order())
+        self.assertEqual(after[0], oldest.id)
+
+    def test_windows_and_pages(self):
+        old = self.notes[0]
+        Note.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+        refresh_leaderboard(full=True)
+
+        week = [entry["id"] for entry in self.trending(window="week")]
+        self.assertNotIn(old.id, week)
+        self.assertEqual(week, [id for id in self.live_order() if id != old.id])
+        month = [entry["id"] for entry in self.trending(window="month")]
+        self.assertEqual(month, self.live_order())
+
+        response = self.client.get("/api/notes/trending?window=all&limit=3")
+        page = response.json()
+        self.assertEqual(len(page["results"]), 3)
+        rest = self.client.get(page["next"]).json()["results"]
+        self.assertEqual(
+            [entry["id"] for entry in page["results"] + rest], self.live_order()
+        )
+
+        response = self.client.get("/api/notes/trending?window=year")
+        self.assertEqual(response.status_code, 400, response.content)
+
+
+class GenerateDataTests(APITestCase):
+    def generate(self, *args):
+        call_command(
+            "generate_data",
+            "--users=200",
+            "--notes=60",
+            "--titles=3",
+            "--batch-size=25",
+            *args,
+            stdout=io.StringIO(),
+        )
+
+    def snapshot(self):
+        """Everything generated, with roles by name as their ids may vary."""
+        return {
+            "users": list(
+                User.objects.order_by("id").values_list(
+                    "id", "username", "role__name", "created_at"
+                )
+            ),
+            "notes": list(
+                Note.objects.order_by("id").values_list(
+                    "id",
+                    "slug",
+                    "body",
+                    "tagList",
+                    "author_id",
+                    "created_at",
+                    "activity_at",
+                    "rating_sum",
+                )
+            ),
+            "ratings": list(
+                NoteRating.objects.order_by("id").values_list(
+                    "id", "rater_id", "note_id", "rating"
+                )
+            ),
+            "likes": list(Note.like.through.objects.order_by("id").values_list()),
+            "dislikes": list(Note.dislike.through.objects.order_by("id").values_list()),
+        }
+
+    def test_same_seed_same_data(self):
+        snapshots = []
+        for _ in range(2):
+            with transaction.atomic():
+                self.generate("--seed=7")
+                snapshots.append(self.snapshot())
+                transaction.set_rollback(True)
+        self.assertEqual(snapshots[0], snapshots[1])
+        self.assertEqual(snapshots[0]["users"][0][:2], (1, "user1"))
+        self.assertTrue(snapshots[0]["likes"])
+
+        self.generate("--seed=8")
+        self.assertNotEqual(self.snapshot(), snapshots[0])
+        newest = max(created_at for *_, created_at in snapshots[0]["users"])
+        self.assertLessEqual(newest, datetime(2025, 1, 1, tzinfo=timezone.utc))
+
+    def test_generated_data(self):
+        self.generate()
+
+        roles = Counter(User.objects.values_list("role__name", flat=True))
+        self.assertEqual(sum(roles.values()), 200)
+        self.assertEqual(set(roles) - {"guest", "member", "moderator", "admin"}, set())
+        self.assertGreater(roles["guest"], roles["member"])
+        self.assertGreater(roles["member"], roles["moderator"])
+
+        # Three titles for sixty notes, the slugs still come out unique.
+        notes = Note.objects.values_list("title", "slug")
+        self.assertEqual(len({slug for _, slug in notes}), 60)
+        self.assertLessEqual(len({title for title, _ in notes}), 3)
+        for title, slug in notes:
+            self.assertRegex(slug, rf"^{slugify(title)}(-\d+)?$")
+
+        totals = rating_totals(Note.objects.values("id"))
+        self.assertTrue(totals)
+        for note in Note.objects.all():
+            expected = totals.get(note.id, {"rating_count": 0, "rating_sum": 0})
+            for field in ["rating_count", "rating_sum"]:
+                self.assertEqual(getattr(note, field), expected[field], field)
+            self.assertEqual(
+                list(note.rating_distribution.values()),
+                [expected.get(f"rating_star_{star}", 0) for star in range(1, 6)],
+            )
+
+    def test_existing_rows_need_append(self):
+        self.generate()
+        with self.assertRaisesMessage(CommandError, "pass --append"):
+            self.generate()
+        self.generate("--append")
+        self.assertEqual(User.objects.count(), 400)
+        self.assertEqual(Note.objects.order_by("-id").first().id, 120)
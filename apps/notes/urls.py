@@ -4,7 +4,9 @@ from django.urls import path
 from rest_framework.routers import DefaultRouter
 
 from .views import (
+    LeaderboardView,
     NoteViewSet,
+    NoteRatingView,
 )
 
 router = DefaultRouter(trailing_slash=False)
@@ -15,6 +17,7 @@ urlpatterns = [
 
     path("", NoteViewSet.as_view({"post": "create"}), name="create_note"),
     path("list", NoteViewSet.as_view({"get": "list"}), name="fetch_notes"),
+    path("trending", LeaderboardView.as_view(), name="trending_notes"),
     path(
         "<int:pk>",
         NoteViewSet.as_view({"get": "retrieve"}),
@@ -30,4 +33,5 @@ urlpatterns = [
         NoteViewSet.as_view({"delete": "destroy"}),
         name="delete_note",
     ),
+    path("<int:pk>/rating", NoteRatingView.as_view(), name="rate_note"),
 ]
@@ -3,11 +3,29 @@ from drf_yasg.utils import swagger_auto_schema
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from .models import Note
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework.generics import GenericAPIView, ListAPIView
+from rest_framework.pagination import CursorPagination
+from rest_framework.renderers import JSONRenderer
+from .models import LeaderboardEntry, Note, NoteRating, make_excerpt
+from .reads import forget_note, note_reads
 from functools import partial
-from .serializers import NoteSerializer
-from rest_framework.exceptions import NotFound
+from .serializers import (
+    LeaderboardEntrySerializer,
+    NoteSerializer,
+    NoteRatingSerializer,
+    NoteRatingSummarySerializer,
+)
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework import mixins, status, viewsets
+from apps.core.compression import PrecompressedBody, PrecompressedResponse
+from apps.core.decorators import latency_budget, query_budget
+from apps.core.idempotency import idempotent
 from apps.core.permissions import UserHasPermission
 
 class NoteViewSet(
@@ -30,10 +48,70 @@ class NoteViewSet(
         partial(UserHasPermission, "can_create_note"),
     ]
     serializer_class = NoteSerializer
+    # Lists send the excerpt, only retrieve loads the body.
+    list_fields = [name for name in NoteSerializer.field_sources if name != "body"]
+
+    def get_queryset(self):
+        if getattr(self, "swagger_fake_view", False):
+            # Schema generation has no request, hence no viewer.
+            return Note.objects.none()
+        return (
+            Note.objects.select_related("author__role")
+            .with_reaction_counts()
+            .with_viewer_reactions(self.request.user)
+        )
 
+    def get_sparse_fieldset(self, allowed=None):
+        """
+        Reads the comma separated ?fields= and ?expand= parameters. Returns
+        (fields, expand), fields is None when all of them are wanted.
+        """
+        fields = _comma_separated(self.request.query_params.get("fields"))
+        expand = _comma_separated(self.request.query_params.get("expand")) or []
+        allowed = allowed or self.serializer_class.field_sources
+        unknown = [name for name in fields or () if name not in allowed]
+        unknown += [
+            name
+            for name in expand
+            if name not in self.serializer_class.expanded_sources
+        ]
+        if unknown:
+            raise ValidationError(
+                {"fields": "Unknown fields: {}.".format(", ".join(unknown))}
+            )
+        return fields, expand
+
+    def get_sparse_queryset(self, fields, expand):
+        """
+        Loads only the columns, joins and counts the requested fields read,
+        see NoteSerializer.field_sources, plus the version for the ETag.
+        """
+        if fields is None:
+            return self.get_queryset()
+        queryset = Note.objects.with_reaction_counts(
+            like="like" in fields, dislike="dislike" in fields
+        ).with_viewer_reactions(
+            self.request.user,
+            liked="liked_by_me" in fields,
+            disliked="disliked_by_me" in fields,
+        )
+        columns = ["version"]
+        for name in fields:
+            columns += self.serializer_class.field_sources[name]
+            if name in expand:
+                sources = self.serializer_class.expanded_sources[name]
+                columns += sources
+                # Joins every relation on the way, e.g. author and its role.
+                queryset = queryset.select_related(
+                    *{source.rsplit("__", 1)[0] for source in sources}
+                )
+        return queryset.only(*columns)
+
+    @query_budget(6)
     @swagger_auto_schema(
         operation_description="Create Note", operation_id="note_create"
     )
+    @idempotent
     def create(self, request):
 
         """Creates a new article in the database
@@ -45,10 +123,16 @@ class NoteViewSet(
             data=serializer_data
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save(author=request.user)
+        note = serializer.save(author=request.user)
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED,
+            headers={"ETag": note.etag},
+        )
 
+    @query_budget(4)
+    @latency_budget(2.0)
     @swagger_auto_schema(
         operation_description="Get a list Note", operation_id="notes_list"
     )
@@ -60,12 +144,48 @@ class NoteViewSet(
         """
 
         serializer_context = {"request": request}
-        page = self.paginate_queryset(self.get_queryset())
+        fields, expand = self.get_sparse_fieldset(self.list_fields)
+        if fields is None:
+            fields = self.list_fields
+            expand = list(self.serializer_class.expanded_sources)
+
+        def read_page():
+            shared = self.get_shared_fields(fields)
+            page = self.paginate_queryset(self.get_sparse_queryset(shared, expand))
+            serializer = self.serializer_class(
+                page,
+                context=serializer_context,
+                many=True,
+                fields=shared,
+                expand=expand,
+            )
+            ids = [note.id for note in page]
+            return ids, self.get_paginated_response(serializer.data).data
+
+        key = ("notes", request.build_absolute_uri())
+
+        def read_viewer_page():
+            ids, data = note_reads.do(
+                key, read_page, ttl=settings.NOTE_READ_CACHE_SECONDS
+            )
+            results = self.add_viewer_reactions(data["results"], ids, fields)
+            return {**data, "results": results}
 
-        serializer = self.serializer_class(page, context=serializer_context, many=True)
+        if not self.caches_rendering():
+            return Response(read_viewer_page())
 
-        return self.get_paginated_response(serializer.data)
+        def render_page():
+            data = read_viewer_page()
+            return data, self.precompress(data)
 
+        data, precompressed = note_reads.do(
+            self.get_rendering_key(key, fields),
+            render_page,
+            ttl=settings.NOTE_READ_CACHE_SECONDS,
+        )
+        return PrecompressedResponse(data, precompressed)
+
+    @query_budget(3)
     @swagger_auto_schema(
         operation_description="Get a Note by id", operation_id="fetch_note"
     )
@@ -80,67 +200,349 @@ class NoteViewSet(
 
         serializer_context = {"request": request}
 
-        try:
-            note = Note.objects.get(id=pk)
-        except Note.DoesNotExist:
+        fields, expand = self.get_sparse_fieldset()
+        if fields is None:
+            fields = list(self.serializer_class.field_sources)
+            expand = list(self.serializer_class.expanded_sources)
 
-            raise NotFound("a Note with this slug does not exist.")
+        def read_note():
+            shared = self.get_shared_fields(fields)
+            try:
+                note = self.get_sparse_queryset(shared, expand).get(id=pk)
+            except Note.DoesNotExist:
+                raise NotFound("a Note with this slug does not exist.")
 
-        serializer = self.serializer_class(note, context=serializer_context)
+            serializer = self.serializer_class(
+                note, context=serializer_context, fields=shared, expand=expand
+            )
+            return note.etag, serializer.data
+
+        key = ("note", pk, tuple(fields), tuple(expand))
 
-        return Response({"note": serializer.data}, status=status.HTTP_200_OK)
+        def read_viewer_note():
+            etag, data = note_reads.do(
+                key, read_note, ttl=settings.NOTE_READ_CACHE_SECONDS
+            )
+            [data] = self.add_viewer_reactions([data], [pk], fields)
+            return etag, {"note": data}
+
+        if not self.caches_rendering():
+            etag, data = read_viewer_note()
+            return Response(data, status=status.HTTP_200_OK, headers={"ETag": etag})
+
+        def render_note():
+            etag, data = read_viewer_note()
+            return etag, data, self.precompress(data)
+
+        etag, data, precompressed = note_reads.do(
+            self.get_rendering_key(key, fields),
+            render_note,
+            ttl=settings.NOTE_READ_CACHE_SECONDS,
+        )
+        return PrecompressedResponse(
+            data, precompressed, status=status.HTTP_200_OK, headers={"ETag": etag}
+        )
 
+    @query_budget(4)
     def update(self, request, pk=None):
 
         """Method updates partially a single note
-        Takes a pk as unique identifier, searches the db
-        and updates an note with matching slug.
+        Takes a pk as unique identifier and updates the note with matching
+        pk in one statement that also checks the author and, from the
+        If-Match header, that nobody changed the note since it was read.
         Returns NotFound if an note does not exist"""
 
+        if_match = parse_etags(request.META.get("HTTP_IF_MATCH", ""))
+        if not if_match:
+            return Response(
+                {"message": "Send the ETag of the note in an If-Match header"},
+                status=status.HTTP_428_PRECONDITION_REQUIRED,
+            )
+
         serializer_context = {"request": request}
+        serializer = self.serializer_class(
+            context=serializer_context, data=request.data, partial=True
+        )
+        serializer.is_valid(raise_exception=True)
 
-        try:
-            serializer_instance = self.queryset.get(id=pk)
-        except Note.DoesNotExist:
+        changes = dict(serializer.validated_data)
+        # The slug follows the title, as in Note.save().
+        changes.pop("slug", None)
+        if "title" in changes:
+            changes["slug"] = Note(pk=pk, title=changes["title"])._get_unique_slug()
+        if "body" in changes:
+            changes["excerpt"] = make_excerpt(changes["body"])
+        changes["updated_at"] = timezone.now()
+        changes["version"] = F("version") + 1
+
+        # Compare and swap: only the columns sent are written, and only if
+        # the user wrote the note and it is still at the version they read.
+        notes = Note.objects.filter(id=pk, author=request.user)
+        if "*" not in if_match:
+            notes = notes.filter(version__in=_etag_versions(if_match))
+        if not notes.update(**changes):
+            return self._refuse_write(
+                pk,
+                "A note with this slug does not exist.",
+                "You can only update your article",
+            )
+        forget_note(pk)
 
-            raise NotFound("A note with this slug does not exist.")
+        note = self.get_queryset().get(id=pk)
+        serializer = self.serializer_class(note, context=serializer_context)
+        return Response(
+            serializer.data, status=status.HTTP_200_OK, headers={"ETag": note.etag}
+        )
 
-        serializer_data = request.data
+    @query_budget(9)
+    def destroy(self, request, pk=None):
+        # Other people's notes are never loaded, the author check is part
+        # of the query the deletion starts from.
+        deleted, _ = Note.objects.filter(id=pk, author=request.user).only("id").delete()
+        if not deleted:
+            return self._refuse_write(
+                pk,
+                "An note with this slug does not exist.",
+                "You can only delete your note",
+            )
+        forget_note(pk)
+
+        return Response(
+            {"message": "You have successfully deleted the note"},
+            status=status.HTTP_200_OK,
+        )
+
+    def get_shared_fields(self, fields):
+        """The fields that read the same for every user."""
+        viewer_fields = self.serializer_class.viewer_fields
+        return [name for name in fields if name not in viewer_fields]
+
+    def caches_rendering(self):
+        """
+        Whether the response can be kept rendered and compressed along with
+        the shared read. The browsable API shows the request, only JSON is.
+        """
+        return isinstance(self.request.accepted_renderer, JSONRenderer)
+
+    def get_rendering_key(self, key, fields):
+        """
+        The note_reads key of the rendered response to the read under `key`.
+        Responses with viewer_fields are kept per user, the others are
+        rendered and compressed once for everybody.
+        """
+        key = (*key, self.request.accepted_media_type)
+        if len(self.get_shared_fields(fields)) < len(fields):
+            key += (self.request.user.pk,)
+        return key
+
+    def precompress(self, data):
+        """Renders `data` once for the requests sharing it."""
+        renderer = self.request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f"{content_type}; charset={renderer.charset}"
+        body = renderer.render(
+            data, self.request.accepted_media_type, self.get_renderer_context()
+        )
+        return PrecompressedBody(body, content_type)
+
+    def add_viewer_reactions(self, items, ids, fields):
+        """
+        Copies of the shared representations in `items`, of the notes with
+        `ids`, with the requested viewer_fields of the user making the
+        request filled in by one query.
+        """
+        names = [name for name in self.serializer_class.viewer_fields if name in fields]
+        if not names:
+            return items
+        notes = Note.objects.filter(id__in=ids).with_viewer_reactions(
+            self.request.user,
+            liked="liked_by_me" in names,
+            disliked="disliked_by_me" in names,
+        )
+        reactions = {
+            note_id: dict(zip(names, values))
+            for note_id, *values in notes.values_list("id", *names)
+        }
+        return [
+            {**item, **reactions.get(note_id, {})} for item, note_id in zip(items, ids)
+        ]
+
+    def _refuse_write(self, pk, not_found, not_yours):
+        """
+        Tells a missing note apart from a note of somebody else and, for
+        the author, from a note that changed since they read it.
+        """
+        note = Note.objects.filter(id=pk).only("author_id", "version").first()
+        if note is None:
+            raise NotFound(not_found)
+        if note.author_id != self.request.user.id:
+            return Response({"message": not_yours}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(
+            {"message": "The note was changed since you read it"},
+            status=status.HTTP_412_PRECONDITION_FAILED,
+            headers={"ETag": note.etag},
+        )
+
+
+def _comma_separated(value):
+    if not value:
+        return None
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def _etag_versions(etags):
+    return [int(etag[1:-1]) for etag in etags if etag[1:-1].isdigit()]
+
+
+class NoteRatingView(GenericAPIView):
+    """
+    Lets the current user rate a note once, change or withdraw that rating,
+    and read the note's rating summary. The summary comes straight from
+    the aggregates stored on the note.
+    """
 
+    permission_classes = [
+        IsAuthenticated,
+        partial(UserHasPermission, "can_rate_note"),
+    ]
+    queryset = NoteRating.objects.all()
+    serializer_class = NoteRatingSerializer
+    summary_fields = [
+        "id",
+        "rating_count",
+        "rating_sum",
+        "rating_star_1",
+        "rating_star_2",
+        "rating_star_3",
+        "rating_star_4",
+        "rating_star_5",
+    ]
+
+    def _get_summary(self, pk):
+        try:
+            return Note.objects.only(*self.summary_fields).get(id=pk)
+        except Note.DoesNotExist:
+            raise NotFound("A note with this id does not exist.")
+
+    def _rate(self, request, pk):
+        """Creates the user's rating of the note, or updates the one they gave."""
+        rating = (
+            NoteRating.objects.select_for_update()
+            .filter(note_id=pk, rater=request.user)
+            .first()
+        )
         serializer = self.serializer_class(
-            serializer_instance,
-            context=serializer_context,
-            data=serializer_data,
-            partial=True,
+            rating, data=request.data, partial=rating is not None
         )
-        note = Note.objects.get(id=pk)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(note_id=pk, rater=request.user)
 
-        if request.user != note.author:
-            return Response(
-                {"message": "You can only update your article"},
-                status=status.HTTP_401_UNAUTHORIZED,
+    @query_budget(3)
+    @swagger_auto_schema(
+        operation_description="Get the rating summary of a Note",
+        operation_id="note_rating_summary",
+        responses={200: NoteRatingSummarySerializer},
+    )
+    def get(self, request, pk):
+        note = self._get_summary(pk)
+        return Response(
+            NoteRatingSummarySerializer(note).data, status=status.HTTP_200_OK
+        )
+
+    @query_budget(9)
+    @swagger_auto_schema(
+        operation_description="Rate a Note or change your rating",
+        operation_id="note_rate",
+        responses={200: NoteRatingSummarySerializer},
+    )
+    def post(self, request, pk):
+        if not Note.objects.filter(id=pk).exists():
+            raise NotFound("A note with this id does not exist.")
+
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    self._rate(request, pk)
+            except IntegrityError:
+                # A concurrent first rating of the same user got in first,
+                # the unique constraint turns this one into an update.
+                self._rate(request, pk)
+
+        note = self._get_summary(pk)
+        return Response(
+            NoteRatingSummarySerializer(note).data, status=status.HTTP_200_OK
+        )
+
+    @query_budget(7)
+    @swagger_auto_schema(
+        operation_description="Withdraw your rating of a Note",
+        operation_id="note_unrate",
+        responses={200: NoteRatingSummarySerializer},
+    )
+    def delete(self, request, pk):
+        with transaction.atomic():
+            # The lock keeps a concurrent withdrawal from counting twice.
+            rating = (
+                NoteRating.objects.select_for_update()
+                .filter(note_id=pk, rater=request.user)
+                .first()
             )
+            if rating is None:
+                raise NotFound("You have not rated this note.")
+            rating.delete()
 
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        note = self._get_summary(pk)
+        return Response(
+            NoteRatingSummarySerializer(note).data, status=status.HTTP_200_OK
+        )
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
 
-    def destroy(self, request, pk=None):
-        try:
-           note = self.queryset.get(id=pk)
 
-        except Note.DoesNotExist:
-            raise NotFound("An note with this slug does not exist.")
+class LeaderboardPagination(CursorPagination):
+    ordering = ("-score", "-note_id")
+    page_size_query_param = "limit"
+    max_page_size = 100
 
-        if request.user != note.author:
-            return Response(
-                {"message": "You can only delete your note"},
-                status=status.HTTP_401_UNAUTHORIZED,
+
+class LeaderboardView(ListAPIView):
+    """
+    Serves the top notes from the precomputed leaderboard table,
+    optionally limited to notes created within the last day, week or month.
+    """
+
+    permission_classes = [
+        IsAuthenticated,
+        partial(UserHasPermission, "can_create_note"),
+    ]
+    serializer_class = LeaderboardEntrySerializer
+    pagination_class = LeaderboardPagination
+    windows = {
+        "day": timedelta(days=1),
+        "week": timedelta(weeks=1),
+        "month": timedelta(days=30),
+        "all": None,
+    }
+
+    def get_queryset(self):
+        window = self.request.query_params.get("window", "week")
+        if window not in self.windows:
+            raise ValidationError(
+                {"window": [f"Choose one of {', '.join(self.windows)}."]}
             )
 
-        if note.delete():
-            return Response(
-                {"message": "You have successfully deleted the note"},
-                status=status.HTTP_200_OK,
-            )
\ No newline at end of file
+        queryset = LeaderboardEntry.objects.all()
+        if self.windows[window] is not None:
+            queryset = queryset.filter(
+                note_created_at__gte=timezone.now() - self.windows[window]
+            )
+        return queryset
+
+    @query_budget(3)
+    @latency_budget(2.0)
+    @swagger_auto_schema(
+        operation_description="Get the trending Notes, best first",
+        operation_id="notes_trending",
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
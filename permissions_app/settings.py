@@ -49,6 +49,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     "rest_framework",
+    'apps.core',
     'apps.authentication',
     'apps.notes',
     'django_extensions',
@@ -57,6 +58,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.core.middleware.RequestMetricsMiddleware',
+    'apps.core.middleware.ConcurrencyLimitMiddleware',
+    'apps.core.middleware.CompressionMiddleware',
+    'apps.core.middleware.RateLimitHeadersMiddleware',
+    'apps.core.middleware.LatencyBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -127,11 +133,122 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "apps.authentication.authentication.JWTAuthentication",
     ),
+    "DEFAULT_THROTTLE_CLASSES": ("apps.core.throttling.RoleRateThrottle",),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
     "PAGE_SIZE": 10,
     # "DEFAULT_FILTER_BACKENDS": ("django_filters.rest_framework.DjangoFilterBackend",),
 }
 
+# Requests allowed per user by role, and per client address for anonymous
+# requests, as "<count>/<period>" with a period of s, m, h or d. Empty turns
+# the limit off for that group.
+RATE_LIMITS = {
+    "anonymous": config("RATE_LIMIT_ANONYMOUS", default="60/m"),
+    "guest": config("RATE_LIMIT_GUEST", default="120/m"),
+    "member": config("RATE_LIMIT_MEMBER", default="600/m"),
+    "moderator": config("RATE_LIMIT_MODERATOR", default="1200/m"),
+    "admin": config("RATE_LIMIT_ADMIN", default="3000/m"),
+}
+# The rate limit counters. The default keeps them per process, point it to
+# a shared server, e.g. RATE_LIMIT_CACHE_BACKEND=
+# django.core.cache.backends.memcached.PyMemcacheCache and
+# RATE_LIMIT_CACHE_LOCATION=127.0.0.1:11211, so that all workers enforce
+# one budget. The core.W001 check warns about a per process cache when
+# WEB_CONCURRENCY, which gunicorn also reads, asks for several workers.
+WORKER_PROCESSES = config("WEB_CONCURRENCY", default=1, cast=int)
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "ratelimit": {
+        "BACKEND": config(
+            "RATE_LIMIT_CACHE_BACKEND",
+            default="django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": config("RATE_LIMIT_CACHE_LOCATION", default="ratelimit"),
+    },
+}
+
+# Requests in flight per worker process and endpoint class (see
+# apps.core.concurrency): the starting cap, the floor it never adapts below,
+# which keeps capacity reserved for logins and admin work, the ceiling, how
+# many requests may queue and how many seconds they may wait before a 503.
+CONCURRENCY_LIMITS = {
+    "auth": {
+        "initial": 8,
+        "min_limit": 4,
+        "max_limit": 32,
+        "queue": 16,
+        "wait": 0.5,
+    },
+    "admin": {
+        "initial": 4,
+        "min_limit": 2,
+        "max_limit": 16,
+        "queue": 8,
+        "wait": 0.5,
+    },
+    "authorization": {
+        "initial": 8,
+        "min_limit": 1,
+        "max_limit": 32,
+        "queue": 16,
+        "wait": 0.2,
+    },
+    "note_reads": {
+        "initial": 16,
+        "min_limit": 1,
+        "max_limit": 64,
+        "queue": 32,
+        "wait": 0.1,
+    },
+    "note_writes": {
+        "initial": 8,
+        "min_limit": 1,
+        "max_limit": 32,
+        "queue": 16,
+        "wait": 0.2,
+    },
+}
+
+# A note has to collect ten times the votes to rank level with a note
+# created this many seconds later (see apps.notes.leaderboard.hot_score).
+LEADERBOARD_DECAY_SECONDS = config("LEADERBOARD_DECAY_SECONDS", default=45000, cast=int)
+
+# Version of the deployed code, e.g. a git sha. Cached artifacts such as the
+# OpenAPI schema are keyed by it and fall back to a source fingerprint.
+APP_VERSION = config("APP_VERSION", default="")
+# "off" introspects every view on each schema request, "memory" generates the
+# schema once per process and "file" shares it through SCHEMA_CACHE_DIR
+# (defaults to a directory in the system temp dir).
+SCHEMA_CACHE = config("SCHEMA_CACHE", default="memory")
+SCHEMA_CACHE_DIR = config("SCHEMA_CACHE_DIR", default="")
+
+# Seconds a worker keeps its role -> permission map before reloading it.
+# Changes made through another worker show up within this delay, 0 turns
+# the cache off.
+ROLE_PERMISSION_CACHE_TTL = config("ROLE_PERMISSION_CACHE_TTL", default=30, cast=int)
+# Revoked tokens: how often each worker picks up tokens revoked elsewhere,
+# how often it rebuilds its Bloom filter to drop expired ones and how many
+# tokens the filter is sized for before it grows.
+TOKEN_REVOCATION_REFRESH_SECONDS = config(
+    "TOKEN_REVOCATION_REFRESH_SECONDS", default=5, cast=int
+)
+TOKEN_REVOCATION_REBUILD_SECONDS = config(
+    "TOKEN_REVOCATION_REBUILD_SECONDS", default=3600, cast=int
+)
+TOKEN_REVOCATION_BLOOM_CAPACITY = config(
+    "TOKEN_REVOCATION_BLOOM_CAPACITY", default=100000, cast=int
+)
+# Most [user id, permission] pairs POST /api/authorization/check answers
+# in one request.
+AUTHORIZATION_CHECK_LIMIT = config(
+    "AUTHORIZATION_CHECK_LIMIT", default=10000, cast=int
+)
+# Most user ids POST /api/admin/users/role reassigns in one request.
+ROLE_ASSIGNMENT_LIMIT = config("ROLE_ASSIGNMENT_LIMIT", default=100000, cast=int)
+# Warm up URL resolving, serializers, the database connection, the role
+# permission map and the schema when the WSGI application is loaded.
+WARM_UP = config("WARM_UP", default=True, cast=bool)
+
 PROJECT_ROOT = os.path.join(os.path.abspath(__file__))
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -176,3 +293,27 @@ DATABASE_POOL_ARGS = {
     'pool_size': 8,
     'recycle': 300
 }
+
+# Seconds a view may spend on database queries unless it declares its own
+# budget with @latency_budget, past it queries are cancelled with a 504.
+LATENCY_BUDGET = config("LATENCY_BUDGET", default=5.0, cast=float)
+
+# Seconds a response to a request with an Idempotency-Key header is kept
+# for retries, see apps.core.idempotency.
+IDEMPOTENCY_KEY_TTL = config("IDEMPOTENCY_KEY_TTL", default=86400, cast=int)
+
+# Seconds a note or a page of notes read by one request is reused for
+# identical requests of the same process. Writes made through this process
+# show right away, other processes serve the old note for at most as long.
+NOTE_READ_CACHE_SECONDS = config("NOTE_READ_CACHE_SECONDS", default=1.0, cast=float)
+
+# Responses of at least COMPRESSION_MIN_SIZE bytes are sent compressed to
+# clients that accept it, with brotli when the Brotli package is installed
+# and gzip otherwise, see apps.core.compression.
+COMPRESSION_MIN_SIZE = config("COMPRESSION_MIN_SIZE", default=1024, cast=int)
+COMPRESSION_GZIP_LEVEL = config("COMPRESSION_GZIP_LEVEL", default=6, cast=int)
+COMPRESSION_BROTLI_QUALITY = config("COMPRESSION_BROTLI_QUALITY", default=5, cast=int)
+
+# Bearer token Prometheus sends to scrape /metrics, the endpoint is off
+# without one.
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
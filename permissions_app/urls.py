@@ -16,11 +16,13 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include, re_path
 from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
 
 from rest_framework import permissions
 
-schema_view = get_schema_view(
+from apps.core.schema import get_cached_schema_view
+from apps.core.views import metrics
+
+schema_view = get_cached_schema_view(
     openapi.Info(
         title="DRF API",
         default_version="v1",
@@ -38,6 +40,7 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("apps.authentication.urls")),
     path("api/notes/", include("apps.notes.urls")),
+    path("metrics", metrics, name="metrics"),
     
     re_path(
         r"^swagger(?P<format>\.json|\.yaml)$",
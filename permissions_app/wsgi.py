@@ -14,3 +14,14 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'permissions_app.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.WARM_UP:
+    from apps.core.warmup import close_connections_before_fork, warm_up
+
+    # The only warm-up hook: without --preload every worker imports this
+    # module and warms up once, with it the master does and the workers
+    # inherit the warmed up state, opening their own database connections.
+    close_connections_before_fork()
+    warm_up()